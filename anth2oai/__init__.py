@@ -1,3 +1,10 @@
-from .client import Anth2OAI, AsyncAnth2OAI
-
 __all__ = ["AsyncAnth2OAI", "Anth2OAI"]
+
+
+def __getattr__(name: str):
+    # The clients pull in both SDKs, so they are only imported when used
+    if name in __all__:
+        from . import client
+
+        return getattr(client, name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
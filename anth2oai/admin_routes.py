@@ -1,6 +1,6 @@
 """Admin API router for authentication and configuration management."""
 
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Request, status
 from loguru import logger
 
 from anth2oai.configs import ConfigManager
@@ -10,14 +10,25 @@ from anth2oai.jwt_auth import (
     ChangeUsernameRequest,
     ConfigResponse,
     ConfigUpdateRequest,
+    LoginRateLimiter,
     LoginRequest,
     TokenData,
     TokenResponse,
+    UpstreamRequest,
+    UpstreamResponse,
     UserResponse,
     create_access_token,
     get_current_user,
 )
-from anth2oai.models import Config, User
+from anth2oai.models import Config, Upstream, User
+from anth2oai.server.cache import ResponseCache
+from anth2oai.server.coalesce import StreamCoalescer
+from anth2oai.server.fair_queue import FairQueue
+from anth2oai.server.limiter import ConcurrencyLimiters
+from anth2oai.server.streaming import StreamStats
+from anth2oai.server.upstreams import UpstreamPool
+from anth2oai.server.usage import usage_rollup
+from anth2oai.tool_cache import ToolSchemaCache
 
 router = APIRouter(prefix="/api/admin", tags=["admin"])
 
@@ -26,11 +37,21 @@ router = APIRouter(prefix="/api/admin", tags=["admin"])
 
 
 @router.post("/login", response_model=TokenResponse)
-async def login(request: LoginRequest):
+async def login(request: LoginRequest, raw_request: Request):
     """登录并获取 JWT Token"""
+    client = raw_request.client.host if raw_request.client else "unknown"
+    retry_after = LoginRateLimiter.hit(request.username, client)
+    if retry_after is not None:
+        logger.warning(f"登录尝试过于频繁: {request.username}@{client}")
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="登录尝试过于频繁，请稍后再试",
+            headers={"Retry-After": str(retry_after)},
+        )
+
     user = await User.filter(username=request.username).first()
 
-    if not user or not user.verify_password(request.password):
+    if not user or not await user.verify_password(request.password):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="用户名或密码错误",
@@ -80,7 +101,7 @@ async def change_password(
             detail="用户不存在",
         )
 
-    if not user.verify_password(request.current_password):
+    if not await user.verify_password(request.current_password):
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="当前密码错误",
@@ -111,7 +132,7 @@ async def change_username(
             detail="用户不存在",
         )
 
-    if not user.verify_password(request.password):
+    if not await user.verify_password(request.password):
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="密码错误",
@@ -214,3 +235,193 @@ async def refresh_configs(current_user: TokenData = Depends(get_current_user)):
     await ConfigManager.refresh()
     logger.info(f"配置缓存已被 {current_user.username} 刷新")
     return {"message": "配置缓存已刷新"}
+
+
+# ==================== 上游管理 ====================
+
+
+def _upstream_response(upstream: Upstream) -> UpstreamResponse:
+    return UpstreamResponse(
+        id=upstream.id,
+        name=upstream.name,
+        base_url=upstream.base_url,
+        weight=upstream.weight,
+        enabled=upstream.enabled,
+        updated_at=upstream.updated_at,
+    )
+
+
+def _validate_upstream(request: UpstreamRequest) -> None:
+    if not request.name.strip():
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="上游名称不能为空",
+        )
+    if not request.base_url.startswith(("http://", "https://")):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="上游地址必须以 http:// 或 https:// 开头",
+        )
+    if request.weight < 1:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="权重至少为 1",
+        )
+
+
+@router.get("/upstreams", response_model=list[UpstreamResponse])
+async def get_upstreams(current_user: TokenData = Depends(get_current_user)):
+    """获取所有上游"""
+    upstreams = await Upstream.all().order_by("id")
+    return [_upstream_response(u) for u in upstreams]
+
+
+@router.post("/upstreams", response_model=UpstreamResponse)
+async def create_upstream(
+    request: UpstreamRequest,
+    current_user: TokenData = Depends(get_current_user),
+):
+    """新增上游"""
+    _validate_upstream(request)
+    if await Upstream.filter(name=request.name).exists():
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"上游 '{request.name}' 已存在",
+        )
+
+    upstream = await Upstream.create(
+        name=request.name.strip(),
+        base_url=request.base_url.strip(),
+        weight=request.weight,
+        enabled=request.enabled,
+    )
+    await UpstreamPool.reload()
+    logger.info(f"上游 '{upstream.name}' 被 {current_user.username} 新增")
+    return _upstream_response(upstream)
+
+
+@router.put("/upstreams/{upstream_id}", response_model=UpstreamResponse)
+async def update_upstream(
+    upstream_id: int,
+    request: UpstreamRequest,
+    current_user: TokenData = Depends(get_current_user),
+):
+    """更新上游"""
+    _validate_upstream(request)
+    upstream = await Upstream.filter(id=upstream_id).first()
+    if not upstream:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="上游不存在",
+        )
+    existing = await Upstream.filter(name=request.name).first()
+    if existing and existing.id != upstream.id:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"上游 '{request.name}' 已存在",
+        )
+
+    upstream.name = request.name.strip()
+    upstream.base_url = request.base_url.strip()
+    upstream.weight = request.weight
+    upstream.enabled = request.enabled
+    await upstream.save()
+    await UpstreamPool.reload()
+    logger.info(f"上游 '{upstream.name}' 被 {current_user.username} 更新")
+    return _upstream_response(upstream)
+
+
+@router.delete("/upstreams/{upstream_id}")
+async def delete_upstream(
+    upstream_id: int,
+    current_user: TokenData = Depends(get_current_user),
+):
+    """删除上游"""
+    upstream = await Upstream.filter(id=upstream_id).first()
+    if not upstream:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="上游不存在",
+        )
+
+    await upstream.delete()
+    await UpstreamPool.reload()
+    logger.info(f"上游 '{upstream.name}' 被 {current_user.username} 删除")
+    return {"message": f"上游 '{upstream.name}' 已删除"}
+
+
+# ==================== 运行统计 ====================
+
+
+@router.get("/stats/tool-cache")
+async def get_tool_cache_stats(current_user: TokenData = Depends(get_current_user)):
+    """获取工具定义转换缓存的命中统计（当前 Worker）"""
+    return ToolSchemaCache.stats()
+
+
+@router.get("/stats/streams")
+async def get_stream_stats(current_user: TokenData = Depends(get_current_user)):
+    """获取因客户端断开而取消的流式请求统计（当前 Worker）"""
+    return StreamStats.stats()
+
+
+@router.get("/stats/upstreams")
+async def get_upstream_stats(current_user: TokenData = Depends(get_current_user)):
+    """获取上游负载与健康状态（当前 Worker）"""
+    return UpstreamPool.stats()
+
+
+@router.get("/stats/concurrency")
+async def get_concurrency_stats(current_user: TokenData = Depends(get_current_user)):
+    """获取各上游/API 密钥的自适应并发上限与排队情况（当前 Worker）"""
+    return ConcurrencyLimiters.stats()
+
+
+@router.get("/stats/fair-queue")
+async def get_fair_queue_stats(current_user: TokenData = Depends(get_current_user)):
+    """获取公平队列的并发上限、进行中与排队请求数（当前 Worker）"""
+    return FairQueue.stats()
+
+
+@router.get("/stats/response-cache")
+async def get_response_cache_stats(current_user: TokenData = Depends(get_current_user)):
+    """获取响应缓存的条目数与内存占用（当前 Worker）"""
+    return ResponseCache.stats()
+
+
+@router.get("/stats/coalescing")
+async def get_coalescing_stats(current_user: TokenData = Depends(get_current_user)):
+    """获取共享上游流的请求数（当前 Worker）"""
+    return StreamCoalescer.stats()
+
+
+# ==================== 用量统计 ====================
+
+
+@router.get("/usage/daily")
+async def get_daily_usage(
+    days: int = 7,
+    key_id: str = "",
+    current_user: TokenData = Depends(get_current_user),
+):
+    """按日期与 API 密钥汇总最近 days 天（UTC）的请求数、Token 用量与平均耗时"""
+    return await usage_rollup(("day", "key_id", "key_hint"), days, key_id or None)
+
+
+@router.get("/usage/keys")
+async def get_key_usage(
+    days: int = 30,
+    current_user: TokenData = Depends(get_current_user),
+):
+    """按 API 密钥汇总最近 days 天（UTC）的请求数、Token 用量与平均耗时"""
+    return await usage_rollup(("key_id", "key_hint"), days)
+
+
+@router.get("/usage/models")
+async def get_model_usage(
+    days: int = 7,
+    key_id: str = "",
+    current_user: TokenData = Depends(get_current_user),
+):
+    """按日期与模型汇总最近 days 天（UTC）的请求数、Token 用量与平均耗时"""
+    return await usage_rollup(("day", "route", "model"), days, key_id or None)
@@ -19,3 +19,17 @@ async def validate_api_key(
 
     client_api_key = authorization.replace("Bearer ", "")
     return client_api_key
+
+
+async def validate_anthropic_api_key(
+    raw_request: Request,
+    x_api_key: Optional[str] = Header(None),  # anthropic clients
+    authorization: Optional[str] = Header(None),
+):
+    """
+    Validate API key from the x-api-key header, or Authorization as a fallback.
+    """
+
+    if x_api_key:
+        return x_api_key
+    return await validate_api_key(raw_request, authorization)
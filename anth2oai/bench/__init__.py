@@ -0,0 +1,11 @@
+"""Benchmark tooling: a mock upstream and a load generator for the proxy.
+
+Run the mock upstream, point ``ANTHROPIC_BASE_URL`` / ``OPENAI_BASE_URL`` of a
+proxy instance at it and drive the proxy with the load generator::
+
+    python -m anth2oai.bench mock --port 9100 --tokens-per-second 200
+    python -m anth2oai.bench run --proxy http://127.0.0.1:8363 \\
+        --upstream http://127.0.0.1:9100 --concurrency 64 --pid <gunicorn pid>
+
+See ``python -m anth2oai.bench --help`` for all options.
+"""
@@ -0,0 +1,25 @@
+import argparse
+
+from anth2oai.bench import mock_upstream, runner
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        prog="python -m anth2oai.bench", description="Benchmark the anth2oai proxy."
+    )
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    mock_parser = commands.add_parser("mock", help="serve the mock upstream")
+    mock_upstream.add_arguments(mock_parser)
+    mock_parser.set_defaults(handler=mock_upstream.run)
+
+    run_parser = commands.add_parser("run", help="drive load through the proxy")
+    runner.add_arguments(run_parser)
+    run_parser.set_defaults(handler=runner.run)
+
+    args = parser.parse_args()
+    args.handler(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,534 @@
+"""Mock Anthropic / OpenAI upstream for benchmarks.
+
+Serves canned or recorded streams at a configurable token rate so the proxy
+can be load-tested without touching the real APIs:
+
+- ``POST .../messages``: Anthropic Messages API (streaming and not)
+- ``POST .../responses``: OpenAI Responses API (streaming and not), used by
+  the codex route
+- ``GET .../models``: a one-model list, for the proxy's upstream health checks
+
+The scenario is the default from the command line, or picked per request by
+naming it in the model, e.g. ``claude-bench-tools`` or ``gpt-bench-error``:
+
+- ``text``: one text block
+- ``tools``: a short text block followed by a tool call
+- ``thinking``: a thinking block (with signature) before the text
+- ``error``: half of the text, then an ``error`` event mid-stream
+- ``replay``: the recorded ``.sse`` files given with ``--replay``, in turn
+
+``--error-rate`` additionally fails that share of requests up front with
+``--error-status`` (529 ``overloaded_error`` by default).
+"""
+
+import argparse
+import asyncio
+import itertools
+import json
+import random
+import time
+from dataclasses import dataclass, field
+from functools import lru_cache
+from pathlib import Path
+from typing import AsyncIterator, Optional
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+from anth2oai.sse import SSEParser
+
+SCENARIOS = ("text", "tools", "thinking", "error", "replay")
+
+# Events paced at the token rate; everything else is sent immediately
+_PACED_EVENTS = frozenset({"content_block_delta", "response.output_text.delta"})
+
+_WORDS = (
+    "The",
+    " quick",
+    " brown",
+    " fox",
+    " jumps",
+    " over",
+    " the",
+    " lazy",
+    " dog",
+    ".",
+    " Lorem",
+    " ipsum",
+    " dolor",
+    " sit",
+    " amet",
+    ",",
+)
+
+MOCK_TOOL_NAME = "get_weather"
+
+_ERROR_TYPES = {
+    400: "invalid_request_error",
+    401: "authentication_error",
+    429: "rate_limit_error",
+    500: "api_error",
+    529: "overloaded_error",
+}
+
+# (frame bytes, paced) pairs of one stream
+Frames = tuple[tuple[bytes, bool], ...]
+
+
+@dataclass
+class MockSettings:
+    tokens: int = 200
+    # 0 sends all tokens as fast as possible
+    tokens_per_second: float = 50.0
+    ttfb_ms: float = 0.0
+    scenario: str = "text"
+    error_rate: float = 0.0
+    error_status: int = 529
+    replay: list[Path] = field(default_factory=list)
+
+
+def _sse(event: str, data: dict) -> bytes:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n".encode("utf-8")
+
+
+def _words(count: int) -> list[str]:
+    return [_WORDS[i % len(_WORDS)] for i in range(count)]
+
+
+def _usage(input_tokens: int, output_tokens: int) -> dict:
+    return {
+        "input_tokens": input_tokens,
+        "output_tokens": output_tokens,
+        "cache_read_input_tokens": 0,
+        "cache_creation_input_tokens": 0,
+    }
+
+
+def _anthropic_events(
+    scenario: str, model: str, tokens: int, tool_name: str
+) -> list[tuple[str, dict]]:
+    """Anthropic stream events of a generated scenario."""
+    events = [
+        (
+            "message_start",
+            {
+                "type": "message_start",
+                "message": {
+                    "id": "msg_mock",
+                    "type": "message",
+                    "role": "assistant",
+                    "model": model,
+                    "content": [],
+                    "stop_reason": None,
+                    "stop_sequence": None,
+                    "usage": _usage(25, 1),
+                },
+            },
+        ),
+        ("ping", {"type": "ping"}),
+    ]
+    index = 0
+
+    def block(content_block: dict, deltas: list[dict]) -> None:
+        nonlocal index
+        events.append(
+            (
+                "content_block_start",
+                {
+                    "type": "content_block_start",
+                    "index": index,
+                    "content_block": content_block,
+                },
+            )
+        )
+        for delta in deltas:
+            events.append(
+                (
+                    "content_block_delta",
+                    {"type": "content_block_delta", "index": index, "delta": delta},
+                )
+            )
+        events.append(
+            ("content_block_stop", {"type": "content_block_stop", "index": index})
+        )
+        index += 1
+
+    text_tokens = tokens
+    if scenario == "thinking":
+        thinking_tokens = tokens // 2
+        text_tokens = tokens - thinking_tokens
+        block(
+            {"type": "thinking", "thinking": "", "signature": ""},
+            [
+                {"type": "thinking_delta", "thinking": word}
+                for word in _words(thinking_tokens)
+            ]
+            + [{"type": "signature_delta", "signature": "bW9jaw=="}],
+        )
+    elif scenario == "tools":
+        text_tokens = max(tokens // 4, 1)
+    elif scenario == "error":
+        text_tokens = max(tokens // 2, 1)
+
+    block(
+        {"type": "text", "text": ""},
+        [{"type": "text_delta", "text": word} for word in _words(text_tokens)],
+    )
+
+    if scenario == "error":
+        events.append(
+            (
+                "error",
+                {
+                    "type": "error",
+                    "error": {"type": "overloaded_error", "message": "Overloaded"},
+                },
+            )
+        )
+        return events
+
+    stop_reason = "end_turn"
+    if scenario == "tools":
+        arguments = json.dumps({"location": "Tokyo", "unit": "celsius"})
+        parts = max(tokens - text_tokens, 1)
+        step = max(len(arguments) // parts, 1)
+        block(
+            {"type": "tool_use", "id": "toolu_mock", "name": tool_name, "input": {}},
+            [
+                {"type": "input_json_delta", "partial_json": arguments[i : i + step]}
+                for i in range(0, len(arguments), step)
+            ],
+        )
+        stop_reason = "tool_use"
+
+    events.append(
+        (
+            "message_delta",
+            {
+                "type": "message_delta",
+                "delta": {"stop_reason": stop_reason, "stop_sequence": None},
+                "usage": {"output_tokens": tokens},
+            },
+        )
+    )
+    events.append(("message_stop", {"type": "message_stop"}))
+    return events
+
+
+@lru_cache(maxsize=64)
+def anthropic_frames(
+    scenario: str, model: str, tokens: int, tool_name: str = MOCK_TOOL_NAME
+) -> Frames:
+    """Pre-encoded frames, so serving a stream costs the mock next to nothing."""
+    return tuple(
+        (_sse(event, data), event in _PACED_EVENTS)
+        for event, data in _anthropic_events(scenario, model, tokens, tool_name)
+    )
+
+
+def load_replay(path: Path) -> Frames:
+    """Frames of a recorded Anthropic ``text/event-stream`` body."""
+    parser = SSEParser()
+    frames = parser.feed(path.read_bytes() + b"\n\n")
+    return tuple(
+        (b"event: %s\ndata: %s\n\n" % (event.encode(), data), event in _PACED_EVENTS)
+        for event, data in frames
+    )
+
+
+def _anthropic_message(scenario: str, model: str, tokens: int, tool_name: str) -> dict:
+    """Non-streaming Messages API response of a generated scenario."""
+    content = []
+    stop_reason = "end_turn"
+    if scenario == "thinking":
+        content.append(
+            {
+                "type": "thinking",
+                "thinking": "".join(_words(tokens // 2)),
+                "signature": "bW9jaw==",
+            }
+        )
+    content.append({"type": "text", "text": "".join(_words(tokens))})
+    if scenario == "tools":
+        content.append(
+            {
+                "type": "tool_use",
+                "id": "toolu_mock",
+                "name": tool_name,
+                "input": {"location": "Tokyo", "unit": "celsius"},
+            }
+        )
+        stop_reason = "tool_use"
+    return {
+        "id": "msg_mock",
+        "type": "message",
+        "role": "assistant",
+        "model": model,
+        "content": content,
+        "stop_reason": stop_reason,
+        "stop_sequence": None,
+        "usage": _usage(25, tokens),
+    }
+
+
+def _responses_usage(tokens: int) -> dict:
+    return {
+        "input_tokens": 25,
+        "input_tokens_details": {"cached_tokens": 0},
+        "output_tokens": tokens,
+        "output_tokens_details": {"reasoning_tokens": 0},
+        "total_tokens": 25 + tokens,
+    }
+
+
+def responses_response(model: str, tokens: int) -> dict:
+    """Completed OpenAI Responses API response with one text output item."""
+    text = "".join(_words(tokens))
+    return {
+        "id": "resp_mock",
+        "object": "response",
+        "created_at": int(time.time()),
+        "status": "completed",
+        "model": model,
+        "output": [
+            {
+                "id": "msg_mock",
+                "type": "message",
+                "status": "completed",
+                "role": "assistant",
+                "content": [{"type": "output_text", "text": text, "annotations": []}],
+            }
+        ],
+        "parallel_tool_calls": True,
+        "tool_choice": "auto",
+        "tools": [],
+        "usage": _responses_usage(tokens),
+    }
+
+
+@lru_cache(maxsize=64)
+def responses_frames(model: str, tokens: int) -> Frames:
+    """Pre-encoded OpenAI Responses API stream with one text output item."""
+    response_id = "resp_mock"
+    item_id = "msg_mock"
+    text = "".join(_words(tokens))
+    response = {
+        "id": response_id,
+        "object": "response",
+        "created_at": int(time.time()),
+        "status": "in_progress",
+        "model": model,
+        "output": [],
+        "parallel_tool_calls": True,
+        "tool_choice": "auto",
+        "tools": [],
+    }
+    item = {
+        "id": item_id,
+        "type": "message",
+        "status": "in_progress",
+        "role": "assistant",
+        "content": [],
+    }
+    part = {"type": "output_text", "text": "", "annotations": []}
+    done_part = {**part, "text": text}
+    done_item = {**item, "status": "completed", "content": [done_part]}
+    events = [
+        ("response.created", {"response": response}),
+        ("response.in_progress", {"response": response}),
+        ("response.output_item.added", {"output_index": 0, "item": item}),
+        (
+            "response.content_part.added",
+            {"item_id": item_id, "output_index": 0, "content_index": 0, "part": part},
+        ),
+    ]
+    events += [
+        (
+            "response.output_text.delta",
+            {"item_id": item_id, "output_index": 0, "content_index": 0, "delta": word},
+        )
+        for word in _words(tokens)
+    ]
+    events += [
+        (
+            "response.output_text.done",
+            {"item_id": item_id, "output_index": 0, "content_index": 0, "text": text},
+        ),
+        (
+            "response.content_part.done",
+            {
+                "item_id": item_id,
+                "output_index": 0,
+                "content_index": 0,
+                "part": done_part,
+            },
+        ),
+        ("response.output_item.done", {"output_index": 0, "item": done_item}),
+        (
+            "response.completed",
+            {
+                "response": {
+                    **response,
+                    "status": "completed",
+                    "output": [done_item],
+                    "usage": _responses_usage(tokens),
+                }
+            },
+        ),
+    ]
+    return tuple(
+        (
+            _sse(event, {"type": event, "sequence_number": number, **data}),
+            event in _PACED_EVENTS,
+        )
+        for number, (event, data) in enumerate(events)
+    )
+
+
+def _scenario_for(model: str, default: str) -> str:
+    for part in model.lower().split("-"):
+        if part in SCENARIOS:
+            return part
+    return default
+
+
+def create_mock_app(settings: MockSettings) -> FastAPI:
+    """Build the mock upstream application."""
+    app = FastAPI(docs_url=None, redoc_url=None)
+    replays = itertools.cycle([load_replay(path) for path in settings.replay])
+    interval = 1 / settings.tokens_per_second if settings.tokens_per_second > 0 else 0
+
+    async def paced(frames: Frames, tail: bytes = b"") -> AsyncIterator[bytes]:
+        # Sleep until each token's deadline rather than a fixed interval, so
+        # event loop delays in the mock do not accumulate into a slower rate
+        start = time.perf_counter()
+        sent = 0
+        for frame, is_paced in frames:
+            if is_paced and interval:
+                sent += 1
+                delay = start + sent * interval - time.perf_counter()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+            yield frame
+        if tail:
+            yield tail
+
+    def error_response() -> Optional[JSONResponse]:
+        if settings.error_rate <= 0 or random.random() >= settings.error_rate:
+            return None
+        status = settings.error_status
+        return JSONResponse(
+            {
+                "type": "error",
+                "error": {
+                    "type": _ERROR_TYPES.get(status, "api_error"),
+                    "message": f"Mock upstream error {status}",
+                },
+            },
+            status_code=status,
+        )
+
+    @app.get("/{path:path}")
+    async def models(path: str):
+        if not path.endswith("models"):
+            return JSONResponse(
+                {
+                    "type": "error",
+                    "error": {"type": "not_found_error", "message": path},
+                },
+                status_code=404,
+            )
+        return JSONResponse(
+            {
+                "data": [
+                    {"type": "model", "id": "claude-bench", "display_name": "Mock"}
+                ],
+                "has_more": False,
+                "first_id": "claude-bench",
+                "last_id": "claude-bench",
+            }
+        )
+
+    @app.post("/{path:path}")
+    async def upstream(path: str, request: Request):
+        body = await request.json()
+        if settings.ttfb_ms:
+            await asyncio.sleep(settings.ttfb_ms / 1000)
+        error = error_response()
+        if error is not None:
+            return error
+
+        model = body.get("model", "mock")
+        max_tokens = body.get("max_tokens") or body.get("max_output_tokens")
+        tokens = max(min(settings.tokens, max_tokens or settings.tokens), 1)
+        scenario = _scenario_for(model, settings.scenario)
+        # Call the first tool of the request, as the proxy maps names back
+        tool_name = (body.get("tools") or [{}])[0].get("name") or MOCK_TOOL_NAME
+
+        if path.endswith("responses"):
+            model = model.rsplit("/", 1)[-1]
+            if not body.get("stream"):
+                if interval:
+                    await asyncio.sleep(tokens * interval)
+                return JSONResponse(responses_response(model, tokens))
+            return StreamingResponse(
+                paced(responses_frames(model, tokens)),
+                media_type="text/event-stream",
+            )
+
+        if path.endswith("messages"):
+            if not body.get("stream"):
+                if interval:
+                    await asyncio.sleep(tokens * interval)
+                return JSONResponse(
+                    _anthropic_message(scenario, model, tokens, tool_name)
+                )
+            if scenario == "replay" and settings.replay:
+                frames = next(replays)
+            else:
+                frames = anthropic_frames(scenario, model, tokens, tool_name)
+            return StreamingResponse(paced(frames), media_type="text/event-stream")
+
+        return JSONResponse(
+            {"type": "error", "error": {"type": "not_found_error", "message": path}},
+            status_code=404,
+        )
+
+    return app
+
+
+def add_arguments(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9100)
+    parser.add_argument(
+        "--tokens", type=int, default=200, help="output tokens per response"
+    )
+    parser.add_argument(
+        "--tokens-per-second", type=float, default=50.0, help="0 streams without delay"
+    )
+    parser.add_argument(
+        "--ttfb-ms", type=float, default=0.0, help="delay before responding"
+    )
+    parser.add_argument("--scenario", choices=SCENARIOS, default="text")
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--error-status", type=int, default=529)
+    parser.add_argument(
+        "--replay", type=Path, action="append", default=[], help="recorded .sse file"
+    )
+
+
+def run(args: argparse.Namespace) -> None:
+    import uvicorn
+
+    settings = MockSettings(
+        tokens=args.tokens,
+        tokens_per_second=args.tokens_per_second,
+        ttfb_ms=args.ttfb_ms,
+        scenario=args.scenario,
+        error_rate=args.error_rate,
+        error_status=args.error_status,
+        replay=args.replay,
+    )
+    uvicorn.run(
+        create_mock_app(settings), host=args.host, port=args.port, log_level="warning"
+    )
@@ -0,0 +1,429 @@
+"""Load generator measuring the proxy's own overhead.
+
+Drives ``/v1/chat/completions`` with N concurrent streams and reports:
+
+- time to first token (TTFT) through the proxy and, with ``--upstream``,
+  directly against the (mock) upstream at the same concurrency, so the
+  difference is the latency the proxy adds
+- chunks per second, overall and per worker
+- CPU time per stream and peak RSS of the proxy processes (``--pid``: the
+  gunicorn master or a single uvicorn process; workers are found through
+  ``/proc``, so these figures are Linux only)
+
+The report is JSON. ``--compare`` checks it against an earlier report and
+exits with status 1 when a tracked metric regressed by more than
+``--max-regression``.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Optional
+
+import httpx
+
+from anth2oai.constants import ANTHROPIC_MESSAGES_PATH, ANTHROPIC_VERSION
+from anth2oai.sse import SSE_DONE, SSEParser
+
+BENCH_TOOLS = [
+    {
+        "type": "function",
+        "function": {
+            "name": "get_weather",
+            "description": "Get the current weather for a location.",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "location": {"type": "string"},
+                    "unit": {"type": "string", "enum": ["celsius", "fahrenheit"]},
+                },
+                "required": ["location"],
+            },
+        },
+    }
+]
+
+# Lower is better for all of them; (section, key, percentile or None)
+TRACKED_METRICS = (
+    ("added_ttft_ms", "p50", None),
+    ("added_ttft_ms", "p99", None),
+    ("proxy", "ttft_ms", "p50"),
+    ("proxy", "ttft_ms", "p99"),
+    ("process", "cpu_ms_per_stream", None),
+    ("process", "rss_total_bytes", None),
+)
+
+_DONE_DATA = SSE_DONE.strip().removeprefix("data: ").encode()
+# Events carrying generated content
+_ANTHROPIC_CONTENT_EVENTS = frozenset({"content_block_delta"})
+_RESPONSES_CONTENT_EVENTS = frozenset({"response.output_text.delta"})
+# Events that end a complete stream
+_FINAL_EVENTS = frozenset({"message_stop", "response.completed"})
+
+
+@dataclass
+class StreamResult:
+    ttft: Optional[float] = None
+    duration: float = 0.0
+    chunks: int = 0
+    complete: bool = False
+    error: Optional[str] = None
+
+
+def percentiles(values: list[float]) -> Optional[dict]:
+    """Nearest-rank percentiles (in the unit of ``values``)."""
+    if not values:
+        return None
+    values = sorted(values)
+
+    def rank(q: float) -> float:
+        return values[min(int(q * len(values)), len(values) - 1)]
+
+    return {
+        "p50": rank(0.50),
+        "p90": rank(0.90),
+        "p99": rank(0.99),
+        "mean": sum(values) / len(values),
+        "max": values[-1],
+    }
+
+
+def _is_openai_content(data: bytes) -> bool:
+    if data == _DONE_DATA:
+        return False
+    choices = json.loads(data).get("choices") or []
+    delta = choices[0].get("delta", {}) if choices else {}
+    return bool(delta.get("content") or delta.get("tool_calls"))
+
+
+async def _run_stream(
+    client: httpx.AsyncClient, url: str, headers: dict, body: dict, kind: str
+) -> StreamResult:
+    """Send one streaming request; ``kind`` is the SSE dialect of the response."""
+    result = StreamResult()
+    parser = SSEParser()
+    start = time.perf_counter()
+    try:
+        async with client.stream("POST", url, json=body, headers=headers) as response:
+            if response.status_code >= 400:
+                await response.aread()
+                result.error = str(response.status_code)
+                return result
+            async for chunk in response.aiter_raw():
+                for event, data in parser.feed(chunk):
+                    if event == "error":
+                        result.error = "stream_error"
+                        continue
+                    result.chunks += 1
+                    if event in _FINAL_EVENTS or b'"finish_reason": "' in data:
+                        result.complete = True
+                    if result.ttft is not None:
+                        continue
+                    if kind == "openai":
+                        is_content = _is_openai_content(data)
+                    elif kind == "anthropic":
+                        is_content = event in _ANTHROPIC_CONTENT_EVENTS
+                    else:
+                        is_content = event in _RESPONSES_CONTENT_EVENTS
+                    if is_content:
+                        result.ttft = time.perf_counter() - start
+        if result.error is None and not result.complete:
+            # The proxy ends failed streams without a finish_reason
+            result.error = "incomplete"
+    except httpx.HTTPError as e:
+        result.error = type(e).__name__
+    finally:
+        result.duration = time.perf_counter() - start
+    return result
+
+
+async def _run_phase(
+    url: str, headers: dict, body: dict, kind: str, concurrency: int, requests: int
+) -> tuple[list[StreamResult], float]:
+    """Run ``requests`` streams, ``concurrency`` at a time; returns results and wall time."""
+    limits = httpx.Limits(
+        max_connections=concurrency, max_keepalive_connections=concurrency
+    )
+    timeout = httpx.Timeout(600.0, connect=10.0)
+    results: list[StreamResult] = []
+    remaining = iter(range(requests))
+
+    async with httpx.AsyncClient(limits=limits, timeout=timeout) as client:
+
+        async def worker() -> None:
+            for _ in remaining:
+                results.append(await _run_stream(client, url, headers, body, kind))
+
+        start = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        wall = time.perf_counter() - start
+    return results, wall
+
+
+def _summarize(results: list[StreamResult], wall: float) -> dict:
+    ok = [r for r in results if r.error is None]
+    chunks = sum(r.chunks for r in results)
+    errors: dict[str, int] = {}
+    for r in results:
+        if r.error is not None:
+            errors[r.error] = errors.get(r.error, 0) + 1
+    ttft = percentiles([r.ttft * 1000 for r in ok if r.ttft is not None])
+    return {
+        "requests": len(results),
+        "errors": errors,
+        "ttft_ms": ttft,
+        "duration_ms": percentiles([r.duration * 1000 for r in ok]),
+        "chunks": chunks,
+        "chunks_per_sec": chunks / wall if wall else 0.0,
+        "wall_seconds": wall,
+    }
+
+
+# ---------------------------------------------------------------- /proc sampling
+
+
+def _children(pid: int) -> list[int]:
+    children = []
+    try:
+        for task in os.listdir(f"/proc/{pid}/task"):
+            with open(f"/proc/{pid}/task/{task}/children") as f:
+                children += [int(child) for child in f.read().split()]
+    except OSError:
+        pass
+    return children
+
+
+def _process_tree(pid: int) -> list[int]:
+    pids = [pid]
+    for child in _children(pid):
+        pids += _process_tree(child)
+    return pids
+
+
+def _cpu_seconds(pid: int) -> float:
+    try:
+        with open(f"/proc/{pid}/stat") as f:
+            # Fields after the parenthesised command name; utime and stime are
+            # fields 14 and 15 of the full line
+            fields = f.read().rpartition(")")[2].split()
+        return (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")
+    except (OSError, IndexError, ValueError):
+        return 0.0
+
+
+def _rss_bytes(pid: int) -> int:
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return 0
+
+
+class ProcessSampler:
+    """Tracks CPU time and peak RSS of process trees while a phase runs."""
+
+    def __init__(self, pids: list[int], interval: float = 0.25):
+        self.roots = pids
+        self.interval = interval
+        self.peak_rss: dict[int, int] = {}
+        self.cpu_start: dict[int, float] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    def pids(self) -> list[int]:
+        return [pid for root in self.roots for pid in _process_tree(root)]
+
+    def _sample(self) -> None:
+        for pid in self.pids():
+            self.cpu_start.setdefault(pid, _cpu_seconds(pid))
+            self.peak_rss[pid] = max(self.peak_rss.get(pid, 0), _rss_bytes(pid))
+
+    async def _loop(self) -> None:
+        while True:
+            self._sample()
+            await asyncio.sleep(self.interval)
+
+    def start(self) -> None:
+        self._sample()
+        self._task = asyncio.create_task(self._loop())
+
+    async def stop(self, streams: int, chunks: int, wall: float) -> dict:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+        self._sample()
+        cpu = sum(_cpu_seconds(pid) - start for pid, start in self.cpu_start.items())
+        workers = sum(len(_children(root)) or 1 for root in self.roots)
+        return {
+            "pids": sorted(self.peak_rss),
+            "workers": workers,
+            "cpu_seconds": cpu,
+            "cpu_ms_per_stream": cpu * 1000 / streams if streams else None,
+            "chunks_per_sec_per_worker": chunks / wall / workers if wall else 0.0,
+            "rss_bytes": {str(pid): rss for pid, rss in sorted(self.peak_rss.items())},
+            "rss_total_bytes": sum(self.peak_rss.values()),
+        }
+
+
+# ---------------------------------------------------------------- comparison
+
+
+def _metric(report: dict, section: str, key: str, sub: Optional[str]):
+    value = (report.get(section) or {}).get(key)
+    if sub is not None:
+        value = (value or {}).get(sub)
+    return value
+
+
+def compare_reports(current: dict, previous: dict, max_regression: float) -> dict:
+    """Ratio of each tracked metric to the previous run, and which regressed."""
+    changes = {}
+    regressions = []
+    for section, key, sub in TRACKED_METRICS:
+        name = ".".join(part for part in (section, key, sub) if part)
+        new = _metric(current, section, key, sub)
+        old = _metric(previous, section, key, sub)
+        if new is None or old is None or old <= 0:
+            continue
+        ratio = new / old
+        changes[name] = {"previous": old, "current": new, "ratio": ratio}
+        if ratio > 1 + max_regression:
+            regressions.append(name)
+    return {"changes": changes, "regressions": regressions}
+
+
+# ---------------------------------------------------------------- CLI
+
+
+async def run_benchmark(args: argparse.Namespace) -> dict:
+    proxy_headers = {"Authorization": f"Bearer {args.api_key}"}
+    anthropic_headers = {
+        "x-api-key": args.api_key,
+        "anthropic-version": ANTHROPIC_VERSION,
+    }
+    if args.route == "messages":
+        # Passthrough route: same protocol as the upstream, no conversion
+        proxy_url = args.proxy.rstrip("/") + "/v1/messages"
+        proxy_kind = "anthropic"
+        proxy_headers = anthropic_headers
+    else:
+        proxy_url = args.proxy.rstrip("/") + "/v1/chat/completions"
+        proxy_kind = "openai"
+    body = {
+        "model": args.model,
+        "stream": True,
+        "max_tokens": args.max_tokens,
+        "messages": [{"role": "user", "content": args.prompt}],
+    }
+    if args.tools:
+        body["tools"] = BENCH_TOOLS
+
+    report: dict = {
+        "config": {
+            "proxy": args.proxy,
+            "upstream": args.upstream,
+            "model": args.model,
+            "route": args.route,
+            "concurrency": args.concurrency,
+            "requests": args.requests,
+            "max_tokens": args.max_tokens,
+            "tools": args.tools,
+        },
+        "timestamp": time.time(),
+    }
+
+    if args.warmup:
+        await _run_phase(
+            proxy_url, proxy_headers, body, proxy_kind, args.concurrency, args.warmup
+        )
+
+    baseline = None
+    if args.upstream:
+        base = args.upstream.rstrip("/")
+        if "claude" in args.model.lower():
+            url = base + ANTHROPIC_MESSAGES_PATH
+            kind = "anthropic"
+            headers = anthropic_headers
+        else:
+            url = base + "/responses"
+            kind = "responses"
+            headers = proxy_headers
+        results, wall = await _run_phase(
+            url, headers, body, kind, args.concurrency, args.requests
+        )
+        baseline = _summarize(results, wall)
+    report["baseline"] = baseline
+
+    sampler = ProcessSampler(args.pid) if args.pid else None
+    if sampler is not None:
+        sampler.start()
+    results, wall = await _run_phase(
+        proxy_url, proxy_headers, body, proxy_kind, args.concurrency, args.requests
+    )
+    proxy = _summarize(results, wall)
+    report["proxy"] = proxy
+    report["process"] = (
+        await sampler.stop(len(results), proxy["chunks"], wall) if sampler else None
+    )
+
+    added = None
+    if baseline and baseline["ttft_ms"] and proxy["ttft_ms"]:
+        added = {
+            q: proxy["ttft_ms"][q] - baseline["ttft_ms"][q]
+            for q in ("p50", "p90", "p99")
+        }
+    report["added_ttft_ms"] = added
+    return report
+
+
+def add_arguments(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument(
+        "--proxy", default="http://127.0.0.1:8363", help="proxy base URL"
+    )
+    parser.add_argument(
+        "--upstream", help="mock upstream base URL, measured directly as the baseline"
+    )
+    parser.add_argument("--api-key", default="bench")
+    parser.add_argument("--model", default="claude-bench-text")
+    parser.add_argument(
+        "--route",
+        choices=("chat", "messages"),
+        default="chat",
+        help="proxy route: OpenAI chat completions, or the /v1/messages passthrough",
+    )
+    parser.add_argument("--concurrency", "-c", type=int, default=32)
+    parser.add_argument("--requests", "-n", type=int, default=256)
+    parser.add_argument(
+        "--warmup", type=int, default=16, help="requests before measuring"
+    )
+    parser.add_argument("--max-tokens", type=int, default=200)
+    parser.add_argument("--prompt", default="Tell me a story.")
+    parser.add_argument("--tools", action="store_true", help="send a tool definition")
+    parser.add_argument(
+        "--pid", type=int, action="append", default=[], help="proxy process to sample"
+    )
+    parser.add_argument("--output", "-o", type=Path, help="also write the report here")
+    parser.add_argument("--compare", type=Path, help="earlier report to compare with")
+    parser.add_argument("--max-regression", type=float, default=0.1)
+
+
+def run(args: argparse.Namespace) -> None:
+    report = asyncio.run(run_benchmark(args))
+    if args.compare:
+        previous = json.loads(args.compare.read_text())
+        report["comparison"] = compare_reports(report, previous, args.max_regression)
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        args.output.write_text(output)
+    print(output)
+
+    if args.compare and report["comparison"]["regressions"]:
+        sys.exit(1)
@@ -10,14 +10,21 @@ from openai.types.chat.chat_completion_chunk import ChatCompletionChunk
 from typing_extensions import Literal, overload
 
 from .configs import DEFAULT_ANTHROPIC_BASE_URL, DEFAULT_MAX_TOKENS
-from .constants import DEFAULT_HTTP_CLIENT_HEADERS
+from .constants import (
+    ANTHROPIC_MESSAGES_PATH,
+    ANTHROPIC_VERSION,
+    DEFAULT_HTTP_CLIENT_HEADERS,
+)
 from .format import (
     AnthropicStreamState,
     format_anthropic_response_to_openai_response,
     format_anthropic_stream_event_to_openai_chunk,
     format_openai_tools_to_anthropic_tools,
 )
-from .patch import patch_payload_tools
+from .pool import HTTPClientPool
+from .prompt_cache import apply_prompt_cache_breakpoints
+from .sse import ChunkEncoder, iter_sse_events
+from .tool_cache import ToolSchemaCache
 
 
 class Anth2OAI(OpenAI):
@@ -189,6 +196,9 @@ class AsyncAnth2OAI(AsyncOpenAI):
         if not base_url:
             base_url = DEFAULT_ANTHROPIC_BASE_URL
             logger.warning(f"Base URL not provided, using default: {base_url}")
+        if http_client is None:
+            # Borrow the shared keep-alive client for this upstream
+            http_client = HTTPClientPool.get(base_url)
         # TODO: support other params.
         self.client = AsyncAnthropic(
             api_key=api_key,
@@ -196,6 +206,15 @@ class AsyncAnth2OAI(AsyncOpenAI):
             http_client=http_client,
             default_headers=DEFAULT_HTTP_CLIENT_HEADERS,
         )
+        self.http_client = http_client
+        self._messages_url = (
+            str(self.client.base_url).rstrip("/") + ANTHROPIC_MESSAGES_PATH
+        )
+        self._raw_headers = {
+            **DEFAULT_HTTP_CLIENT_HEADERS,
+            "x-api-key": api_key,
+            "anthropic-version": ANTHROPIC_VERSION,
+        }
         self.chat = type(
             "obj",
             (object,),
@@ -254,13 +273,120 @@ class AsyncAnth2OAI(AsyncOpenAI):
     ) -> ChatCompletion | AsyncIterator[ChatCompletionChunk]:
         """
         Create a chat completion, compatible with OpenAI API.
+
+        Pass ``prompt_cache=True`` to add Anthropic prompt caching breakpoints
+        to the tools, system prompt and last user turn.
+        """
+        params = self._prepare_request(messages, model, tools, max_tokens, kwargs)
+        # Only the SSE encoder maps names back; chunk models strip the prefix
+        params.pop("tool_names")
+
+        if stream:
+            return self._stream_create(**params, timeout=timeout)
+        else:
+            return await self._non_stream_create(**params, timeout=timeout)
+
+    async def create_sse(
+        self,
+        *,
+        messages: list | None = None,
+        model: str | None = None,
+        tools: list | None = None,
+        max_tokens: int | None = None,
+        timeout: float | None = None,
+        raw: bool = False,
+        state: AnthropicStreamState | None = None,
+        **kwargs,
+    ) -> AsyncIterator[str]:
+        """
+        Streaming create that yields encoded ``data: {...}\\n\\n`` frames.
+
+        Frames are byte-for-byte what ``json.dumps`` of the chunks from
+        ``create(stream=True)`` would give, without building pydantic models.
+        The terminating ``data: [DONE]`` frame is left to the caller.
+
+        A final usage frame is sent when ``stream_options.include_usage`` is
+        set. With ``raw=True`` the upstream SSE bytes are parsed in-house and fed to
+        the encoder as plain dicts, skipping the Anthropic SDK event objects.
+        Pass ``state`` to observe the stream's progress (e.g. token usage).
         """
+        params = self._prepare_request(messages, model, tools, max_tokens, kwargs)
+        encoder = ChunkEncoder(
+            params["model"], state=state, tool_names=params["tool_names"]
+        )
+        if raw:
+            async for event_type, data in self._raw_stream(params, timeout):
+                frame = encoder.encode_dict(event_type, data)
+                if frame:
+                    yield frame
+        else:
+            stream = await self.client.messages.create(
+                max_tokens=params["max_tokens"],
+                system=params["system_prompt"],
+                messages=params["messages"],
+                model=params["model"],
+                tools=params["tools"],
+                timeout=timeout,
+                stream=True,
+            )
+            async for event in stream:
+                frame = encoder.encode(event)
+                if frame:
+                    yield frame
+
+        stream_options = kwargs.get("stream_options") or {}
+        if stream_options.get("include_usage"):
+            yield encoder.usage_frame()
+
+    async def _raw_stream(
+        self, params: dict, timeout
+    ) -> AsyncIterator[tuple[str, dict | None]]:
+        """POST a streaming Messages request and yield parsed SSE events."""
+        body = {
+            "model": params["model"],
+            "max_tokens": params["max_tokens"],
+            "messages": params["messages"],
+            "stream": True,
+        }
+        if params["system_prompt"] is not omit:
+            body["system"] = params["system_prompt"]
+        if params["tools"] is not omit:
+            body["tools"] = params["tools"]
+
+        request_kwargs = {"timeout": timeout} if timeout is not None else {}
+        async with self.http_client.stream(
+            "POST",
+            self._messages_url,
+            json=body,
+            headers=self._raw_headers,
+            **request_kwargs,
+        ) as response:
+            if response.status_code >= 400:
+                await response.aread()
+                raise self.client._make_status_error_from_response(response)
+
+            async for event_type, data in iter_sse_events(response.aiter_bytes()):
+                if event_type == "error":
+                    raise self.client._make_status_error(
+                        f"{data}", body=data, response=response
+                    )
+                yield event_type, data
+
+    def _prepare_request(
+        self,
+        messages: list | None,
+        model: str | None,
+        tools: list | None,
+        max_tokens: int | None,
+        kwargs: dict,
+    ) -> dict:
+        """Convert OpenAI-style arguments into Anthropic request parameters."""
         messages = messages or kwargs.get("messages")
         model = model or kwargs.get("model")
         # thinking={"type": "enabled", "budget_tokens": 6000},
 
-        # Convert tools
-        anthropic_tools = format_openai_tools_to_anthropic_tools(tools)
+        # Convert and prefix tools (memoized, shared read-only tuple)
+        anthropic_tools, tool_names = ToolSchemaCache.convert(tools)
         anthropic_tools = anthropic_tools or omit
 
         # Handle timeout and max_tokens
@@ -274,27 +400,21 @@ class AsyncAnth2OAI(AsyncOpenAI):
             if message.get("role") == "system":
                 system_prompt = messages.pop(i).get("content", "")
                 break
-        anthropic_tools = patch_payload_tools(anthropic_tools)
 
-        if stream:
-            return self._stream_create(
-                messages=messages,
-                model=model,
-                system_prompt=system_prompt,
-                tools=anthropic_tools,
-                max_tokens=max_tokens,
-                timeout=timeout,
-            )
-        else:
-            return await self._non_stream_create(
-                messages=messages,
-                model=model,
-                system_prompt=system_prompt,
-                tools=anthropic_tools,
-                max_tokens=max_tokens,
-                timeout=timeout,
+        if kwargs.get("prompt_cache"):
+            system_prompt, anthropic_tools, messages = apply_prompt_cache_breakpoints(
+                system_prompt, anthropic_tools, messages
             )
 
+        return {
+            "messages": messages,
+            "model": model,
+            "system_prompt": system_prompt,
+            "tools": anthropic_tools,
+            "max_tokens": max_tokens,
+            "tool_names": tool_names,
+        }
+
     async def _non_stream_create(
         self,
         messages: list,
@@ -3,9 +3,16 @@
 All configurations are read from the database (Config model).
 Initial values are loaded from .env file when the config doesn't exist in DB.
 Web interface modifications update the database directly.
+
+Every worker keeps its own cache. A background task polls SQLite's
+``PRAGMA data_version`` (which changes whenever another connection commits)
+every ``CONFIG_POLL_INTERVAL`` seconds and reloads when the watched tables
+changed, so edits made through any worker reach all of them within that
+delay while requests only ever read the in-memory cache.
 """
 
-from typing import Optional
+import asyncio
+from typing import Awaitable, Callable, Optional
 
 from loguru import logger
 from pathlib import Path
@@ -19,6 +26,10 @@ logger.add(LOGS_DIR / "anth2oai.log", rotation="100 MB", retention="10 days")
 # Legacy constants for backward compatibility (used by client.py as a standalone library)
 DEFAULT_ANTHROPIC_BASE_URL = "https://api.anthropic.com/v1"
 DEFAULT_MAX_TOKENS = 40960
+DEFAULT_CONFIG_POLL_INTERVAL = 2
+
+# Tables whose changes trigger a reload in the other workers
+WATCHED_TABLES = ("configs", "upstreams")
 
 # Default configuration values (used when not in .env and not in DB)
 DEFAULT_VALUES = {
@@ -41,6 +52,10 @@ class ConfigManager:
     _instance: Optional["ConfigManager"] = None
     _cache: dict[str, str] = {}
     _initialized: bool = False
+    _data_version: Optional[int] = None
+    _fingerprint: Optional[tuple] = None
+    _reload_callbacks: list[Callable[[], Awaitable[None]]] = []
+    _watch_task: Optional[asyncio.Task] = None
 
     def __new__(cls) -> "ConfigManager":
         if cls._instance is None:
@@ -152,6 +167,83 @@ class ConfigManager:
 
         return dict(instance._cache)
 
+    @classmethod
+    def on_reload(cls, callback: Callable[[], Awaitable[None]]) -> None:
+        """Register a coroutine to run after a change from another worker."""
+        cls._reload_callbacks.append(callback)
+
+    @classmethod
+    async def _table_fingerprint(cls, connection) -> tuple:
+        """Row count and latest ``updated_at`` of each watched table."""
+        fingerprint = []
+        for table in WATCHED_TABLES:
+            rows = await connection.execute_query_dict(
+                f"SELECT COUNT(*) AS n, MAX(updated_at) AS latest FROM {table}"
+            )
+            fingerprint.append((rows[0]["n"], rows[0]["latest"]))
+        return tuple(fingerprint)
+
+    @classmethod
+    async def check_for_changes(cls) -> bool:
+        """
+        Reload the cache (and run the reload callbacks) if another process
+        changed a watched table since the last check.
+
+        ``PRAGMA data_version`` is a per-connection counter that only moves
+        on commits from other connections, so the common no-change case is
+        a single cheap query. Commits to unrelated tables move it as well;
+        the table fingerprint filters those out.
+        """
+        from tortoise import connections
+
+        connection = connections.get("default")
+        rows = await connection.execute_query_dict("PRAGMA data_version")
+        data_version = rows[0]["data_version"]
+        if data_version == cls._data_version:
+            return False
+        cls._data_version = data_version
+
+        fingerprint = await cls._table_fingerprint(connection)
+        if fingerprint == cls._fingerprint:
+            return False
+        first_check = cls._fingerprint is None
+        cls._fingerprint = fingerprint
+        if first_check:
+            # Baseline taken right after startup, the cache is already fresh
+            return False
+
+        await cls()._load_from_db()
+        for callback in cls._reload_callbacks:
+            await callback()
+        logger.info("Config changed in another worker, cache reloaded")
+        return True
+
+    @classmethod
+    async def _watch_loop(cls) -> None:
+        while True:
+            interval = cls.get_cached_int(
+                "CONFIG_POLL_INTERVAL", DEFAULT_CONFIG_POLL_INTERVAL
+            )
+            await asyncio.sleep(max(interval, 1))
+            try:
+                await cls.check_for_changes()
+            except Exception as e:
+                logger.warning(f"Config change check failed: {e}")
+
+    @classmethod
+    async def start_watching(cls) -> None:
+        """Start polling for changes made by other workers."""
+        if cls._watch_task is None:
+            await cls.check_for_changes()
+            cls._watch_task = asyncio.create_task(cls._watch_loop())
+
+    @classmethod
+    async def stop_watching(cls) -> None:
+        if cls._watch_task is not None:
+            cls._watch_task.cancel()
+            await asyncio.gather(cls._watch_task, return_exceptions=True)
+            cls._watch_task = None
+
     @classmethod
     def get_cached(cls, key: str, default: Optional[str] = None) -> str:
         """
@@ -181,6 +273,23 @@ class ConfigManager:
         except ValueError:
             return default
 
+    @classmethod
+    def get_cached_float(cls, key: str, default: float = 0.0) -> float:
+        """Get a cached configuration value as float (synchronous)."""
+        value = cls.get_cached(key)
+        try:
+            return float(value) if value else default
+        except ValueError:
+            return default
+
+    @classmethod
+    def get_cached_bool(cls, key: str, default: bool = False) -> bool:
+        """Get a cached configuration value as boolean (synchronous)."""
+        value = cls.get_cached(key)
+        if not value:
+            return default
+        return value.strip().lower() in ("1", "true", "yes", "on")
+
 
 # Convenience functions for common configs
 async def get_anthropic_base_url() -> str:
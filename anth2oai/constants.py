@@ -1,5 +1,10 @@
 DEFAULT_THIKING_CONFIG = {"type": "enabled", "budget_tokens": 6000}
 
+# Anthropic Messages API, relative to the configured base URL (same path the
+# SDK appends, so raw and SDK requests hit the same endpoint)
+ANTHROPIC_MESSAGES_PATH = "/v1/messages"
+ANTHROPIC_VERSION = "2023-06-01"
+
 
 DEFAULT_HTTP_CLIENT_HEADERS = {
     "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/131.0.0.0 Safari/537.36",
@@ -2,15 +2,19 @@
 
 import asyncio
 import os
+from typing import Optional
 
 from loguru import logger
 from tortoise import Tortoise
 
-from anth2oai.models import DEFAULT_CONFIGS, Config, User
+from anth2oai.models import DEFAULT_CONFIGS, Config, User, run_bcrypt
 
 # Global flag to track if DB is initialized (for multi-worker scenarios)
 _db_initialized = False
-_init_lock = asyncio.Lock()
+# Tables and default rows exist (set before the fork in preload mode)
+_schema_ready = False
+# Created on first use, in the worker's event loop
+_init_lock: Optional[asyncio.Lock] = None
 
 
 TORTOISE_ORM = {
@@ -33,8 +37,10 @@ TORTOISE_ORM = {
 
 async def init_db():
     """Initialize database connection and create tables."""
-    global _db_initialized
+    global _db_initialized, _init_lock
 
+    if _init_lock is None:
+        _init_lock = asyncio.Lock()
     async with _init_lock:
         if _db_initialized:
             return
@@ -50,54 +56,77 @@ async def init_db():
             db_url=f"sqlite://{db_path}",
             modules={"models": ["anth2oai.models"]},
         )
-        await Tortoise.generate_schemas(safe=True)
+        if not _schema_ready:
+            await _create_schema()
+
+        _db_initialized = True
+        logger.info("数据库初始化完成")
+
+
+async def _create_schema():
+    """Create the tables, the default admin user and the default configs."""
+    global _schema_ready
+
+    await Tortoise.generate_schemas(safe=True)
 
-        # Create default admin user if not exists
+    # Create default admin user if not exists
+    try:
+        admin_exists = await User.filter(username="admin").exists()
+        if not admin_exists:
+            await User.create(
+                username="admin",
+                password_hash=await run_bcrypt(User.hash_password, "admin123"),
+            )
+            logger.info("创建默认管理员用户 (admin/admin123)")
+    except Exception as e:
+        logger.warning(f"创建管理员用户时出错（可能已存在）: {e}")
+
+    # Create or update default configs
+    for key, config_data in DEFAULT_CONFIGS.items():
         try:
-            admin_exists = await User.filter(username="admin").exists()
-            if not admin_exists:
-                await User.create(
-                    username="admin",
-                    password_hash=User.hash_password("admin123"),
+            config = await Config.filter(key=key).first()
+            if not config:
+                # Try to get from environment first
+                env_value = os.environ.get(key, config_data["value"])
+                await Config.create(
+                    key=key,
+                    value=env_value,
+                    description=config_data["description"],
                 )
-                logger.info("创建默认管理员用户 (admin/admin123)")
-        except Exception as e:
-            logger.warning(f"创建管理员用户时出错（可能已存在）: {e}")
-
-        # Create or update default configs
-        for key, config_data in DEFAULT_CONFIGS.items():
-            try:
-                config = await Config.filter(key=key).first()
-                if not config:
-                    # Try to get from environment first
-                    env_value = os.environ.get(key, config_data["value"])
-                    await Config.create(
-                        key=key,
-                        value=env_value,
-                        description=config_data["description"],
-                    )
-                    logger.info(f"创建默认配置: {key}")
-                else:
-                    # Update description if changed (for i18n updates)
-                    if config.description != config_data["description"]:
-                        config.description = config_data["description"]
-                        await config.save()
-                        logger.info(f"更新配置描述: {key}")
-            except Exception as e:
-                logger.warning(f"处理配置 {key} 时出错: {e}")
-
-        # Remove configs that are no longer in DEFAULT_CONFIGS
-        try:
-            all_configs = await Config.all()
-            for config in all_configs:
-                if config.key not in DEFAULT_CONFIGS:
-                    await config.delete()
-                    logger.info(f"删除废弃配置: {config.key}")
+                logger.info(f"创建默认配置: {key}")
+            else:
+                # Update description if changed (for i18n updates)
+                if config.description != config_data["description"]:
+                    config.description = config_data["description"]
+                    await config.save()
+                    logger.info(f"更新配置描述: {key}")
         except Exception as e:
-            logger.warning(f"清理废弃配置时出错: {e}")
-
-        _db_initialized = True
-        logger.info("数据库初始化完成")
+            logger.warning(f"处理配置 {key} 时出错: {e}")
+
+    # Remove configs that are no longer in DEFAULT_CONFIGS
+    try:
+        all_configs = await Config.all()
+        for config in all_configs:
+            if config.key not in DEFAULT_CONFIGS:
+                await config.delete()
+                logger.info(f"删除废弃配置: {config.key}")
+    except Exception as e:
+        logger.warning(f"清理废弃配置时出错: {e}")
+
+    _schema_ready = True
+
+
+async def prepare_db():
+    """
+    Create the tables and default rows once, before the workers fork (gunicorn
+    preload mode); the workers then only open their own connections.
+    """
+    global _init_lock
+
+    await init_db()
+    await close_db()
+    # Bound to this short-lived event loop, not the workers' ones
+    _init_lock = None
 
 
 async def close_db():
@@ -1,33 +1,24 @@
 # format.py
+#
+# The openai / anthropic SDK types are imported where they are used, so that
+# importing this module (and the server) does not load either SDK.
+
+from __future__ import annotations
 
 import json
 import time
-from typing import Any, Optional
-
-from anthropic.types import Message, TextBlock, ToolUseBlock
-from anthropic.types.message import Message
-from openai.types.chat.chat_completion import (
-    ChatCompletion,
-    ChatCompletionMessage,
-    Choice,
-    CompletionUsage,
-)
-from openai.types.chat.chat_completion_chunk import (
-    ChatCompletionChunk,
-    ChoiceDelta,
-    ChoiceDeltaToolCall,
-    ChoiceDeltaToolCallFunction,
-)
-from openai.types.chat.chat_completion_chunk import (
-    Choice as ChunkChoice,
-)
-from openai.types.chat.chat_completion_message_tool_call import (
-    ChatCompletionMessageToolCall,
-    Function,
-)
+from typing import TYPE_CHECKING, Any, Optional
 
 from .patch import TOOL_PATCH_PREFIX
 
+if TYPE_CHECKING:
+    from anthropic.types import Message
+    from openai.types.chat.chat_completion import ChatCompletion, CompletionUsage
+    from openai.types.chat.chat_completion_chunk import ChatCompletionChunk
+    from openai.types.chat.chat_completion_message_tool_call import (
+        ChatCompletionMessageToolCall,
+    )
+
 
 class AnthropicStreamState:
     """Track state across streaming events for proper OpenAI format conversion."""
@@ -38,6 +29,38 @@ class AnthropicStreamState:
         self.sent_initial_role: bool = False
         self.current_content_block_index: int = -1
         self.current_content_block_type: Optional[str] = None
+        # Token usage reported by message_start / message_delta
+        self.input_tokens: int = 0
+        self.output_tokens: int = 0
+        self.cache_read_input_tokens: int = 0
+        self.cache_creation_input_tokens: int = 0
+
+    def update_usage(self, usage) -> None:
+        """Record an Anthropic usage object or dict (fields may be missing/None)."""
+        if not usage:
+            return
+        for field in (
+            "input_tokens",
+            "output_tokens",
+            "cache_read_input_tokens",
+            "cache_creation_input_tokens",
+        ):
+            if isinstance(usage, dict):
+                value = usage.get(field)
+            else:
+                value = getattr(usage, field, None)
+            if value is not None:
+                setattr(self, field, value)
+
+    @property
+    def total_tokens(self) -> int:
+        """Prompt (cached included) plus completion tokens."""
+        return (
+            self.input_tokens
+            + self.cache_read_input_tokens
+            + self.cache_creation_input_tokens
+            + self.output_tokens
+        )
 
 
 def format_anthropic_stream_event_to_openai_chunk(
@@ -56,6 +79,16 @@ def format_anthropic_stream_event_to_openai_chunk(
     - message_delta
     - message_stop
     """
+    from openai.types.chat.chat_completion_chunk import (
+        ChatCompletionChunk,
+        ChoiceDelta,
+        ChoiceDeltaToolCall,
+        ChoiceDeltaToolCallFunction,
+    )
+    from openai.types.chat.chat_completion_chunk import (
+        Choice as ChunkChoice,
+    )
+
     event_type = getattr(event, "type", None)
     created = int(time.time())
 
@@ -314,6 +347,12 @@ def format_anthropic_response_to_openai_response(
     Convert Anthropic Message response to OpenAI ChatCompletion format.
     Handles both tool calls and regular text responses.
     """
+    from openai.types.chat.chat_completion import (
+        ChatCompletion,
+        ChatCompletionMessage,
+        Choice,
+    )
+
     # Build message content and tool calls
     content, tool_calls = _build_message_content(anthropic_response.content)
 
@@ -361,22 +400,23 @@ def _build_message_content(
     Build message content and tool calls from Anthropic content blocks.
     Returns (text_content, tool_calls)
     """
+    from openai.types.chat.chat_completion_message_tool_call import (
+        ChatCompletionMessageToolCall,
+        Function,
+    )
+
     text_parts = []
     tool_calls = []
 
     for block in content_blocks:
-        if isinstance(block, TextBlock) or (
-            hasattr(block, "type") and block.type == "text"
-        ):
+        if getattr(block, "type", None) == "text":
             text_parts.append(block.text)
-        elif isinstance(block, ToolUseBlock) or (
-            hasattr(block, "type") and block.type == "tool_use"
-        ):
+        elif getattr(block, "type", None) == "tool_use":
             tool_call = ChatCompletionMessageToolCall(
                 id=block.id,
                 type="function",
                 function=Function(
-                    name=block.name,
+                    name=block.name.removeprefix(TOOL_PATCH_PREFIX),
                     arguments=json.dumps(block.input)
                     if isinstance(block.input, dict)
                     else str(block.input),
@@ -406,13 +446,46 @@ def _build_usage(anthropic_usage: Any) -> CompletionUsage:
     output_tokens = (
         getattr(anthropic_usage, "output_tokens", 0) if anthropic_usage else 0
     )
+    cache_read_tokens = getattr(anthropic_usage, "cache_read_input_tokens", None) or 0
+    cache_creation_tokens = (
+        getattr(anthropic_usage, "cache_creation_input_tokens", None) or 0
+    )
+
+    return build_completion_usage(
+        input_tokens, output_tokens, cache_read_tokens, cache_creation_tokens
+    )
+
+
+def build_completion_usage(
+    input_tokens: int,
+    output_tokens: int,
+    cache_read_tokens: int = 0,
+    cache_creation_tokens: int = 0,
+) -> CompletionUsage:
+    """
+    Build OpenAI CompletionUsage from Anthropic token counts.
+
+    Anthropic's ``input_tokens`` excludes cached tokens while OpenAI's
+    ``prompt_tokens`` includes them, so cache reads and writes are added back.
+    Cache reads are reported as ``prompt_tokens_details.cached_tokens``; cache
+    writes as the extra ``prompt_tokens_details.cache_creation_tokens``.
+    """
+    from openai.types.completion_usage import CompletionUsage, PromptTokensDetails
+
+    prompt_tokens = input_tokens + cache_read_tokens + cache_creation_tokens
+    prompt_tokens_details = None
+    if cache_read_tokens or cache_creation_tokens:
+        prompt_tokens_details = PromptTokensDetails(
+            cached_tokens=cache_read_tokens,
+            cache_creation_tokens=cache_creation_tokens,
+        )
 
     return CompletionUsage(
         completion_tokens=output_tokens,
-        prompt_tokens=input_tokens,
-        total_tokens=input_tokens + output_tokens,
+        prompt_tokens=prompt_tokens,
+        total_tokens=prompt_tokens + output_tokens,
         completion_tokens_details=None,
-        prompt_tokens_details=None,
+        prompt_tokens_details=prompt_tokens_details,
     )
 
 
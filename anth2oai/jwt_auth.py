@@ -1,6 +1,8 @@
 """JWT Authentication module for admin panel."""
 
 import os
+import time
+from collections import deque
 from datetime import datetime, timedelta
 from typing import Optional
 
@@ -10,6 +12,8 @@ from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
 from loguru import logger
 from pydantic import BaseModel
 
+from anth2oai.configs import ConfigManager
+
 # JWT Configuration
 JWT_SECRET = os.environ.get("JWT_SECRET", "your-secret-key-change-in-production")
 JWT_ALGORITHM = "HS256"
@@ -17,6 +21,13 @@ JWT_EXPIRATION_HOURS = int(os.environ.get("JWT_EXPIRATION_HOURS", "24"))
 
 security = HTTPBearer()
 
+DEFAULT_LOGIN_MAX_ATTEMPTS = 10
+DEFAULT_LOGIN_WINDOW_SECONDS = 60
+# Sweep idle clients once the table grows past this
+LOGIN_LIMITER_MAX_CLIENTS = 4096
+# Longer usernames cannot exist (User.username), so they share one entry
+LOGIN_LIMITER_MAX_USERNAME = 50
+
 
 class TokenData(BaseModel):
     """Token payload data."""
@@ -77,6 +88,53 @@ def verify_token(token: str) -> Optional[TokenData]:
         return None
 
 
+class LoginRateLimiter:
+    """
+    Sliding-window limit on login attempts per username and client address.
+
+    Every attempt costs a bcrypt verification; capping them keeps a login
+    burst or brute-force attempt from tying up the worker. Keying on the
+    username as well keeps clients behind one NAT or proxy address from
+    locking each other out. The attempts are counted per worker, so with
+    several gunicorn workers a client gets up to ``LOGIN_MAX_ATTEMPTS`` per
+    worker in a window.
+    """
+
+    _attempts: dict[tuple[str, str], deque] = {}
+
+    @classmethod
+    def hit(cls, username: str, client: str) -> Optional[int]:
+        """
+        Record an attempt; returns seconds to wait if the username and client
+        are over the limit (the attempt is then not recorded), else None.
+        """
+        max_attempts = ConfigManager.get_cached_int(
+            "LOGIN_MAX_ATTEMPTS", DEFAULT_LOGIN_MAX_ATTEMPTS
+        )
+        window = ConfigManager.get_cached_int(
+            "LOGIN_WINDOW_SECONDS", DEFAULT_LOGIN_WINDOW_SECONDS
+        )
+        if max_attempts <= 0:
+            return None
+
+        now = time.monotonic()
+        if len(cls._attempts) > LOGIN_LIMITER_MAX_CLIENTS:
+            cls._attempts = {
+                key: attempts
+                for key, attempts in cls._attempts.items()
+                if attempts and attempts[-1] > now - window
+            }
+        attempts = cls._attempts.setdefault(
+            (username[:LOGIN_LIMITER_MAX_USERNAME], client), deque()
+        )
+        while attempts and attempts[0] <= now - window:
+            attempts.popleft()
+        if len(attempts) >= max_attempts:
+            return max(int(attempts[0] + window - now) + 1, 1)
+        attempts.append(now)
+        return None
+
+
 async def get_current_user(
     credentials: HTTPAuthorizationCredentials = Depends(security),
 ) -> TokenData:
@@ -122,3 +180,23 @@ class ConfigResponse(BaseModel):
     value: str
     description: Optional[str]
     updated_at: datetime
+
+
+class UpstreamRequest(BaseModel):
+    """Upstream create/update request body."""
+
+    name: str
+    base_url: str
+    weight: int = 1
+    enabled: bool = True
+
+
+class UpstreamResponse(BaseModel):
+    """Upstream response."""
+
+    id: int
+    name: str
+    base_url: str
+    weight: int
+    enabled: bool
+    updated_at: datetime
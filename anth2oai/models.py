@@ -1,8 +1,43 @@
 """Database models for admin panel using Tortoise ORM."""
 
+import asyncio
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+
 import bcrypt
 from tortoise import fields, models
 
+# bcrypt takes hundreds of milliseconds per call by design; it runs on this
+# small pool so it never blocks the event loop serving the streams
+BCRYPT_THREADS = 2
+_bcrypt_executor: Optional[ThreadPoolExecutor] = None
+
+
+def _drop_bcrypt_executor() -> None:
+    # A forked child has none of the parent's threads, but an inherited
+    # executor would count its idle thread and hand it work that never runs
+    # (e.g. the gunicorn master hashed the default admin password before
+    # forking the workers in preload mode)
+    global _bcrypt_executor
+    _bcrypt_executor = None
+
+
+os.register_at_fork(after_in_child=_drop_bcrypt_executor)
+
+
+async def run_bcrypt(func, *args):
+    """Run a bcrypt call on the bounded bcrypt thread pool."""
+    global _bcrypt_executor
+    if _bcrypt_executor is None:
+        # Created on first use in each process (see _drop_bcrypt_executor)
+        _bcrypt_executor = ThreadPoolExecutor(
+            max_workers=BCRYPT_THREADS, thread_name_prefix="bcrypt"
+        )
+    return await asyncio.get_running_loop().run_in_executor(
+        _bcrypt_executor, func, *args
+    )
+
 
 class User(models.Model):
     """Admin user model for authentication."""
@@ -16,22 +51,22 @@ class User(models.Model):
     class Meta:
         table = "users"
 
-    def verify_password(self, password: str) -> bool:
-        """Verify password against stored hash."""
-        return bcrypt.checkpw(
-            password.encode("utf-8"), self.password_hash.encode("utf-8")
+    async def verify_password(self, password: str) -> bool:
+        """Verify password against stored hash (off the event loop)."""
+        return await run_bcrypt(
+            bcrypt.checkpw, password.encode("utf-8"), self.password_hash.encode("utf-8")
         )
 
     @staticmethod
     def hash_password(password: str) -> str:
-        """Hash a password for storage."""
+        """Hash a password for storage (blocking; see ``set_password``)."""
         salt = bcrypt.gensalt()
         hashed = bcrypt.hashpw(password.encode("utf-8"), salt)
         return hashed.decode("utf-8")
 
     async def set_password(self, password: str) -> None:
         """Set a new password."""
-        self.password_hash = self.hash_password(password)
+        self.password_hash = await run_bcrypt(self.hash_password, password)
         await self.save()
 
 
@@ -63,6 +98,48 @@ class Config(models.Model):
         return config
 
 
+class Upstream(models.Model):
+    """Anthropic-compatible upstream endpoint of the Claude route's pool."""
+
+    id = fields.IntField(pk=True)
+    name = fields.CharField(max_length=100, unique=True)
+    base_url = fields.CharField(max_length=500)
+    weight = fields.IntField(default=1)
+    enabled = fields.BooleanField(default=True)
+    created_at = fields.DatetimeField(auto_now_add=True)
+    updated_at = fields.DatetimeField(auto_now=True)
+
+    class Meta:
+        table = "upstreams"
+
+
+class UsageRecord(models.Model):
+    """Token usage and latency of one proxied request (the usage ledger)."""
+
+    id = fields.BigIntField(pk=True)
+    # UTC date, for the per-day rollups
+    day = fields.DateField()
+    created_at = fields.DatetimeField()
+    # The API key itself is never stored: a hash prefix and its last characters
+    key_id = fields.CharField(max_length=16)
+    key_hint = fields.CharField(max_length=16)
+    route = fields.CharField(max_length=16)
+    model = fields.CharField(max_length=100)
+    stream = fields.BooleanField()
+    # ok, error or cancelled (client gone)
+    status = fields.CharField(max_length=16)
+    input_tokens = fields.IntField(default=0)
+    output_tokens = fields.IntField(default=0)
+    cache_read_tokens = fields.IntField(default=0)
+    cache_creation_tokens = fields.IntField(default=0)
+    duration_ms = fields.IntField()
+    first_event_ms = fields.IntField(null=True)
+
+    class Meta:
+        table = "usage"
+        indexes = (("day", "key_id"),)
+
+
 # Default configuration keys
 DEFAULT_CONFIGS = {
     "ANTHROPIC_BASE_URL": {
@@ -77,6 +154,214 @@ DEFAULT_CONFIGS = {
         "value": "40960",
         "description": "API 响应的默认最大 Token 数量",
     },
+    "HTTP_POOL_MAX_CONNECTIONS": {
+        "value": "200",
+        "description": "上游 HTTP 连接池最大连接数（每个 Worker、每个上游地址）",
+    },
+    "HTTP_POOL_MAX_KEEPALIVE": {
+        "value": "50",
+        "description": "上游 HTTP 连接池最大保活连接数",
+    },
+    "HTTP_POOL_KEEPALIVE_EXPIRY": {
+        "value": "30",
+        "description": "上游空闲保活连接的过期时间（秒）",
+    },
+    "HTTP_POOL_HTTP2": {
+        "value": "false",
+        "description": "上游连接是否启用 HTTP/2（需安装 h2）",
+    },
+    "UPSTREAM_RAW_SSE": {
+        "value": "true",
+        "description": "流式请求直接解析上游 SSE 字节流（不构造 Anthropic SDK 事件对象）",
+    },
+    "PROMPT_CACHE_MODELS": {
+        "value": "",
+        "description": "启用 Anthropic 提示缓存的模型（逗号分隔，支持 * 通配符，如 claude-sonnet-4*；留空禁用）",
+    },
+    "TOOL_CACHE_SIZE": {
+        "value": "256",
+        "description": "工具定义转换缓存的最大条目数（每个 Worker）",
+    },
+    "METRICS_MODELS": {
+        "value": "claude-*,gpt-*,*codex*",
+        "description": "Prometheus 指标中单独统计的模型（逗号分隔，支持 * 通配符），其他模型归入 other",
+    },
+    "RESPONSE_GZIP_MIN_BYTES": {
+        "value": "1024",
+        "description": "非流式响应超过该字节数且客户端支持时启用 gzip 压缩（0 为禁用）",
+    },
+    "RESPONSE_CACHE": {
+        "value": "false",
+        "description": "缓存 temperature 为 0 的请求的完整响应，相同请求直接返回（客户端可用 Cache-Control: no-cache 强制刷新，no-store 跳过缓存）",
+    },
+    "RESPONSE_CACHE_TTL": {
+        "value": "86400",
+        "description": "响应缓存的有效期（秒）",
+    },
+    "RESPONSE_CACHE_MEMORY_MB": {
+        "value": "64",
+        "description": "响应缓存的内存上限（MB，每个 Worker，按最近最少使用淘汰）",
+    },
+    "RESPONSE_CACHE_DIR": {
+        "value": "",
+        "description": "响应缓存的磁盘目录，所有 Worker 共享（留空则只使用内存缓存）",
+    },
+    "RESPONSE_CACHE_DISK_MB": {
+        "value": "1024",
+        "description": "响应缓存的磁盘上限（MB），超出时删除最早的条目",
+    },
+    "STREAM_COALESCE": {
+        "value": "false",
+        "description": "相同 API 密钥的完全相同的确定性流式请求（temperature 显式为 0）同时进行时共享一个上游流（后到的请求从缓冲区补发已输出的内容）",
+    },
+    "STREAM_COALESCE_WINDOW": {
+        "value": "2",
+        "description": "共享上游流的时间窗口（秒），上游流开始超过该时间后到达的相同请求单独请求上游",
+    },
+    "STREAM_RESUME": {
+        "value": "false",
+        "description": "流式响应的每个事件带上 SSE id，连接中断后客户端携带 Last-Event-ID 重新请求即可从断点继续（需将重连请求路由到同一 Worker）",
+    },
+    "STREAM_RESUME_WINDOW": {
+        "value": "30",
+        "description": "客户端断开后上游流继续运行、等待重连的时间（秒）；流结束后同样保留该时长",
+    },
+    "STREAM_BUFFER_FRAMES": {
+        "value": "4096",
+        "description": "每个共享/可恢复的流在内存中保留的最近事件数",
+    },
+    "UPSTREAM_BALANCE_STRATEGY": {
+        "value": "least_outstanding",
+        "description": "多上游负载均衡策略：least_outstanding（最少进行中请求）或 ewma（延迟指数加权平均）；未配置上游时使用 ANTHROPIC_BASE_URL",
+    },
+    "UPSTREAM_EJECT_FAILURES": {
+        "value": "3",
+        "description": "上游连续失败（5xx/超时/连接错误）多少次后暂时摘除",
+    },
+    "UPSTREAM_EJECT_SECONDS": {
+        "value": "30",
+        "description": "上游被摘除的基础时长（秒），连续摘除时成倍增加",
+    },
+    "UPSTREAM_HEALTH_INTERVAL": {
+        "value": "10",
+        "description": "上游主动健康检查间隔（秒，0 为禁用）",
+    },
+    "UPSTREAM_HEALTH_PATH": {
+        "value": "/v1/models",
+        "description": "健康检查请求路径（拼接在上游地址之后；返回 2xx、401 或 403 即视为健康）",
+    },
+    "UPSTREAM_ADAPTIVE_CONCURRENCY": {
+        "value": "true",
+        "description": "按上游和 API 密钥自适应限制并发（收到 429/529 时收缩，成功时缓慢增长，超出的请求排队）",
+    },
+    "UPSTREAM_CONCURRENCY_INITIAL": {
+        "value": "32",
+        "description": "每个上游/API 密钥的初始并发上限（每个 Worker）",
+    },
+    "UPSTREAM_CONCURRENCY_MIN": {
+        "value": "1",
+        "description": "自适应并发上限的最小值",
+    },
+    "UPSTREAM_CONCURRENCY_MAX": {
+        "value": "256",
+        "description": "自适应并发上限的最大值",
+    },
+    "UPSTREAM_QUEUE_MAX": {
+        "value": "128",
+        "description": "达到并发上限后最多排队的请求数，超出时返回 503",
+    },
+    "UPSTREAM_QUEUE_TIMEOUT": {
+        "value": "30",
+        "description": "请求排队等待的最长时间（秒），超时返回 503",
+    },
+    "UPSTREAM_RETRY_MAX": {
+        "value": "2",
+        "description": "流式请求在向客户端发出首个字节前，遇到连接错误、5xx 或 429/529 时的最大重试次数（0 为禁用）",
+    },
+    "UPSTREAM_RETRY_BASE_MS": {
+        "value": "250",
+        "description": "重试退避的基础时长（毫秒），每次重试翻倍并加随机抖动",
+    },
+    "UPSTREAM_RETRY_MAX_DELAY_MS": {
+        "value": "4000",
+        "description": "单次重试的最长等待（毫秒）；上游 retry-after 超过该值时不再重试",
+    },
+    "UPSTREAM_HEDGE": {
+        "value": "false",
+        "description": "首字节迟迟未到时向另一个上游发出对冲请求，先返回者胜出（需配置多个上游）",
+    },
+    "UPSTREAM_HEDGE_MIN_DELAY_MS": {
+        "value": "200",
+        "description": "对冲请求的最短等待（毫秒）；实际等待为近期首字节延迟的 P95，不低于该值",
+    },
+    "CONFIG_POLL_INTERVAL": {
+        "value": "2",
+        "description": "各 Worker 检查配置变更的间隔（秒），修改配置后最迟在该时间内对所有 Worker 生效",
+    },
+    "ADMISSION_MAX_LOOP_LAG_MS": {
+        "value": "500",
+        "description": "事件循环延迟（平滑后，毫秒）超过该值时新请求直接返回 503（每个 Worker，0 为禁用）",
+    },
+    "ADMISSION_MAX_STREAMS": {
+        "value": "0",
+        "description": "每个 Worker 同时处理的流式请求上限，超过时新请求返回 503（0 为不限制）",
+    },
+    "ADMISSION_RETRY_AFTER": {
+        "value": "2",
+        "description": "过载返回 503 时 Retry-After 响应头的秒数",
+    },
+    "FAIR_QUEUE_MAX_CONCURRENCY": {
+        "value": "0",
+        "description": "每个 Worker 同时发往上游的请求上限，超过时请求按 API 密钥轮流（加权公平）排队（0 为不排队）",
+    },
+    "FAIR_QUEUE_WEIGHTS": {
+        "value": "",
+        "description": '公平队列中各 API 密钥的权重，JSON 对象，键为用量统计中的密钥 ID（key_id），如 {"3f2a9c0d1e4b5a67": 2}（未列出的密钥权重为 1）',
+    },
+    "FAIR_QUEUE_MAX": {
+        "value": "256",
+        "description": "公平队列中等待的请求上限，队列已满时新请求返回 503",
+    },
+    "FAIR_QUEUE_TIMEOUT": {
+        "value": "30",
+        "description": "请求在公平队列中的最长等待时间（秒），超时返回 503；客户端可通过 X-Queue-Timeout 请求头缩短",
+    },
+    "USAGE_LEDGER": {
+        "value": "true",
+        "description": "将每个请求的 Token 用量、耗时与模型记录到用量表（内存中排队，后台批量写入）",
+    },
+    "USAGE_FLUSH_ROWS": {
+        "value": "200",
+        "description": "排队的用量记录达到该条数时立即批量写入（每个 Worker）",
+    },
+    "USAGE_FLUSH_INTERVAL_MS": {
+        "value": "1000",
+        "description": "用量记录批量写入的最长间隔（毫秒）",
+    },
+    "USAGE_RETENTION_DAYS": {
+        "value": "90",
+        "description": "用量记录的保留天数（0 为永久保留）",
+    },
+    "RATE_LIMIT_RPS": {
+        "value": "0",
+        "description": "每个 API 密钥每秒允许的请求数，所有 Worker 共享计数，超过时返回 429（0 为不限制）",
+    },
+    "RATE_LIMIT_BURST": {
+        "value": "0",
+        "description": "每个 API 密钥可突发的请求数（令牌桶容量，0 为与 RATE_LIMIT_RPS 相同）",
+    },
+    "RATE_LIMIT_TPM": {
+        "value": "0",
+        "description": "每个 API 密钥每分钟允许的 Token 数（输入加输出，按上游返回的用量在请求结束后扣减，0 为不限制）",
+    },
+    "LOGIN_MAX_ATTEMPTS": {
+        "value": "10",
+        "description": "每个用户名和客户端地址在时间窗口内允许的管理面板登录尝试次数（每个 Worker 独立计数，0 为不限制）",
+    },
+    "LOGIN_WINDOW_SECONDS": {
+        "value": "60",
+        "description": "登录尝试次数限制的时间窗口（秒）",
+    },
     "LOG_LEVEL": {
         "value": "INFO",
         "description": "日志级别（DEBUG、INFO、WARNING、ERROR）",
@@ -0,0 +1,99 @@
+"""Pooled upstream HTTP clients.
+
+One ``httpx.AsyncClient`` is kept per upstream base URL for the lifetime of a
+worker, so every proxied request reuses warm keep-alive connections instead of
+opening (and leaking) a fresh TCP+TLS connection. Clients are created lazily on
+first use and closed from the application lifespan.
+"""
+
+import importlib.util
+
+import httpx
+from loguru import logger
+
+from .configs import ConfigManager
+from .constants import DEFAULT_HTTP_CLIENT_HEADERS
+
+DEFAULT_POOL_MAX_CONNECTIONS = 200
+DEFAULT_POOL_MAX_KEEPALIVE = 50
+DEFAULT_POOL_KEEPALIVE_EXPIRY = 30
+# Same as the Anthropic SDK's default
+DEFAULT_TIMEOUT = httpx.Timeout(timeout=10 * 60, connect=5.0)
+
+
+class HTTPClientPool:
+    """
+    Per-process registry of shared ``httpx.AsyncClient`` instances.
+
+    Limits are read from ``ConfigManager`` when a client is first created for a
+    base URL, so they can be changed in the admin panel and take effect for
+    clients created after the next restart (or after ``close()``).
+    """
+
+    _clients: dict[str, httpx.AsyncClient] = {}
+
+    @staticmethod
+    def _normalize(base_url: str) -> str:
+        return base_url.rstrip("/")
+
+    @classmethod
+    def _build_client(cls, base_url: str) -> httpx.AsyncClient:
+        max_connections = ConfigManager.get_cached_int(
+            "HTTP_POOL_MAX_CONNECTIONS", DEFAULT_POOL_MAX_CONNECTIONS
+        )
+        max_keepalive = ConfigManager.get_cached_int(
+            "HTTP_POOL_MAX_KEEPALIVE", DEFAULT_POOL_MAX_KEEPALIVE
+        )
+        keepalive_expiry = ConfigManager.get_cached_int(
+            "HTTP_POOL_KEEPALIVE_EXPIRY", DEFAULT_POOL_KEEPALIVE_EXPIRY
+        )
+        http2 = ConfigManager.get_cached_bool("HTTP_POOL_HTTP2", False)
+        if http2 and importlib.util.find_spec("h2") is None:
+            logger.warning(
+                "HTTP_POOL_HTTP2 is enabled but 'h2' is not installed, "
+                "falling back to HTTP/1.1 (pip install 'anth2oai[http2]')"
+            )
+            http2 = False
+
+        logger.info(
+            f"Creating pooled HTTP client for {base_url} "
+            f"(max_connections={max_connections}, max_keepalive={max_keepalive}, "
+            f"keepalive_expiry={keepalive_expiry}s, http2={http2})"
+        )
+        return httpx.AsyncClient(
+            headers=DEFAULT_HTTP_CLIENT_HEADERS,
+            base_url=base_url,
+            timeout=DEFAULT_TIMEOUT,
+            http2=http2,
+            limits=httpx.Limits(
+                max_connections=max_connections,
+                max_keepalive_connections=max_keepalive,
+                keepalive_expiry=keepalive_expiry,
+            ),
+        )
+
+    @classmethod
+    def get(cls, base_url: str) -> httpx.AsyncClient:
+        """
+        Get the shared client for an upstream base URL, creating it on first use.
+
+        The returned client is owned by the pool: callers must not close it.
+        """
+        key = cls._normalize(base_url)
+        client = cls._clients.get(key)
+        if client is None or client.is_closed:
+            client = cls._build_client(key)
+            cls._clients[key] = client
+        return client
+
+    @classmethod
+    async def close(cls) -> None:
+        """Close every pooled client (called on application shutdown)."""
+        clients, cls._clients = cls._clients, {}
+        for base_url, client in clients.items():
+            try:
+                await client.aclose()
+            except Exception as e:
+                logger.warning(f"Error closing pooled HTTP client for {base_url}: {e}")
+        if clients:
+            logger.info(f"Closed {len(clients)} pooled HTTP client(s)")
@@ -0,0 +1,110 @@
+"""Anthropic prompt caching breakpoints.
+
+IDE clients resend the same system prompt and tool list on every turn. Marking
+them (and the latest user turn) with ``cache_control`` lets Anthropic serve that
+prefix from its prompt cache on the next request instead of re-processing it.
+"""
+
+from fnmatch import fnmatch
+
+EPHEMERAL_CACHE_CONTROL = {"type": "ephemeral"}
+# Anthropic rejects requests with more cache_control markers than this
+MAX_BREAKPOINTS = 4
+
+# Content block types that accept a cache_control marker
+_CACHEABLE_BLOCK_TYPES = {"text", "image", "document", "tool_use", "tool_result"}
+
+
+def prompt_cache_enabled(model: str, patterns: str) -> bool:
+    """
+    Check a model against a comma-separated list of name patterns.
+
+    Patterns use shell-style wildcards, e.g. ``claude-sonnet-4*,claude-opus*``
+    or ``*`` for every model. An empty list disables caching.
+    """
+    model = model.lower()
+    for pattern in patterns.split(","):
+        pattern = pattern.strip().lower()
+        if pattern and fnmatch(model, pattern):
+            return True
+    return False
+
+
+def _mark_content(content):
+    """Return ``content`` as blocks with a breakpoint on the last one, or None."""
+    if isinstance(content, str):
+        if not content:
+            return None
+        return [
+            {"type": "text", "text": content, "cache_control": EPHEMERAL_CACHE_CONTROL}
+        ]
+    if isinstance(content, list) and content:
+        last = content[-1]
+        if (
+            isinstance(last, dict)
+            and last.get("type") in _CACHEABLE_BLOCK_TYPES
+            and "cache_control" not in last
+        ):
+            return [*content[:-1], {**last, "cache_control": EPHEMERAL_CACHE_CONTROL}]
+    return None
+
+
+def _count_marked(items) -> int:
+    """Blocks (or tools) in ``items`` that already carry a cache_control marker."""
+    if not isinstance(items, (list, tuple)):
+        return 0
+    return sum(
+        1 for item in items if isinstance(item, dict) and "cache_control" in item
+    )
+
+
+def apply_prompt_cache_breakpoints(system_prompt, tools, messages: list) -> tuple:
+    """
+    Add cache breakpoints to the tool list, the system prompt and the last
+    user turn (the latest stable prefix).
+
+    Markers the client already set count towards ``MAX_BREAKPOINTS``; ours
+    are added while there is room, the last user turn first (it covers the
+    longest prefix), then the system prompt, then the tools.
+
+    Inputs are never mutated: marked items are shallow copies, so shared
+    (cached) tool lists and the caller's messages stay untouched. Arguments
+    that are not lists/strings (e.g. ``omit``) are passed through unchanged.
+
+    Returns ``(system_prompt, tools, messages)``.
+    """
+    room = (
+        MAX_BREAKPOINTS
+        - _count_marked(tools)
+        - _count_marked(system_prompt)
+        - sum(_count_marked(message.get("content")) for message in messages or ())
+    )
+
+    for index in range(len(messages or ()) - 1, -1, -1):
+        message = messages[index]
+        if message.get("role") != "user":
+            continue
+        marked_content = _mark_content(message.get("content"))
+        if marked_content is not None and room > 0:
+            messages = [
+                *messages[:index],
+                {**message, "content": marked_content},
+                *messages[index + 1 :],
+            ]
+            room -= 1
+        break
+
+    marked_system = _mark_content(system_prompt)
+    if marked_system is not None and room > 0:
+        system_prompt = marked_system
+        room -= 1
+
+    if (
+        isinstance(tools, (list, tuple))
+        and tools
+        and "cache_control" not in tools[-1]
+        and room > 0
+    ):
+        tools = [*tools[:-1], {**tools[-1], "cache_control": EPHEMERAL_CACHE_CONTROL}]
+
+    return system_prompt, tools, messages
@@ -0,0 +1,428 @@
+"""
+Chat Completions over the OpenAI Responses API, for the codex route.
+
+Codex models are only served by ``POST /responses``. Requests are converted
+here from chat format (``messages`` -> ``input`` + ``instructions``, nested
+function tools -> flat ones) and sent on the pooled ``httpx`` client; the
+streamed events are encoded straight into ``chat.completion.chunk`` frames by
+``ResponsesChunkEncoder``, which shares ``ChunkEncoder``'s templates, so no
+SDK objects are built per event.
+"""
+
+import json
+import time
+from typing import Any, AsyncIterator, Optional
+
+import httpx
+from openai import APIStatusError
+from openai.types.chat.chat_completion import (
+    ChatCompletion,
+    ChatCompletionMessage,
+    Choice,
+)
+from openai.types.chat.chat_completion_message_tool_call import (
+    ChatCompletionMessageToolCall,
+    Function,
+)
+
+from .format import AnthropicStreamState, build_completion_usage
+from .sse import ChunkEncoder, iter_sse_events
+
+RESPONSES_PATH = "/responses"
+# Model prefix of the former litellm routing, still accepted from clients
+RESPONSES_MODEL_PREFIX = "openai/responses/"
+
+# Chat params passed through unchanged
+_PASSTHROUGH_PARAMS = (
+    "temperature",
+    "top_p",
+    "parallel_tool_calls",
+    "metadata",
+    "store",
+    "service_tier",
+    "user",
+)
+
+
+def _text_part(text: str, role: str) -> dict:
+    if role == "assistant":
+        return {"type": "output_text", "text": text}
+    return {"type": "input_text", "text": text}
+
+
+def _format_content(content: Any, role: str) -> list[dict]:
+    """Chat message content (string or parts) as Responses content parts."""
+    if isinstance(content, str):
+        return [_text_part(content, role)]
+    if not isinstance(content, list):
+        return [_text_part(str(content), role)]
+    parts = []
+    for part in content:
+        if isinstance(part, str):
+            parts.append(_text_part(part, role))
+            continue
+        part_type = part.get("type")
+        if part_type == "text":
+            parts.append(_text_part(part.get("text", ""), role))
+        elif part_type == "image_url":
+            image_url = part.get("image_url")
+            if isinstance(image_url, dict):
+                parts.append(
+                    {
+                        "type": "input_image",
+                        "image_url": image_url.get("url"),
+                        "detail": image_url.get("detail") or "auto",
+                    }
+                )
+            else:
+                parts.append(
+                    {"type": "input_image", "image_url": image_url, "detail": "auto"}
+                )
+        else:
+            # Already a Responses content part (input_text, input_file...)
+            parts.append(part)
+    return parts
+
+
+def format_chat_messages_to_responses_input(
+    messages: list[dict],
+) -> tuple[list[dict], Optional[str]]:
+    """
+    Convert chat messages to Responses ``input`` items and ``instructions``.
+
+    System (and developer) prompts with string content become the
+    instructions; assistant tool calls become ``function_call`` items and
+    tool results ``function_call_output`` items.
+    """
+    items: list[dict] = []
+    instructions: list[str] = []
+    for message in messages:
+        role = message.get("role")
+        content = message.get("content")
+        if role in ("system", "developer") and isinstance(content, str):
+            instructions.append(content)
+        elif role == "tool":
+            if isinstance(content, list):
+                output = "".join(
+                    part.get("text", "") if isinstance(part, dict) else str(part)
+                    for part in content
+                )
+            else:
+                output = "" if content is None else str(content)
+            items.append(
+                {
+                    "type": "function_call_output",
+                    "call_id": message.get("tool_call_id"),
+                    "output": output,
+                }
+            )
+        elif role == "assistant" and message.get("tool_calls"):
+            if content:
+                items.append(
+                    {
+                        "type": "message",
+                        "role": "assistant",
+                        "content": _format_content(content, role),
+                    }
+                )
+            for tool_call in message["tool_calls"]:
+                function = tool_call.get("function") or {}
+                items.append(
+                    {
+                        "type": "function_call",
+                        "call_id": tool_call.get("id"),
+                        "name": function.get("name"),
+                        "arguments": function.get("arguments") or "",
+                    }
+                )
+        elif content is not None:
+            items.append(
+                {
+                    "type": "message",
+                    "role": role,
+                    "content": _format_content(content, role),
+                }
+            )
+    return items, "\n\n".join(instructions) if instructions else None
+
+
+def format_chat_tools_to_responses_tools(tools: Optional[list[dict]]) -> list[dict]:
+    """
+    Flatten chat function tools to Responses function tools.
+
+    Tools already in Responses form pass through; ``custom`` tools are sent
+    as plain function tools.
+    """
+    converted = []
+    for tool in tools or []:
+        tool_type = tool.get("type")
+        if tool_type == "function" and "function" in tool:
+            function = tool["function"]
+        elif tool_type == "custom":
+            function = tool
+        else:
+            converted.append(tool)
+            continue
+        responses_tool = {
+            "type": "function",
+            "name": function.get("name"),
+            "parameters": function.get("parameters")
+            or {"type": "object", "properties": {}},
+        }
+        if function.get("description"):
+            responses_tool["description"] = function["description"]
+        if "strict" in function:
+            responses_tool["strict"] = function["strict"]
+        converted.append(responses_tool)
+    return converted
+
+
+def _format_tool_choice(tool_choice: Any) -> Any:
+    if isinstance(tool_choice, dict) and "function" in tool_choice:
+        return {"type": "function", "name": tool_choice["function"].get("name")}
+    return tool_choice
+
+
+def _format_response_format(response_format: dict) -> Optional[dict]:
+    format_type = response_format.get("type")
+    if format_type == "json_schema":
+        schema = response_format.get("json_schema") or {}
+        return {
+            "format": {
+                "type": "json_schema",
+                "name": schema.get("name", "response_schema"),
+                "schema": schema.get("schema", {}),
+                "strict": schema.get("strict", False),
+            }
+        }
+    if format_type in ("json_object", "text"):
+        return {"format": {"type": format_type}}
+    return None
+
+
+def build_responses_request(body: dict, stream: bool) -> dict:
+    """The Responses API request body for a chat completion request."""
+    model = body.get("model", "")
+    items, instructions = format_chat_messages_to_responses_input(
+        body.get("messages", [])
+    )
+    request = {
+        "model": model.removeprefix(RESPONSES_MODEL_PREFIX),
+        "input": items,
+        "stream": stream,
+    }
+    if instructions:
+        request["instructions"] = instructions
+    tools = format_chat_tools_to_responses_tools(body.get("tools"))
+    if tools:
+        request["tools"] = tools
+    if body.get("tool_choice") is not None:
+        request["tool_choice"] = _format_tool_choice(body["tool_choice"])
+    max_tokens = body.get("max_completion_tokens") or body.get("max_tokens")
+    if max_tokens:
+        request["max_output_tokens"] = max_tokens
+    if body.get("reasoning_effort"):
+        request["reasoning"] = {"effort": body["reasoning_effort"]}
+    if isinstance(body.get("response_format"), dict):
+        text = _format_response_format(body["response_format"])
+        if text is not None:
+            request["text"] = text
+    for param in _PASSTHROUGH_PARAMS:
+        if body.get(param) is not None:
+            request[param] = body[param]
+    return request
+
+
+def _chat_id(response_id: str) -> str:
+    return "chatcmpl-" + response_id.removeprefix("resp_")
+
+
+def _record_usage(state: AnthropicStreamState, usage: Optional[dict]) -> None:
+    """Store Responses usage in the Anthropic convention the encoder reports."""
+    if not usage:
+        return
+    cached = (usage.get("input_tokens_details") or {}).get("cached_tokens") or 0
+    state.input_tokens = (usage.get("input_tokens") or 0) - cached
+    state.cache_read_input_tokens = cached
+    state.output_tokens = usage.get("output_tokens") or 0
+
+
+def _finish_reason(response: dict, has_tool_calls: bool) -> str:
+    if has_tool_calls:
+        return "tool_calls"
+    if response.get("status") == "incomplete":
+        return "length"
+    return "stop"
+
+
+class ResponsesChunkEncoder(ChunkEncoder):
+    """
+    Encode Responses API stream events into chat completion SSE frames.
+
+    Text deltas, function calls and their argument deltas map onto the same
+    frames the Claude route sends; the terminal ``response.completed`` (or
+    ``response.incomplete``) gives the finish reason and token usage.
+    """
+
+    def encode_event(self, event_type: str, data: dict) -> Optional[str]:
+        state = self.state
+
+        if event_type == "response.output_text.delta":
+            return self._text(data["delta"])
+
+        if event_type == "response.function_call_arguments.delta":
+            return self._arguments(state.current_tool_index, data["delta"])
+
+        if event_type == "response.created":
+            response_id = (data.get("response") or {}).get("id")
+            if response_id:
+                state.message_id = _chat_id(response_id)
+                self._stream_values["id"] = json.dumps(state.message_id)
+                # Re-bake the frames with the new ID
+                self._created = -1
+            state.sent_initial_role = True
+            return self._role()
+
+        if event_type == "response.output_item.added":
+            item = data.get("item") or {}
+            if item.get("type") == "function_call":
+                state.current_tool_index += 1
+                return self._tool_start(
+                    state.current_tool_index, item.get("call_id"), item.get("name")
+                )
+            return None
+
+        if event_type in ("response.completed", "response.incomplete"):
+            response = data.get("response") or {}
+            _record_usage(state, response.get("usage"))
+            return self._finish(_finish_reason(response, state.current_tool_index >= 0))
+
+        return None
+
+
+def _status_error(response: httpx.Response, body: Any) -> APIStatusError:
+    message = body
+    if isinstance(body, dict):
+        message = (body.get("error") or {}).get("message") or body
+    return APIStatusError(
+        f"Error code: {response.status_code} - {message}",
+        response=response,
+        body=body,
+    )
+
+
+def _response_body(response: httpx.Response) -> Any:
+    try:
+        return response.json()
+    except ValueError:
+        return response.text
+
+
+async def responses_sse(
+    client: httpx.AsyncClient,
+    base_url: str,
+    api_key: str,
+    body: dict,
+    state: Optional[AnthropicStreamState] = None,
+) -> AsyncIterator[str]:
+    """
+    Stream a chat completion request through ``POST {base_url}/responses``,
+    yielding encoded ``data: {...}\\n\\n`` frames.
+
+    As with ``create_sse``, ``data: [DONE]`` is left to the caller and a usage
+    frame is sent last when ``stream_options.include_usage`` is set. Raises
+    ``APIStatusError`` for error responses and failed streams.
+    """
+    model = body.get("model", "").removeprefix(RESPONSES_MODEL_PREFIX)
+    encoder = ResponsesChunkEncoder(model, state=state)
+    async with client.stream(
+        "POST",
+        base_url.rstrip("/") + RESPONSES_PATH,
+        json=build_responses_request(body, stream=True),
+        headers={"Authorization": f"Bearer {api_key}"},
+    ) as response:
+        if response.status_code >= 400:
+            await response.aread()
+            raise _status_error(response, _response_body(response))
+
+        async for event_type, data in iter_sse_events(response.aiter_bytes()):
+            if event_type in ("error", "response.failed"):
+                error = data
+                if event_type == "response.failed":
+                    error = {"error": (data.get("response") or {}).get("error")}
+                raise _status_error(response, error)
+            frame = encoder.encode_event(event_type, data)
+            if frame:
+                yield frame
+
+    stream_options = body.get("stream_options") or {}
+    if stream_options.get("include_usage"):
+        yield encoder.usage_frame()
+
+
+def format_responses_response_to_openai_response(
+    data: dict, model: str
+) -> ChatCompletion:
+    """Convert a Responses API response object to a chat completion."""
+    text_parts = []
+    tool_calls = []
+    for item in data.get("output") or []:
+        item_type = item.get("type")
+        if item_type == "message":
+            for part in item.get("content") or []:
+                if part.get("type") == "output_text":
+                    text_parts.append(part.get("text", ""))
+        elif item_type == "function_call":
+            tool_calls.append(
+                ChatCompletionMessageToolCall(
+                    id=item.get("call_id") or item.get("id", ""),
+                    type="function",
+                    function=Function(
+                        name=item.get("name", ""),
+                        arguments=item.get("arguments", ""),
+                    ),
+                )
+            )
+
+    message = ChatCompletionMessage(
+        content="".join(text_parts) if text_parts else None,
+        role="assistant",
+        tool_calls=tool_calls or None,
+    )
+    state = AnthropicStreamState()
+    _record_usage(state, data.get("usage"))
+    return ChatCompletion(
+        id=_chat_id(data.get("id", "")),
+        choices=[
+            Choice(
+                finish_reason=_finish_reason(data, bool(tool_calls)),
+                index=0,
+                logprobs=None,
+                message=message,
+            )
+        ],
+        created=int(data.get("created_at") or time.time()),
+        model=model,
+        object="chat.completion",
+        usage=build_completion_usage(
+            state.input_tokens, state.output_tokens, state.cache_read_input_tokens
+        ),
+    )
+
+
+async def responses_create(
+    client: httpx.AsyncClient, base_url: str, api_key: str, body: dict
+) -> ChatCompletion:
+    """Non-streaming chat completion through ``POST {base_url}/responses``."""
+    response = await client.post(
+        base_url.rstrip("/") + RESPONSES_PATH,
+        json=build_responses_request(body, stream=False),
+        headers={"Authorization": f"Bearer {api_key}"},
+    )
+    data = _response_body(response)
+    if response.status_code >= 400:
+        raise _status_error(response, data)
+    if isinstance(data, dict) and data.get("error"):
+        raise _status_error(response, data)
+    model = body.get("model", "").removeprefix(RESPONSES_MODEL_PREFIX)
+    return format_responses_response_to_openai_response(data, model)
@@ -0,0 +1,48 @@
+"""Admission control for chat completions.
+
+When a worker's event loop is saturated, every stream it serves stutters.
+Rejecting new requests early with ``503`` and ``Retry-After`` (clients and
+load balancers retry elsewhere or later) keeps the streams already running
+smooth instead of degrading all of them.
+
+Thresholds are per worker: ``ADMISSION_MAX_LOOP_LAG_MS`` against the smoothed
+event loop lag and ``ADMISSION_MAX_STREAMS`` against the open streams; 0
+disables either check.
+"""
+
+from typing import Optional
+
+from anth2oai.configs import ConfigManager
+from anth2oai.server.loop_monitor import LoopLagMonitor
+from anth2oai.server.metrics import ADMISSION_REJECTED, StreamObserver
+
+DEFAULT_MAX_LOOP_LAG_MS = 500
+DEFAULT_RETRY_AFTER = 2
+
+
+class AdmissionController:
+    """Decides whether this worker takes another request."""
+
+    @staticmethod
+    def rejection_reason() -> Optional[str]:
+        """The reason to shed the request, or None to admit it."""
+        max_streams = ConfigManager.get_cached_int("ADMISSION_MAX_STREAMS", 0)
+        if max_streams > 0 and StreamObserver.active_streams >= max_streams:
+            return "streams"
+        max_lag_ms = ConfigManager.get_cached_int(
+            "ADMISSION_MAX_LOOP_LAG_MS", DEFAULT_MAX_LOOP_LAG_MS
+        )
+        if max_lag_ms > 0 and LoopLagMonitor.lag_ewma * 1000 >= max_lag_ms:
+            return "loop_lag"
+        return None
+
+    @classmethod
+    def check(cls) -> Optional[int]:
+        """Returns the ``Retry-After`` seconds if the request must be shed."""
+        reason = cls.rejection_reason()
+        if reason is None:
+            return None
+        ADMISSION_REJECTED.labels(reason).inc()
+        return ConfigManager.get_cached_int(
+            "ADMISSION_RETRY_AFTER", DEFAULT_RETRY_AFTER
+        )
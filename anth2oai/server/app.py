@@ -1,3 +1,4 @@
+import asyncio
 import os
 from contextlib import asynccontextmanager
 from pathlib import Path
@@ -7,16 +8,40 @@ from traceback import format_exc
 from dotenv import load_dotenv
 from fastapi import Depends, FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import FileResponse, RedirectResponse
+from fastapi.responses import (
+    FileResponse,
+    RedirectResponse,
+    Response,
+    StreamingResponse,
+)
 from fastapi.staticfiles import StaticFiles
 from loguru import logger
 
 from anth2oai.admin_routes import router as admin_router
-from anth2oai.authen import validate_api_key
-from anth2oai.configs import ConfigManager
-from anth2oai.database import close_db, init_db
-from anth2oai.server.claude import claude_streaming
-from anth2oai.server.codex import codex_streaming
+from anth2oai.authen import validate_anthropic_api_key, validate_api_key
+from anth2oai.configs import DEFAULT_MAX_TOKENS, ConfigManager
+from anth2oai.database import close_db, init_db, prepare_db
+from anth2oai.pool import HTTPClientPool
+from anth2oai.server.admission import AdmissionController
+from anth2oai.server.cache import (
+    CACHE_HEADER,
+    POLICY_LOOKUP,
+    POLICY_OFF,
+    POLICY_REFRESH,
+    ResponseCache,
+    request_key,
+)
+from anth2oai.server.coalesce import StreamCoalescer
+from anth2oai.server.fair_queue import FairQueue
+from anth2oai.server.claude import claude_completion, claude_streaming, load_sdk
+from anth2oai.server.limiter import LimiterRejected
+from anth2oai.server.loop_monitor import LoopLagMonitor
+from anth2oai.server.messages import messages_passthrough
+from anth2oai.server.metrics import render_metrics
+from anth2oai.server.ratelimit import RateLimiter, RateLimitExceeded
+from anth2oai.server.responses import json_response, upstream_error_response
+from anth2oai.server.upstreams import UpstreamPool
+from anth2oai.server.usage import UsageLedger
 
 # Load .env file for initial values (before DB initialization)
 load_dotenv()
@@ -32,16 +57,45 @@ if not STATIC_DIR.exists():
     STATIC_DIR.mkdir(exist_ok=True, parents=True)
 
 
+def preload() -> None:
+    """
+    Do the per-process setup shared by all workers once, in the gunicorn
+    master before it forks them (``GUNICORN_PRELOAD``): import both SDKs and
+    the codex backend, render the chunk templates and create the database
+    tables. Database connections, HTTP pools and background tasks are still
+    created by each worker, in ``lifespan``.
+    """
+    load_sdk()
+    import anth2oai.server.codex  # noqa: F401
+
+    asyncio.run(prepare_db())
+
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """Application lifespan manager."""
     # Startup
     await init_db()
     await ConfigManager.initialize()
-    
+    await UpstreamPool.reload()
+    ConfigManager.on_reload(UpstreamPool.reload)
+    await ConfigManager.start_watching()
+    UpstreamPool.start_health_checks()
+    LoopLagMonitor.start()
+    UsageLedger.start()
+    # The SDKs are imported on first use; load them in the background so the
+    # worker serves requests (and health checks) without waiting for them
+    sdk_task = asyncio.create_task(asyncio.to_thread(load_sdk))
+
     logger.info("Application started")
     yield
     # Shutdown
+    await asyncio.gather(sdk_task, return_exceptions=True)
+    await LoopLagMonitor.stop()
+    await UpstreamPool.stop_health_checks()
+    await ConfigManager.stop_watching()
+    await HTTPClientPool.close()
+    await UsageLedger.stop()
     await close_db()
     logger.info("Application shutdown")
 
@@ -63,63 +117,202 @@ app.include_router(admin_router)
 MODEL_CUSTOM_PREFIX = "custom-"
 
 
-async def process_payload(payload: dict) -> dict:
-    """Process request payload, setting defaults from database config."""
-    if "max_tokens" not in payload:
-        default_max_tokens = await ConfigManager.get_int("DEFAULT_MAX_TOKENS", 40960)
-        payload["max_tokens"] = default_max_tokens
+def process_payload(payload: dict) -> dict:
+    """
+    Process request payload, setting defaults from the config cache.
 
+    Runs on every request, so it only reads the in-memory cache (kept in
+    sync across workers by ``ConfigManager``'s change watcher).
+    """
     model = payload.get("model", "").lower()
     model = model.removeprefix(MODEL_CUSTOM_PREFIX)
     payload["model"] = model
+
+    # Anthropic requires max_tokens; the codex route only sends the client's
+    if "max_tokens" not in payload and "claude" in model:
+        payload["max_tokens"] = ConfigManager.get_cached_int(
+            "DEFAULT_MAX_TOKENS", DEFAULT_MAX_TOKENS
+        )
     return payload
 
 
 async def dispatch_request(api_key: str, body: dict):
+    """
+    Route a request to its backend.
+
+    Streaming requests get a ``StreamingResponse``; non-streaming requests get
+    the ``chat.completion`` as a dict.
+    """
     model = body.get("model", "").lower()
+    is_stream = body.get("stream", False)
     request_cls = None
     if "claude" in model:
-        request_cls = claude_streaming
+        request_cls = claude_streaming if is_stream else claude_completion
     elif "codex" in model or "gpt" in model:
-        request_cls = codex_streaming
+        # Imported on first use, so workers never serving codex skip it
+        from anth2oai.server import codex
+
+        request_cls = codex.codex_streaming if is_stream else codex.codex_completion
     else:
-        raise HTTPException(f"Model {model} is not supported!")
+        raise HTTPException(status_code=400, detail=f"Model {model} is not supported!")
     response = await request_cls(api_key, body)
     return response
 
 
+async def schedule(request: Request, api_key: str, call):
+    """
+    Run ``call`` (a request to upstream) once the fair queue gives it a slot;
+    a stream keeps the slot until it ends.
+    """
+    permit = await FairQueue.acquire(api_key, request.headers)
+    try:
+        response = await call()
+    except BaseException:
+        permit.release()
+        raise
+    if isinstance(response, StreamingResponse):
+        FairQueue.hold(permit, response)
+    else:
+        permit.release()
+    return response
+
+
+@app.get("/metrics")
+async def metrics():
+    """Prometheus metrics, aggregated across all workers."""
+    content, content_type = render_metrics()
+    return Response(content=content, media_type=content_type)
+
+
 @app.get("/")
 async def _():
     # redirect to login
     return RedirectResponse(url="/admin")
 
 
+def check_admission() -> None:
+    """Shed the request with 503 if this worker is overloaded."""
+    retry_after = AdmissionController.check()
+    if retry_after is not None:
+        raise HTTPException(
+            status_code=503,
+            detail="Server is overloaded, please retry later",
+            headers={"Retry-After": str(retry_after)},
+        )
+
+
+def check_rate_limit(api_key: str) -> dict[str, str]:
+    """
+    Refuse the request with 429 if the API key is over its rate limits;
+    returns the ``x-ratelimit-*`` headers for the response otherwise.
+    """
+    try:
+        return RateLimiter.check(api_key)
+    except RateLimitExceeded as e:
+        raise HTTPException(status_code=429, detail=str(e), headers=e.headers)
+
+
 @app.post("/v1/chat/completions")
 async def chat_completions(request: Request, api_key: str = Depends(validate_api_key)):
+    # A reconnect continues its stream, which is already running upstream
+    last_event_id = request.headers.get("last-event-id")
+    if last_event_id and StreamCoalescer.resume_enabled():
+        return StreamCoalescer.resume(api_key, last_event_id)
+
+    check_admission()
+    rate_limit_headers = check_rate_limit(api_key)
     body = await request.json()
-    body = await process_payload(body)
+    body = process_payload(body)
     is_stream = body.get("stream", False)
+
+    cache_policy = ResponseCache.policy(body, request.headers)
+    coalesce = is_stream and StreamCoalescer.enabled(body, request.headers)
+    key = None
+    if cache_policy != POLICY_OFF or coalesce:
+        key = request_key(api_key, body)
+    cache_key = key if cache_policy != POLICY_OFF else None
+    if cache_key is not None:
+        if cache_policy == POLICY_LOOKUP:
+            entry = await ResponseCache.get(cache_key)
+            if entry is not None and entry.stream:
+                response = ResponseCache.replay(entry)
+                response.headers.update(rate_limit_headers)
+                return response
+            if entry is not None:
+                response = json_response(entry.data, request)
+                response.headers[CACHE_HEADER] = "HIT"
+                response.headers.update(rate_limit_headers)
+                return response
     try:
         if is_stream:
-            return await dispatch_request(api_key, body)
 
-        else:
-            raise HTTPException(f"No streaming is unsupported!")
-
-            # response = await openai_client.chat.completions.create(**body)
+            async def _start():
+                response = await schedule(
+                    request, api_key, lambda: dispatch_request(api_key, body)
+                )
+                if cache_key is not None:
+                    ResponseCache.record_stream(cache_key, response)
+                return response
 
-            # if hasattr(response, "model_dump"):
-            #     response_dict = response.model_dump()
-            # else:
-            #     response_dict = response
-
-            # return response_dict
+            if coalesce or StreamCoalescer.resume_enabled():
+                response = await StreamCoalescer.stream(
+                    key if coalesce else None, api_key, _start
+                )
+            else:
+                response = await _start()
+        else:
+            response_dict = await schedule(
+                request, api_key, lambda: dispatch_request(api_key, body)
+            )
+            if cache_key is not None:
+                ResponseCache.put(cache_key, False, response_dict)
+            response = json_response(response_dict, request)
+        if cache_key is not None:
+            response.headers[CACHE_HEADER] = (
+                "REFRESH" if cache_policy == POLICY_REFRESH else "MISS"
+            )
+        response.headers.update(rate_limit_headers)
+        return response
+    except LimiterRejected as e:
+        raise HTTPException(
+            status_code=503,
+            detail=str(e),
+            headers={"Retry-After": str(e.retry_after)},
+        )
+    except HTTPException:
+        raise
     except Exception as e:
+        response = upstream_error_response(e)
+        if response is not None:
+            logger.warning(f"Upstream returned {e.status_code}: {e}")
+            response.headers.update(rate_limit_headers)
+            return response
         logger.error(f"Error processing request: {e}")
         logger.error(format_exc())
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@app.post("/v1/messages")
+async def messages(
+    request: Request, api_key: str = Depends(validate_anthropic_api_key)
+):
+    """Anthropic Messages API, forwarded to the upstream pool without conversion."""
+    check_admission()
+    rate_limit_headers = check_rate_limit(api_key)
+    try:
+        response = await schedule(
+            request, api_key, lambda: messages_passthrough(request, api_key)
+        )
+        response.headers.update(rate_limit_headers)
+        return response
+    except LimiterRejected as e:
+        raise HTTPException(
+            status_code=503,
+            detail=str(e),
+            headers={"Retry-After": str(e.retry_after)},
+        )
+
+
 # Serve static files from Vue dist if it exists
 if STATIC_DIR.exists():
     app.mount("/assets", StaticFiles(directory=STATIC_DIR / "assets"), name="assets")
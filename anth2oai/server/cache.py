@@ -0,0 +1,260 @@
+"""Exact-match response cache for deterministic requests.
+
+Opt-in with ``RESPONSE_CACHE``. Only requests with ``temperature: 0`` are
+cached, keyed by a SHA-256 of the API key and the canonical JSON of the whole
+request body (model, messages, tools, sampling params, ``stream``...), so any
+difference in the request is a different entry. Streams are stored as their
+complete SSE body once they finish cleanly and replayed in one piece; failed
+or aborted streams are never stored.
+
+Entries live in a per-worker LRU bounded by ``RESPONSE_CACHE_MEMORY_MB`` and,
+if ``RESPONSE_CACHE_DIR`` is set, in one file per entry in that directory,
+shared by all workers (and restarts). Both expire after
+``RESPONSE_CACHE_TTL`` seconds.
+
+Clients control the cache per request with ``Cache-Control``: ``no-cache``
+skips the lookup but stores the fresh result (refresh), ``no-store`` skips
+the cache entirely. Responses carry ``X-Cache: HIT|MISS|REFRESH``.
+"""
+
+import asyncio
+import hashlib
+import json
+import os
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Optional
+
+from fastapi.responses import StreamingResponse
+from loguru import logger
+from starlette.datastructures import Headers
+
+from anth2oai.configs import ConfigManager
+from anth2oai.constants import STREAMING_HEADERS
+from anth2oai.server.metrics import RESPONSE_CACHE_LOOKUPS
+from anth2oai.server.responses import dumps_json
+from anth2oai.server.streaming import guard_stream
+from anth2oai.sse import SSE_DONE
+
+DEFAULT_MEMORY_MB = 64
+DEFAULT_TTL = 86400
+DEFAULT_DISK_MB = 1024
+# Prune expired/excess disk entries every this many writes (per worker)
+DISK_PRUNE_EVERY = 256
+CACHE_HEADER = "X-Cache"
+
+POLICY_OFF = "off"
+POLICY_LOOKUP = "lookup"
+POLICY_REFRESH = "refresh"
+
+# Frames the streaming routes emit when a stream fails
+_ERROR_FRAME_PREFIX = 'data: {"error"'
+
+
+def is_deterministic(body: dict) -> bool:
+    """
+    Whether the request asks for ``temperature: 0``. Unset means the
+    upstream's default of 1.0, i.e. sampled.
+    """
+    return body.get("temperature") == 0
+
+
+def request_key(api_key: str, body: dict) -> str:
+    """SHA-256 of the API key and the canonical JSON of the request body."""
+    canonical = json.dumps(
+        body, sort_keys=True, separators=(",", ":"), ensure_ascii=False
+    )
+    digest = hashlib.sha256(api_key.encode("utf-8"))
+    digest.update(b"\0")
+    digest.update(canonical.encode("utf-8"))
+    return digest.hexdigest()
+
+
+@dataclass
+class CacheEntry:
+    stream: bool
+    # The SSE body for streams, the chat.completion dict otherwise
+    data: Any
+    created: float
+    size: int
+
+
+class ResponseCache:
+    """Two-tier (memory, then disk) response cache, per worker."""
+
+    _entries: "OrderedDict[str, CacheEntry]" = OrderedDict()
+    _memory_bytes: int = 0
+    _disk_writes: int = 0
+    # Pending disk writes, referenced so they are not garbage collected
+    _tasks: set[asyncio.Task] = set()
+
+    @staticmethod
+    def policy(body: dict, headers: Headers) -> str:
+        """How the cache treats this request."""
+        if not ConfigManager.get_cached_bool("RESPONSE_CACHE", False):
+            return POLICY_OFF
+        if not is_deterministic(body):
+            return POLICY_OFF
+        directives = headers.get("cache-control", "").lower()
+        if "no-store" in directives:
+            return POLICY_OFF
+        if "no-cache" in directives:
+            return POLICY_REFRESH
+        return POLICY_LOOKUP
+
+    @staticmethod
+    def _ttl() -> int:
+        return ConfigManager.get_cached_int("RESPONSE_CACHE_TTL", DEFAULT_TTL)
+
+    @staticmethod
+    def _disk_dir() -> Optional[Path]:
+        directory = ConfigManager.get_cached("RESPONSE_CACHE_DIR", "")
+        return Path(directory) if directory else None
+
+    @classmethod
+    async def get(cls, key: str) -> Optional[CacheEntry]:
+        entry = cls._entries.get(key)
+        if entry is not None:
+            if time.time() - entry.created < cls._ttl():
+                cls._entries.move_to_end(key)
+                RESPONSE_CACHE_LOOKUPS.labels("memory_hit").inc()
+                return entry
+            cls._evict(key)
+
+        directory = cls._disk_dir()
+        if directory is not None:
+            entry = await asyncio.to_thread(cls._read_file, directory, key, cls._ttl())
+            if entry is not None:
+                cls._store_memory(key, entry)
+                RESPONSE_CACHE_LOOKUPS.labels("disk_hit").inc()
+                return entry
+        RESPONSE_CACHE_LOOKUPS.labels("miss").inc()
+        return None
+
+    @classmethod
+    def put(cls, key: str, stream: bool, data: Any) -> None:
+        encoded = data.encode("utf-8") if stream else dumps_json(data)
+        entry = CacheEntry(stream, data, time.time(), len(encoded))
+        cls._store_memory(key, entry)
+        directory = cls._disk_dir()
+        if directory is not None:
+            task = asyncio.create_task(
+                asyncio.to_thread(cls._write_file, directory, key, entry)
+            )
+            cls._tasks.add(task)
+            task.add_done_callback(cls._tasks.discard)
+
+    @classmethod
+    def _store_memory(cls, key: str, entry: CacheEntry) -> None:
+        limit = ConfigManager.get_cached_int(
+            "RESPONSE_CACHE_MEMORY_MB", DEFAULT_MEMORY_MB
+        ) * (1 << 20)
+        if entry.size > limit:
+            return
+        if key in cls._entries:
+            cls._evict(key)
+        cls._entries[key] = entry
+        cls._memory_bytes += entry.size
+        while cls._memory_bytes > limit:
+            cls._evict(next(iter(cls._entries)))
+
+    @classmethod
+    def _evict(cls, key: str) -> None:
+        entry = cls._entries.pop(key)
+        cls._memory_bytes -= entry.size
+
+    @staticmethod
+    def _read_file(directory: Path, key: str, ttl: int) -> Optional[CacheEntry]:
+        path = directory / f"{key}.json"
+        try:
+            raw = path.read_bytes()
+        except FileNotFoundError:
+            return None
+        try:
+            stored = json.loads(raw)
+        except ValueError:
+            logger.warning(f"Dropping corrupt response cache file {path}")
+            path.unlink(missing_ok=True)
+            return None
+        if time.time() - stored["created"] >= ttl:
+            path.unlink(missing_ok=True)
+            return None
+        return CacheEntry(stored["stream"], stored["data"], stored["created"], len(raw))
+
+    @classmethod
+    def _write_file(cls, directory: Path, key: str, entry: CacheEntry) -> None:
+        directory.mkdir(parents=True, exist_ok=True)
+        path = directory / f"{key}.json"
+        tmp = directory / f"{key}.{os.getpid()}.tmp"
+        tmp.write_bytes(
+            dumps_json(
+                {"stream": entry.stream, "data": entry.data, "created": entry.created}
+            )
+        )
+        # Atomic, so readers in other workers never see a partial entry
+        os.replace(tmp, path)
+        cls._disk_writes += 1
+        if cls._disk_writes % DISK_PRUNE_EVERY == 0:
+            cls._prune_disk(directory)
+
+    @classmethod
+    def _prune_disk(cls, directory: Path) -> None:
+        """Drop expired entries, then the oldest ones beyond the size budget."""
+        ttl = cls._ttl()
+        budget = ConfigManager.get_cached_int(
+            "RESPONSE_CACHE_DISK_MB", DEFAULT_DISK_MB
+        ) * (1 << 20)
+        now = time.time()
+        files = []
+        for path in directory.glob("*.json"):
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            if now - stat.st_mtime >= ttl:
+                path.unlink(missing_ok=True)
+            else:
+                files.append((stat.st_mtime, stat.st_size, path))
+        total = sum(size for _, size, _ in files)
+        for _, size, path in sorted(files):
+            if total <= budget:
+                break
+            path.unlink(missing_ok=True)
+            total -= size
+
+    @classmethod
+    def record_stream(cls, key: str, response: StreamingResponse) -> None:
+        """Store the stream once it completes without errors."""
+        recorded: list[str] = []
+
+        def _end(cancelled: bool) -> None:
+            if cancelled or not recorded or recorded[-1] != SSE_DONE:
+                return
+            if any(frame.startswith(_ERROR_FRAME_PREFIX) for frame in recorded):
+                return
+            cls.put(key, True, "".join(recorded))
+
+        guard_stream(response, _end, on_frame=recorded.append)
+
+    @staticmethod
+    def replay(entry: CacheEntry) -> StreamingResponse:
+        """Send a cached stream at full speed."""
+
+        async def _body():
+            yield entry.data
+
+        return StreamingResponse(
+            _body(),
+            media_type="text/event-stream",
+            headers={**STREAMING_HEADERS, CACHE_HEADER: "HIT"},
+        )
+
+    @classmethod
+    def stats(cls) -> dict:
+        return {
+            "entries": len(cls._entries),
+            "memory_bytes": cls._memory_bytes,
+            "disk_dir": str(cls._disk_dir() or ""),
+        }
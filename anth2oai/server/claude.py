@@ -1,49 +1,140 @@
 import json
+import time
 from traceback import format_exc
+from typing import TYPE_CHECKING, Optional
 
-import httpx
-from anthropic._constants import DEFAULT_TIMEOUT
 from fastapi import HTTPException
-from fastapi.responses import StreamingResponse
 from loguru import logger
 
-from anth2oai.client import AsyncAnth2OAI
 from anth2oai.configs import ConfigManager
 from anth2oai.constants import (
-    DEFAULT_HTTP_CLIENT_HEADERS,
     STREAMING_HEADERS,
 )
+from anth2oai.format import AnthropicStreamState
+from anth2oai.pool import HTTPClientPool
+from anth2oai.prompt_cache import prompt_cache_enabled
+from anth2oai.server.limiter import ConcurrencyLimiters, LimiterRejected, Permit
+from anth2oai.server.metrics import StreamObserver
+from anth2oai.server.retry import StreamAttempt, start_stream
+from anth2oai.server.streaming import DisconnectAwareStreamingResponse, finish_stream
+from anth2oai.server.upstreams import UpstreamPool, UpstreamState
+from anth2oai.server.usage import completion_usage_state, finish_request
+from anth2oai.sse import SSE_DONE, preload_templates
 
+if TYPE_CHECKING:
+    from anth2oai.client import AsyncAnth2OAI
 
-async def claude_streaming(api_key: str, body: dict):
-    anthropic_base_url = await ConfigManager.get(
-        "ANTHROPIC_BASE_URL", "https://api.anthropic.com/v1"
-    )
-    http_client = httpx.AsyncClient(
-        headers=DEFAULT_HTTP_CLIENT_HEADERS,
-        base_url=anthropic_base_url,
-        timeout=DEFAULT_TIMEOUT,
-    )
-    # DEFAULT_HTTP_CLIENT_HEADERS
-    openai_client: AsyncAnth2OAI = AsyncAnth2OAI(
+
+def load_sdk() -> None:
+    """
+    Import the client and render the chunk templates, which load the
+    Anthropic and OpenAI SDKs; otherwise that happens on the first request.
+    """
+    from anth2oai import client  # noqa: F401
+
+    preload_templates()
+
+
+def _build_client(api_key: str, upstream: UpstreamState) -> "AsyncAnth2OAI":
+    from anth2oai.client import AsyncAnth2OAI
+
+    return AsyncAnth2OAI(
         api_key=api_key,
-        base_url=anthropic_base_url,
-        http_client=http_client,
+        base_url=upstream.base_url,
+        http_client=HTTPClientPool.get(upstream.base_url),
     )
-    streaming = await openai_client.chat.completions.create(**body)
+
+
+def _prompt_cache_enabled(model: str) -> bool:
+    patterns = ConfigManager.get_cached("PROMPT_CACHE_MODELS", "")
+    return prompt_cache_enabled(model, patterns)
+
+
+async def claude_completion(api_key: str, body: dict) -> dict:
+    """Non-streaming completion; returns the OpenAI chat.completion as a dict."""
+    model = body.get("model", "")
+    observer = StreamObserver("claude", model, stream=False)
+    upstream = UpstreamPool.select()
+    try:
+        permit = await ConcurrencyLimiters.acquire(upstream.name, api_key)
+    except LimiterRejected:
+        observer.finish()
+        raise
+    openai_client = _build_client(api_key, upstream)
+    upstream.acquire()
+    usage = None
+    try:
+        completion = await openai_client.chat.completions.create(
+            **body, prompt_cache=_prompt_cache_enabled(model)
+        )
+    except Exception as e:
+        observer.error(e)
+        upstream.record_error(e)
+        permit.release(error=e)
+        raise
+    else:
+        upstream.record_latency(time.perf_counter() - observer.start)
+        upstream.record_success()
+        permit.release(success=True)
+        usage = completion_usage_state(completion.usage)
+    finally:
+        upstream.release()
+        finish_request(api_key, observer, usage)
+    return completion.model_dump()
+
+
+async def claude_streaming(api_key: str, body: dict):
+    model = body.get("model", "")
+    observer = StreamObserver("claude", model)
+    upstream = UpstreamPool.select()
+    # Wait for a slot before answering, so a refused request gets a 503
+    # instead of a stream that errors out
+    try:
+        permit = await ConcurrencyLimiters.acquire(upstream.name, api_key)
+    except LimiterRejected:
+        observer.finish()
+        raise
+    raw = ConfigManager.get_cached_bool("UPSTREAM_RAW_SSE", True)
+    prompt_cache = _prompt_cache_enabled(model)
+    # The attempt that produced the first frame (after retries and hedging)
+    attempt: Optional[StreamAttempt] = None
+
+    def _launch(upstream: UpstreamState, permit: Permit) -> StreamAttempt:
+        state = AnthropicStreamState()
+        frames = _build_client(api_key, upstream).create_sse(
+            **body, raw=raw, prompt_cache=prompt_cache, state=state
+        )
+        return StreamAttempt(upstream, permit, frames, state)
+
+    def _usage() -> Optional[AnthropicStreamState]:
+        return attempt.state if attempt is not None else None
+
+    def _tokens_left() -> int:
+        output_tokens = attempt.state.output_tokens if attempt is not None else 0
+        return (body.get("max_tokens") or 0) - output_tokens
 
     async def _stream_response():
+        nonlocal attempt
+        stream_error = None
+        completed = False
         try:
-            async for chunk in streaming:
-                if hasattr(chunk, "model_dump"):
-                    chunk_dict = chunk.model_dump()
-                else:
-                    chunk_dict = chunk
-                yield f"data: {json.dumps(chunk_dict)}\n\n"
+            # Nothing has been sent yet, so failed attempts can be retried
+            attempt = await start_stream(_launch, api_key, upstream, permit)
+            if attempt.first_frame is not None:
+                observer.upstream_event()
+                yield attempt.first_frame
+                observer.chunk_sent()
 
-            yield "data: [DONE]\n\n"
+            async for frame in attempt.frames:
+                observer.upstream_event()
+                yield frame
+                observer.chunk_sent()
+
+            completed = True
+            yield SSE_DONE
 
         except HTTPException as e:
+            observer.error(e)
             error_chunk = {
                 "error": {
                     "type": e.detail.get("type", "error")
@@ -57,14 +148,28 @@ async def claude_streaming(api_key: str, body: dict):
             yield f"data: {json.dumps(error_chunk)}\n\n"
             yield "data: [DONE]\n\n"
         except Exception as e:
+            observer.error(e)
+            stream_error = e
             logger.error(f"Error in stream_response: {e}")
             logger.error(format_exc())
             error_chunk = {"error": {"type": "stream_error", "message": str(e)}}
             yield f"data: {json.dumps(error_chunk)}\n\n"
             yield "data: [DONE]\n\n"
+        finally:
+            # Abort the upstream request if we stopped early (client gone)
+            if attempt is not None:
+                await attempt.close(error=stream_error, success=completed)
 
-    return StreamingResponse(
-        _stream_response(),
-        media_type="text/event-stream",
-        headers=STREAMING_HEADERS,
+    response = DisconnectAwareStreamingResponse(
+        _stream_response(), media_type="text/event-stream", headers=STREAMING_HEADERS
+    )
+    # The permit is still held if the body never started
+    finish_stream(
+        response,
+        api_key,
+        observer,
+        _usage,
+        release=permit.release,
+        tokens_left=_tokens_left,
     )
+    return response
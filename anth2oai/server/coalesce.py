@@ -0,0 +1,352 @@
+"""Shared, resumable streams: single-flight coalescing and Last-Event-ID resume.
+
+A stream run through here is a *flight*: a task reads the upstream response
+into a buffer of the last ``STREAM_BUFFER_FRAMES`` frames and every client
+is a subscriber replaying that buffer. The upstream stream belongs to the
+flight, not to the client that started it. A subscriber that falls further
+behind than the buffer reaches gets an error frame, then ``[DONE]``.
+
+Coalescing: clients often send the same request twice within a second
+(double submit, reconnects, their own retries). With ``STREAM_COALESCE`` on
+(it is off by default), a streaming request identical to one already in
+flight in this worker (same API key and canonical body, see
+``request_key``) and arriving within ``STREAM_COALESCE_WINDOW`` seconds of it
+does not open another upstream stream: it subscribes to the running one,
+first getting the frames sent so far, then the rest as they arrive. Only
+deterministic requests (explicit ``temperature: 0``) are coalesced, since
+callers sending the same sampled request may want different completions.
+Requests sending ``Cache-Control: no-cache`` or ``no-store`` always get a
+stream of their own.
+
+Resumption: with ``STREAM_RESUME`` on, every frame carries an SSE
+``id: <stream>-<seq>``. A client whose connection drops re-sends the request
+with ``Last-Event-ID`` and gets the frames after that one, then the rest
+live. The upstream stream keeps running for ``STREAM_RESUME_WINDOW`` seconds
+after the last subscriber left, and finished streams stay resumable for the
+same window. Streams are kept per worker, so resuming needs the reconnect to
+reach the same worker (e.g. sticky sessions in front of gunicorn).
+
+Without resumption, the upstream stream is aborted as soon as the last
+subscriber leaves.
+"""
+
+import asyncio
+import hmac
+import json
+import secrets
+import time
+from collections import deque
+from typing import Awaitable, Callable, Optional
+
+from fastapi import HTTPException
+from fastapi.responses import StreamingResponse
+from loguru import logger
+from starlette.datastructures import Headers
+
+from anth2oai.configs import ConfigManager
+from anth2oai.constants import STREAMING_HEADERS
+from anth2oai.server.cache import is_deterministic
+from anth2oai.server.metrics import COALESCED_REQUESTS, RESUMED_STREAMS
+from anth2oai.server.streaming import DisconnectAwareStreamingResponse
+from anth2oai.sse import SSE_DONE
+
+DEFAULT_BUFFER_FRAMES = 4096
+DEFAULT_RESUME_WINDOW = 30
+DEFAULT_COALESCE_WINDOW = 2.0
+
+
+def _lagged_frame(seq: int) -> str:
+    """Error frame for a subscriber that the buffer no longer reaches."""
+    error = {
+        "type": "stream_error",
+        "code": 410,
+        "message": f"Stream position {seq} is no longer buffered, retry the request",
+    }
+    return f"data: {json.dumps({'error': error})}\n\n"
+
+
+class Flight:
+    """One upstream stream, shared by all of its subscribers."""
+
+    def __init__(
+        self, key: Optional[str], api_key: str, resumable: bool, buffer_frames: int
+    ):
+        self.id = secrets.token_hex(8)
+        self.created = time.monotonic()
+        # Request key for coalescing, None if others may not join
+        self.key = key
+        self.api_key = api_key
+        self.resumable = resumable
+        self.frames: deque[str] = deque(maxlen=max(buffer_frames, 1))
+        # Sequence number of the next frame from upstream
+        self.next_seq = 0
+        self.done = False
+        self.error: Optional[BaseException] = None
+        self.subscribers = 0
+        # Every subscriber left and the upstream stream is being aborted
+        self.aborted = False
+        # Set once the upstream response exists (or failed to start)
+        self.started = asyncio.Event()
+        self.start_error: Optional[BaseException] = None
+        self._changed = asyncio.Event()
+        self._response: Optional[StreamingResponse] = None
+        self._task: Optional[asyncio.Task] = None
+        self._abort_timer: Optional[asyncio.TimerHandle] = None
+
+    @property
+    def first_seq(self) -> int:
+        """Sequence number of the oldest frame still buffered."""
+        return self.next_seq - len(self.frames)
+
+    def start(self, response: StreamingResponse) -> None:
+        self._response = response
+        self._task = asyncio.create_task(self._produce())
+        self.started.set()
+
+    def fail(self, error: BaseException) -> None:
+        self.start_error = error
+        self.started.set()
+
+    def _notify(self) -> None:
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    async def _produce(self) -> None:
+        frames = self._response.body_iterator
+        try:
+            async for frame in frames:
+                self.frames.append(frame)
+                self.next_seq += 1
+                self._notify()
+        except asyncio.CancelledError:
+            # Every subscriber left: same bookkeeping as a client disconnect
+            on_disconnect = getattr(self._response, "on_disconnect", None)
+            if on_disconnect is not None:
+                on_disconnect()
+            raise
+        except Exception as e:
+            self.error = e
+        finally:
+            await frames.aclose()
+            self.done = True
+            self._notify()
+            StreamCoalescer.finished(self)
+
+    async def _replay(self, subscription: "Subscription", seq: int):
+        try:
+            while True:
+                if seq < self.next_seq:
+                    if seq < self.first_seq:
+                        logger.warning(
+                            f"Subscriber fell behind the buffer of stream {self.id}, "
+                            "closing it"
+                        )
+                        # Tell the client its stream is incomplete, as a resume
+                        # of a no longer buffered position would (410)
+                        yield _lagged_frame(seq)
+                        yield SSE_DONE
+                        return
+                    frame = self.frames[seq - self.first_seq]
+                    if self.resumable:
+                        frame = f"id: {self.id}-{seq}\n{frame}"
+                    yield frame
+                    seq += 1
+                    continue
+                if self.done:
+                    break
+                await self._changed.wait()
+            if self.error is not None:
+                raise self.error
+        finally:
+            subscription.leave()
+
+    def subscribe(self, seq: int = 0) -> DisconnectAwareStreamingResponse:
+        """A response replaying the stream from frame ``seq`` on."""
+        subscription = Subscription(self)
+        return DisconnectAwareStreamingResponse(
+            self._replay(subscription, seq),
+            media_type="text/event-stream",
+            headers=STREAMING_HEADERS,
+            # The body may never start, so its finally may never run
+            on_disconnect=subscription.leave,
+        )
+
+    def join(self) -> None:
+        self.subscribers += 1
+        if self._abort_timer is not None:
+            self._abort_timer.cancel()
+            self._abort_timer = None
+
+    def unsubscribe(self) -> None:
+        self.subscribers -= 1
+        if self.subscribers > 0 or self.done or self._task is None:
+            return
+        if self.resumable:
+            # Give the client a chance to reconnect before aborting
+            window = ConfigManager.get_cached_int(
+                "STREAM_RESUME_WINDOW", DEFAULT_RESUME_WINDOW
+            )
+            self._abort_timer = asyncio.get_running_loop().call_later(
+                max(window, 0), self._abort
+            )
+        else:
+            self._abort()
+
+    def _abort(self) -> None:
+        self._abort_timer = None
+        if self.subscribers > 0 or self.done:
+            return
+        # Nobody may join a stream that is being aborted
+        self.aborted = True
+        StreamCoalescer.finished(self)
+        self._task.cancel()
+
+
+class Subscription:
+    """One client of a flight; ``leave`` is idempotent."""
+
+    def __init__(self, flight: Flight):
+        self.flight = flight
+        self.left = False
+        flight.join()
+
+    def leave(self) -> None:
+        if self.left:
+            return
+        self.left = True
+        self.flight.unsubscribe()
+
+
+class StreamCoalescer:
+    """Registries of flights by request key and by stream ID, per worker."""
+
+    # In-progress flights new identical requests may join
+    _flights: dict[str, Flight] = {}
+    # Flights that can be resumed with Last-Event-ID
+    _resumable: dict[str, Flight] = {}
+
+    @staticmethod
+    def enabled(body: dict, headers: Headers) -> bool:
+        """Whether this streaming request may share an identical one's stream."""
+        if not ConfigManager.get_cached_bool("STREAM_COALESCE", False):
+            return False
+        if not is_deterministic(body):
+            return False
+        directives = headers.get("cache-control", "").lower()
+        return "no-cache" not in directives and "no-store" not in directives
+
+    @staticmethod
+    def resume_enabled() -> bool:
+        return ConfigManager.get_cached_bool("STREAM_RESUME", False)
+
+    @classmethod
+    async def stream(
+        cls,
+        key: Optional[str],
+        api_key: str,
+        start: Callable[[], Awaitable[StreamingResponse]],
+    ) -> StreamingResponse:
+        """
+        A response for a new stream, calling ``start`` to open it upstream.
+
+        With a ``key``, joins the identical stream in progress instead, if
+        there is one that started less than ``STREAM_COALESCE_WINDOW``
+        seconds ago. If ``start`` raises, every request waiting on it raises
+        the same error.
+        """
+        window = ConfigManager.get_cached_float(
+            "STREAM_COALESCE_WINDOW", DEFAULT_COALESCE_WINDOW
+        )
+        while True:
+            flight = cls._flights.get(key) if key is not None else None
+            if flight is not None and time.monotonic() - flight.created > window:
+                # Too late to join: later requests start a flight of their own
+                del cls._flights[key]
+                flight = None
+            if flight is None:
+                return await cls._start(key, api_key, start)
+
+            await flight.started.wait()
+            if flight.start_error is not None:
+                raise flight.start_error
+            # Everyone else left while we waited, or the start of the stream
+            # is no longer buffered; start over with a new flight
+            if not flight.aborted and flight.first_seq == 0:
+                COALESCED_REQUESTS.inc()
+                return flight.subscribe()
+            if cls._flights.get(key) is flight:
+                del cls._flights[key]
+
+    @classmethod
+    async def _start(
+        cls,
+        key: Optional[str],
+        api_key: str,
+        start: Callable[[], Awaitable[StreamingResponse]],
+    ) -> StreamingResponse:
+        buffer_frames = ConfigManager.get_cached_int(
+            "STREAM_BUFFER_FRAMES", DEFAULT_BUFFER_FRAMES
+        )
+        flight = Flight(key, api_key, cls.resume_enabled(), buffer_frames)
+        if key is not None:
+            cls._flights[key] = flight
+        try:
+            response = await start()
+        except BaseException as e:
+            cls.finished(flight)
+            flight.fail(e)
+            raise
+        flight.start(response)
+        if flight.resumable:
+            cls._resumable[flight.id] = flight
+        return flight.subscribe()
+
+    @classmethod
+    def resume(cls, api_key: str, last_event_id: str) -> StreamingResponse:
+        """
+        Continue a stream after the frame ``last_event_id``.
+
+        Raises ``HTTPException(410)`` if the stream is unknown, expired, or
+        the frames after that one are no longer buffered.
+        """
+        flight_id, _, seq = last_event_id.strip().rpartition("-")
+        flight = cls._resumable.get(flight_id)
+        if (
+            flight is None
+            or not seq.isdigit()
+            or not hmac.compare_digest(flight.api_key, api_key)
+        ):
+            raise HTTPException(status_code=410, detail="Stream cannot be resumed")
+        resume_at = int(seq) + 1
+        if not flight.first_seq <= resume_at <= flight.next_seq:
+            raise HTTPException(
+                status_code=410, detail="Stream position is no longer buffered"
+            )
+        RESUMED_STREAMS.inc()
+        return flight.subscribe(resume_at)
+
+    @classmethod
+    def finished(cls, flight: Flight) -> None:
+        # Later requests start a new flight (or hit the response cache)
+        if flight.key is not None and cls._flights.get(flight.key) is flight:
+            del cls._flights[flight.key]
+        if flight.id not in cls._resumable:
+            return
+        if flight.aborted:
+            del cls._resumable[flight.id]
+        elif flight.done:
+            # Keep the tail around for clients that lost the end of the stream
+            window = ConfigManager.get_cached_int(
+                "STREAM_RESUME_WINDOW", DEFAULT_RESUME_WINDOW
+            )
+            asyncio.get_running_loop().call_later(
+                max(window, 0), cls._resumable.pop, flight.id, None
+            )
+
+    @classmethod
+    def stats(cls) -> dict:
+        return {
+            "flights": len(cls._flights),
+            "resumable": len(cls._resumable),
+            "subscribers": sum(f.subscribers for f in cls._flights.values()),
+        }
@@ -0,0 +1,213 @@
+"""Weighted-fair queueing of requests across API keys.
+
+With ``FAIR_QUEUE_MAX_CONCURRENCY`` set, a worker sends at most that many
+requests upstream at once (a stream counts until it ends). Requests over the
+cap wait here, and freed slots go to the waiting API keys in turn instead of
+to whoever queued first, so one key's batch job of hundreds of parallel
+requests cannot push an interactive client's first token behind all of them.
+
+Scheduling is start-time fair queueing: each API key is a flow, and a queued
+request is tagged ``max(virtual time, flow's last tag) + 1 / weight``; the
+smallest tag goes next. Keys with the same weight therefore alternate
+(round-robin), and a key of weight 2 gets two slots for each one of a key of
+weight 1. Weights come from ``FAIR_QUEUE_WEIGHTS``, a JSON object mapping key
+IDs (``key_id``, as shown in the usage stats, so the keys themselves stay out
+of the configuration) to weights, default 1. A client can mark background work
+with ``X-Priority: low``: it becomes a flow of its own with a quarter of the
+key's weight, so it also stays out of the way of the same key's interactive
+requests.
+
+A request waits at most ``FAIR_QUEUE_TIMEOUT`` seconds (a client may ask for
+less with ``X-Queue-Timeout``) and the queue holds at most
+``FAIR_QUEUE_MAX`` requests; otherwise it is refused with ``503`` and
+``Retry-After``. The queue is per worker.
+"""
+
+import asyncio
+import heapq
+import itertools
+import json
+import time
+from typing import Optional
+
+from fastapi.responses import StreamingResponse
+from loguru import logger
+from starlette.datastructures import Headers
+
+from anth2oai.configs import ConfigManager
+from anth2oai.server.limiter import LimiterRejected, Permit, wait_for_slot
+from anth2oai.server.metrics import (
+    FAIR_QUEUE_DEPTH,
+    FAIR_QUEUE_REJECTED,
+    FAIR_QUEUE_WAIT,
+)
+from anth2oai.server.streaming import guard_stream
+from anth2oai.server.usage import key_id
+
+DEFAULT_QUEUE_MAX = 256
+DEFAULT_QUEUE_TIMEOUT = 30
+
+PRIORITY_HEADER = "x-priority"
+TIMEOUT_HEADER = "x-queue-timeout"
+PRIORITY_NORMAL = "normal"
+PRIORITY_LOW = "low"
+LOW_PRIORITY_SHARE = 0.25
+# Flow tags kept beyond this many are pruned (those no longer ahead)
+MAX_FLOWS = 1024
+
+
+class FairQueue:
+    """The per-worker concurrency cap and its weighted-fair wait queue."""
+
+    in_flight: int = 0
+    # (start tag, arrival order, waiter, priority); cancelled waiters are
+    # skipped when they come up
+    _heap: list[tuple[float, int, asyncio.Future, str]] = []
+    _queued: dict[str, int] = {PRIORITY_NORMAL: 0, PRIORITY_LOW: 0}
+    _virtual_time: float = 0.0
+    _flow_tags: dict[tuple[str, str], float] = {}
+    _order = itertools.count()
+    _weights_raw: Optional[str] = None
+    _weights: dict[str, float] = {}
+
+    @staticmethod
+    def _capacity() -> int:
+        return ConfigManager.get_cached_int("FAIR_QUEUE_MAX_CONCURRENCY", 0)
+
+    @classmethod
+    def _weight(cls, api_key: str) -> float:
+        raw = ConfigManager.get_cached("FAIR_QUEUE_WEIGHTS", "")
+        if raw != cls._weights_raw:
+            cls._weights_raw = raw
+            try:
+                weights = json.loads(raw) if raw else {}
+                cls._weights = {
+                    key: float(weight)
+                    for key, weight in weights.items()
+                    if float(weight) > 0
+                }
+            except (AttributeError, TypeError, ValueError) as e:
+                logger.warning(f"Ignoring invalid FAIR_QUEUE_WEIGHTS: {e}")
+                cls._weights = {}
+        return cls._weights.get(key_id(api_key), 1.0)
+
+    @staticmethod
+    def _timeout(headers: Headers) -> float:
+        timeout = float(
+            ConfigManager.get_cached_int("FAIR_QUEUE_TIMEOUT", DEFAULT_QUEUE_TIMEOUT)
+        )
+        requested = headers.get(TIMEOUT_HEADER)
+        if requested:
+            try:
+                timeout = min(timeout, float(requested))
+            except ValueError:
+                pass
+        return max(timeout, 0.0)
+
+    @classmethod
+    def queued(cls) -> int:
+        return sum(cls._queued.values())
+
+    @classmethod
+    async def acquire(cls, api_key: str, headers: Headers) -> Permit:
+        """
+        Wait for a slot under the concurrency cap.
+
+        Raises ``LimiterRejected`` when the queue is full or the request's
+        deadline passes first.
+        """
+        capacity = cls._capacity()
+        if capacity <= 0:
+            return Permit(None)
+        if cls.in_flight < capacity and not cls.queued():
+            cls.in_flight += 1
+            return Permit(cls)
+
+        max_queue = ConfigManager.get_cached_int("FAIR_QUEUE_MAX", DEFAULT_QUEUE_MAX)
+        if cls.queued() >= max(max_queue, 0):
+            FAIR_QUEUE_REJECTED.labels("queue_full").inc()
+            raise LimiterRejected("queue_full")
+
+        priority = (
+            PRIORITY_LOW
+            if headers.get(PRIORITY_HEADER, "").lower() == PRIORITY_LOW
+            else PRIORITY_NORMAL
+        )
+        weight = cls._weight(api_key)
+        if priority == PRIORITY_LOW:
+            weight *= LOW_PRIORITY_SHARE
+        flow = (api_key, priority)
+        start_tag = max(cls._virtual_time, cls._flow_tags.get(flow, 0.0))
+        cls._flow_tags[flow] = start_tag + 1 / weight
+        cls._prune_flows()
+
+        waiter = asyncio.get_running_loop().create_future()
+        heapq.heappush(cls._heap, (start_tag, next(cls._order), waiter, priority))
+        cls._queued[priority] += 1
+        FAIR_QUEUE_DEPTH.labels(priority).inc()
+        start = time.perf_counter()
+        try:
+            await wait_for_slot(
+                waiter,
+                cls._timeout(headers),
+                cls.release,
+                lambda: cls._dequeued(priority),
+            )
+        except asyncio.TimeoutError:
+            FAIR_QUEUE_REJECTED.labels("deadline").inc()
+            raise LimiterRejected("deadline") from None
+        FAIR_QUEUE_WAIT.labels(priority).observe(time.perf_counter() - start)
+        return Permit(cls)
+
+    @classmethod
+    def release(
+        cls, error: Optional[BaseException] = None, success: bool = False
+    ) -> None:
+        # A slot is a slot: how the request went does not matter here
+        cls.in_flight -= 1
+        cls._wake()
+
+    @classmethod
+    def _wake(cls) -> None:
+        # Hand free slots to the waiters with the smallest tags
+        capacity = cls._capacity()
+        while cls._heap and (capacity <= 0 or cls.in_flight < capacity):
+            start_tag, _, waiter, priority = heapq.heappop(cls._heap)
+            if waiter.done():
+                continue
+            cls._virtual_time = start_tag
+            cls._dequeued(priority)
+            cls.in_flight += 1
+            waiter.set_result(None)
+        if not cls._heap:
+            # Idle: start the next busy period from scratch
+            cls._virtual_time = 0.0
+            cls._flow_tags.clear()
+
+    @classmethod
+    def _dequeued(cls, priority: str) -> None:
+        cls._queued[priority] -= 1
+        FAIR_QUEUE_DEPTH.labels(priority).dec()
+
+    @classmethod
+    def _prune_flows(cls) -> None:
+        if len(cls._flow_tags) <= MAX_FLOWS:
+            return
+        # A flow whose tag is behind the virtual time starts from it anyway
+        cls._flow_tags = {
+            flow: tag for flow, tag in cls._flow_tags.items() if tag > cls._virtual_time
+        }
+
+    @classmethod
+    def hold(cls, permit: Permit, response: StreamingResponse) -> None:
+        """Keep the permit until the stream ends (or its client leaves)."""
+        guard_stream(response, lambda cancelled: permit.release())
+
+    @classmethod
+    def stats(cls) -> dict:
+        return {
+            "max_concurrency": cls._capacity(),
+            "in_flight": cls.in_flight,
+            "queued": dict(cls._queued),
+            "flows": len(cls._flow_tags),
+        }
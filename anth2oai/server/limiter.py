@@ -0,0 +1,241 @@
+"""Adaptive (AIMD) concurrency limits per upstream and API key.
+
+Every (upstream, API key) pair gets a concurrency limit that grows by about
+one per limit's worth of successful requests (additive increase) and is cut
+by ``BACKOFF_FACTOR`` when the upstream answers 429/529 (multiplicative
+decrease, at most once per ``DECREASE_COOLDOWN`` so one burst of rejections
+counts once). Requests over the limit wait in a bounded FIFO queue until a
+slot frees up or their deadline passes, instead of being fired into an
+upstream that is already shedding load.
+
+Limits are per worker and start at ``UPSTREAM_CONCURRENCY_INITIAL``.
+"""
+
+import asyncio
+import time
+from collections import OrderedDict, deque
+from typing import Callable, Optional, Protocol
+
+from anth2oai.configs import ConfigManager
+from anth2oai.server.metrics import (
+    UPSTREAM_OVERLOADED,
+    UPSTREAM_QUEUE_REJECTED,
+    UPSTREAM_QUEUE_WAIT,
+)
+
+DEFAULT_INITIAL_LIMIT = 32
+DEFAULT_MIN_LIMIT = 1
+DEFAULT_MAX_LIMIT = 256
+DEFAULT_QUEUE_MAX = 128
+DEFAULT_QUEUE_TIMEOUT = 30
+BACKOFF_FACTOR = 0.7
+DECREASE_COOLDOWN = 1.0
+# Idle limiters beyond this many are dropped (one per upstream/API key pair)
+MAX_LIMITERS = 1024
+
+OVERLOAD_STATUSES = {429, 529}
+_OVERLOAD_ERROR_TYPES = {"overloaded_error", "rate_limit_error"}
+
+
+def overload_status(error: BaseException) -> Optional[int]:
+    """429/529 if the error says the upstream is shedding load, else None."""
+    status = getattr(error, "status_code", None)
+    if status in OVERLOAD_STATUSES:
+        return status
+    body = getattr(error, "body", None)
+    if isinstance(body, dict):
+        # Overload reported mid-stream, on a response that started as 200
+        error_type = (body.get("error") or {}).get("type")
+        if error_type in _OVERLOAD_ERROR_TYPES:
+            return 529 if error_type == "overloaded_error" else 429
+    return None
+
+
+class LimiterRejected(Exception):
+    """The request could not get a slot (queue full or deadline passed)."""
+
+    def __init__(self, reason: str, retry_after: int = 1):
+        super().__init__(f"Upstream concurrency limit reached ({reason})")
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class SlotPool(Protocol):
+    """Hands out slots: an ``AIMDLimiter``, or the fair queue."""
+
+    def release(
+        self, error: Optional[BaseException] = None, success: bool = False
+    ) -> None: ...
+
+
+async def wait_for_slot(
+    waiter: asyncio.Future,
+    timeout: float,
+    release: Callable[[], None],
+    dequeue: Callable[[], None],
+) -> None:
+    """
+    Wait up to ``timeout`` seconds for a queued ``waiter`` to be granted a slot.
+
+    The waiter is shielded, so a timeout or cancellation cannot lose a slot
+    granted in the meantime: when that happens, ``release()`` passes the slot
+    on; otherwise the waiter is cancelled and ``dequeue()`` takes it out of
+    the queue. Raises ``asyncio.TimeoutError`` once the deadline passes.
+    """
+    try:
+        await asyncio.wait_for(asyncio.shield(waiter), timeout)
+    except BaseException:
+        if waiter.done() and not waiter.cancelled():
+            # The slot was handed over just as we gave up; pass it on
+            release()
+        else:
+            waiter.cancel()
+            dequeue()
+        raise
+
+
+class Permit:
+    """One acquired slot; ``release`` is idempotent."""
+
+    def __init__(self, limiter: Optional[SlotPool]):
+        self.limiter = limiter
+        self.released = limiter is None
+
+    def release(self, error: Optional[BaseException] = None, success: bool = False):
+        """
+        Give the slot back. Pass the upstream error, or ``success=True`` for a
+        completed request; anything else (e.g. a client disconnect) leaves the
+        limit unchanged.
+        """
+        if self.released:
+            return
+        self.released = True
+        self.limiter.release(error=error, success=success)
+
+
+class AIMDLimiter:
+    """Concurrency limit and wait queue for one upstream/API key pair."""
+
+    def __init__(self, upstream: str, initial: int):
+        self.upstream = upstream
+        self.limit = float(initial)
+        self.in_flight = 0
+        self._waiters: deque[asyncio.Future] = deque()
+        self._last_decrease = 0.0
+
+    @property
+    def idle(self) -> bool:
+        return self.in_flight == 0 and not self._waiters
+
+    async def acquire(self, max_queue: int, timeout: float) -> Permit:
+        if self.in_flight < int(self.limit) and not self._waiters:
+            self.in_flight += 1
+            return Permit(self)
+        if len(self._waiters) >= max_queue:
+            UPSTREAM_QUEUE_REJECTED.labels(self.upstream, "queue_full").inc()
+            raise LimiterRejected("queue_full")
+
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        start = time.perf_counter()
+        try:
+            await wait_for_slot(
+                waiter, timeout, self.release, lambda: self._waiters.remove(waiter)
+            )
+        except asyncio.TimeoutError:
+            UPSTREAM_QUEUE_REJECTED.labels(self.upstream, "deadline").inc()
+            raise LimiterRejected("deadline") from None
+        UPSTREAM_QUEUE_WAIT.labels(self.upstream).observe(time.perf_counter() - start)
+        return Permit(self)
+
+    def release(self, error: Optional[BaseException] = None, success: bool = False):
+        self.in_flight -= 1
+        status = overload_status(error) if error is not None else None
+        if status is not None:
+            UPSTREAM_OVERLOADED.labels(self.upstream, str(status)).inc()
+            now = time.monotonic()
+            if now - self._last_decrease >= DECREASE_COOLDOWN:
+                self._last_decrease = now
+                min_limit = ConfigManager.get_cached_int(
+                    "UPSTREAM_CONCURRENCY_MIN", DEFAULT_MIN_LIMIT
+                )
+                self.limit = max(self.limit * BACKOFF_FACTOR, max(min_limit, 1))
+        elif success:
+            max_limit = ConfigManager.get_cached_int(
+                "UPSTREAM_CONCURRENCY_MAX", DEFAULT_MAX_LIMIT
+            )
+            self.limit = min(self.limit + 1 / self.limit, max_limit)
+        self._wake()
+
+    def _wake(self) -> None:
+        # Hand free slots to waiters in FIFO order
+        while self._waiters and self.in_flight < int(self.limit):
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                self.in_flight += 1
+                waiter.set_result(None)
+
+    def stats(self) -> dict:
+        return {
+            "upstream": self.upstream,
+            "limit": round(self.limit, 2),
+            "in_flight": self.in_flight,
+            "queued": len(self._waiters),
+        }
+
+
+class ConcurrencyLimiters:
+    """Registry of AIMD limiters keyed by (upstream, API key), per worker."""
+
+    _limiters: "OrderedDict[tuple[str, str], AIMDLimiter]" = OrderedDict()
+
+    @classmethod
+    async def acquire(cls, upstream: str, api_key: str, queue: bool = True) -> Permit:
+        """
+        Wait for a slot on ``upstream`` for ``api_key``.
+
+        Raises ``LimiterRejected`` when the queue is full or the wait exceeds
+        ``UPSTREAM_QUEUE_TIMEOUT`` seconds; with ``queue=False`` (optional
+        extra requests such as hedges) when no slot is free right now.
+        """
+        if not ConfigManager.get_cached_bool("UPSTREAM_ADAPTIVE_CONCURRENCY", True):
+            return Permit(None)
+
+        key = (upstream, api_key)
+        limiter = cls._limiters.get(key)
+        if limiter is None:
+            initial = ConfigManager.get_cached_int(
+                "UPSTREAM_CONCURRENCY_INITIAL", DEFAULT_INITIAL_LIMIT
+            )
+            limiter = AIMDLimiter(upstream, max(initial, 1))
+            cls._limiters[key] = limiter
+            cls._evict_idle()
+        else:
+            cls._limiters.move_to_end(key)
+
+        max_queue = ConfigManager.get_cached_int(
+            "UPSTREAM_QUEUE_MAX", DEFAULT_QUEUE_MAX
+        )
+        timeout = ConfigManager.get_cached_int(
+            "UPSTREAM_QUEUE_TIMEOUT", DEFAULT_QUEUE_TIMEOUT
+        )
+        if not queue:
+            max_queue = 0
+        return await limiter.acquire(max(max_queue, 0), max(timeout, 0))
+
+    @classmethod
+    def _evict_idle(cls) -> None:
+        if len(cls._limiters) <= MAX_LIMITERS:
+            return
+        for key in [key for key, limiter in cls._limiters.items() if limiter.idle]:
+            del cls._limiters[key]
+            if len(cls._limiters) <= MAX_LIMITERS:
+                break
+
+    @classmethod
+    def stats(cls) -> list[dict]:
+        """Per-pair limits; API keys are shown by their last 4 characters."""
+        return [
+            {**limiter.stats(), "api_key": f"...{api_key[-4:]}"}
+            for (_, api_key), limiter in cls._limiters.items()
+        ]
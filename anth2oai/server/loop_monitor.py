@@ -0,0 +1,48 @@
+"""Event loop lag sampling.
+
+Every worker is one event loop multiplexing all of its streams, so anything
+blocking it (CPU-heavy work, a synchronous call) delays every stream at once.
+The monitor sleeps for a fixed interval and measures how much later than
+requested it woke up; that overshoot is the loop lag. ``lag_ewma`` smooths
+the samples (over roughly the last second) so a single GC pause does not
+count as saturation.
+"""
+
+import asyncio
+from typing import Optional
+
+from anth2oai.server.metrics import EVENT_LOOP_LAG, EVENT_LOOP_LAG_LATEST
+
+SAMPLE_INTERVAL = 0.1
+EWMA_ALPHA = 0.2
+
+
+class LoopLagMonitor:
+    """Per-worker event loop lag sampler."""
+
+    lag: float = 0.0
+    lag_ewma: float = 0.0
+    _task: Optional[asyncio.Task] = None
+
+    @classmethod
+    async def _run(cls) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            start = loop.time()
+            await asyncio.sleep(SAMPLE_INTERVAL)
+            cls.lag = max(loop.time() - start - SAMPLE_INTERVAL, 0.0)
+            cls.lag_ewma += EWMA_ALPHA * (cls.lag - cls.lag_ewma)
+            EVENT_LOOP_LAG.observe(cls.lag)
+            EVENT_LOOP_LAG_LATEST.set(cls.lag)
+
+    @classmethod
+    def start(cls) -> None:
+        if cls._task is None:
+            cls._task = asyncio.create_task(cls._run())
+
+    @classmethod
+    async def stop(cls) -> None:
+        if cls._task is not None:
+            cls._task.cancel()
+            await asyncio.gather(cls._task, return_exceptions=True)
+            cls._task = None
@@ -0,0 +1,240 @@
+"""Anthropic Messages API passthrough (``POST /v1/messages``).
+
+For clients that already speak Anthropic's protocol. The request body is
+forwarded byte for byte and the upstream response (SSE or JSON) is relayed
+unchanged: no SDK objects and no format conversion, only a JSON parse of the
+request to read ``model`` and ``stream`` and of the usage and error events
+(for the token rate limit, the usage ledger and upstream health). Upstream
+selection, concurrency limits, the connection pool and metrics are the same
+as for the Claude route, which makes this route the baseline for the cost of
+the conversion.
+"""
+
+import asyncio
+import json
+import time
+from typing import Optional
+
+from fastapi import HTTPException, Request
+from fastapi.responses import JSONResponse, Response
+from loguru import logger
+
+from anth2oai.constants import (
+    ANTHROPIC_MESSAGES_PATH,
+    ANTHROPIC_VERSION,
+    STREAMING_HEADERS,
+)
+from anth2oai.format import AnthropicStreamState
+from anth2oai.pool import HTTPClientPool
+from anth2oai.server.limiter import ConcurrencyLimiters, LimiterRejected
+from anth2oai.server.metrics import StreamObserver
+from anth2oai.server.streaming import DisconnectAwareStreamingResponse, finish_stream
+from anth2oai.server.upstreams import UpstreamPool
+from anth2oai.server.usage import finish_request
+from anth2oai.sse import SSEParser
+
+# Client request headers forwarded upstream (besides the API key)
+FORWARDED_REQUEST_HEADERS = ("anthropic-version", "anthropic-beta", "content-type")
+# Upstream response headers relayed to the client (exact names or prefixes)
+RELAYED_RESPONSE_HEADERS = ("request-id", "retry-after", "x-request-id")
+RELAYED_RESPONSE_HEADER_PREFIXES = ("anthropic-",)
+# HTTP status of each Anthropic error type, for errors reported mid-stream
+ERROR_TYPE_STATUSES = {
+    "invalid_request_error": 400,
+    "authentication_error": 401,
+    "permission_error": 403,
+    "not_found_error": 404,
+    "request_too_large": 413,
+    "rate_limit_error": 429,
+    "api_error": 500,
+    "overloaded_error": 529,
+}
+
+
+class UpstreamHTTPError(Exception):
+    """An error status from upstream, for health and concurrency bookkeeping."""
+
+    def __init__(self, status_code: int, body: Optional[dict] = None):
+        super().__init__(f"Upstream returned {status_code}")
+        self.status_code = status_code
+        self.body = body
+
+
+def _request_headers(request: Request, api_key: str) -> dict:
+    headers = {
+        name: request.headers[name]
+        for name in FORWARDED_REQUEST_HEADERS
+        if name in request.headers
+    }
+    headers.setdefault("anthropic-version", ANTHROPIC_VERSION)
+    headers.setdefault("content-type", "application/json")
+    headers["x-api-key"] = api_key
+    return headers
+
+
+def _response_headers(response) -> dict:
+    return {
+        name: value
+        for name, value in response.headers.items()
+        if name in RELAYED_RESPONSE_HEADERS
+        or name.startswith(RELAYED_RESPONSE_HEADER_PREFIXES)
+    }
+
+
+def _record_usage(state: AnthropicStreamState, event: str, data: bytes) -> None:
+    """Pick the token counts out of a relayed stream event."""
+    if event == "message_start":
+        state.update_usage(json.loads(data).get("message", {}).get("usage"))
+    elif event == "message_delta":
+        state.update_usage(json.loads(data).get("usage"))
+
+
+def _stream_error(data: bytes) -> UpstreamHTTPError:
+    """The failure reported by an ``error`` event in a stream that began as 200."""
+    try:
+        body = json.loads(data)
+    except ValueError:
+        body = None
+    if not isinstance(body, dict):
+        body = {"type": "error", "error": {"type": "api_error"}}
+    error_type = (body.get("error") or {}).get("type")
+    return UpstreamHTTPError(ERROR_TYPE_STATUSES.get(error_type, 500), body)
+
+
+def _error_response(status_code: int, message: str) -> JSONResponse:
+    """An error in Anthropic's format."""
+    return JSONResponse(
+        status_code=status_code,
+        content={"type": "error", "error": {"type": "api_error", "message": message}},
+    )
+
+
+async def messages_passthrough(request: Request, api_key: str) -> Response:
+    content = await request.body()
+    try:
+        payload = json.loads(content)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Request body is not valid JSON")
+    model = str(payload.get("model", ""))
+    stream = bool(payload.get("stream", False))
+    observer = StreamObserver("messages", model, stream=stream)
+
+    upstream = UpstreamPool.select()
+    try:
+        permit = await ConcurrencyLimiters.acquire(upstream.name, api_key)
+    except LimiterRejected:
+        observer.finish()
+        raise
+    client = HTTPClientPool.get(upstream.base_url)
+    url = upstream.base_url.rstrip("/") + ANTHROPIC_MESSAGES_PATH
+    if request.url.query:
+        url += "?" + request.url.query
+
+    upstream.acquire()
+    released = False
+
+    def _release(error: Optional[Exception] = None, success: bool = False) -> None:
+        nonlocal released
+        if released:
+            return
+        released = True
+        if error is not None:
+            upstream.record_error(error)
+        elif success:
+            upstream.record_success()
+        permit.release(error=error, success=success)
+        upstream.release()
+
+    started = time.perf_counter()
+    try:
+        response = await client.send(
+            client.build_request(
+                "POST", url, content=content, headers=_request_headers(request, api_key)
+            ),
+            stream=stream,
+        )
+    except Exception as e:
+        observer.error(e)
+        _release(error=e)
+        finish_request(api_key, observer)
+        logger.error(f"Messages passthrough to {upstream.name} failed: {e}")
+        return _error_response(502, f"Upstream request failed: {e}")
+
+    status_error = (
+        UpstreamHTTPError(response.status_code) if response.status_code >= 400 else None
+    )
+    if not stream or status_error is not None:
+        # Whole body, errors included, relayed as-is
+        body = await response.aread()
+        await response.aclose()
+        state = AnthropicStreamState()
+        if status_error is not None:
+            observer.error(status_error)
+        else:
+            upstream.record_latency(time.perf_counter() - started)
+            try:
+                state.update_usage(json.loads(body).get("usage"))
+            except (AttributeError, ValueError):
+                pass
+        _release(error=status_error, success=status_error is None)
+        finish_request(api_key, observer, state)
+        return Response(
+            content=body,
+            status_code=response.status_code,
+            headers=_response_headers(response),
+            media_type=response.headers.get("content-type"),
+        )
+
+    state = AnthropicStreamState()
+
+    def _release_unstarted() -> None:
+        if not response.is_closed:
+            # The body never started, so it did not close the response
+            asyncio.get_running_loop().create_task(response.aclose())
+        _release()
+
+    async def _relay():
+        stream_error: Optional[Exception] = None
+        completed = False
+        first_chunk = True
+        # Only the usage and error events are parsed
+        parser = SSEParser()
+        try:
+            async for chunk in response.aiter_bytes():
+                observer.upstream_event()
+                if first_chunk:
+                    first_chunk = False
+                    upstream.record_latency(time.perf_counter() - started)
+                yield chunk
+                for event, data in parser.feed(chunk):
+                    if event == "error":
+                        stream_error = _stream_error(data)
+                    else:
+                        _record_usage(state, event, data)
+                observer.chunk_sent()
+            if stream_error is None:
+                completed = True
+            else:
+                # Already relayed as-is; counted against the upstream like
+                # an error status
+                observer.error(stream_error)
+                logger.warning(
+                    f"Messages stream from {upstream.name} failed: {stream_error.body}"
+                )
+        except Exception as e:
+            observer.error(e)
+            stream_error = e
+            logger.error(f"Error relaying messages stream: {e}")
+            error = {"type": "error", "error": {"type": "api_error", "message": str(e)}}
+            yield f"event: error\ndata: {json.dumps(error)}\n\n".encode()
+        finally:
+            await response.aclose()
+            _release(error=stream_error, success=completed)
+
+    relayed = DisconnectAwareStreamingResponse(
+        _relay(),
+        media_type=response.headers.get("content-type", "text/event-stream"),
+        headers={**STREAMING_HEADERS, **_response_headers(response)},
+    )
+    finish_stream(relayed, api_key, observer, lambda: state, release=_release_unstarted)
+    return relayed
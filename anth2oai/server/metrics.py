@@ -0,0 +1,306 @@
+"""Prometheus metrics for the proxy.
+
+Under gunicorn every worker is a separate process, so metrics use
+``prometheus_client``'s multiprocess mode when ``PROMETHEUS_MULTIPROC_DIR`` is
+set (``gunicorn.conf.py`` sets it up): each worker writes to memory-mapped
+files in that directory and ``/metrics`` aggregates all of them, whichever
+worker serves the scrape. Without the variable (e.g. plain ``uvicorn``) the
+in-process default registry is used.
+"""
+
+import os
+import time
+from fnmatch import fnmatch
+from typing import Optional
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+)
+
+from anth2oai.configs import ConfigManager
+
+MULTIPROC_DIR = os.environ.get("PROMETHEUS_MULTIPROC_DIR")
+if MULTIPROC_DIR:
+    os.makedirs(MULTIPROC_DIR, exist_ok=True)
+
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 0.75, 1, 1.5, 2, 3, 5, 8, 13, 21, 34, 60)
+GAP_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+DURATION_BUCKETS = (0.5, 1, 2.5, 5, 10, 20, 30, 60, 120, 300, 600, 1200)
+LAG_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5)
+TPS_BUCKETS = (5, 10, 20, 30, 40, 50, 60, 80, 100, 150, 200, 300)
+
+LABELS = ("route", "model")
+# Models (shell-style patterns) that get a ``model`` label of their own
+DEFAULT_METRICS_MODELS = "claude-*,gpt-*,*codex*"
+# Distinct model labels per worker; later models are "other" even if they match
+MAX_MODEL_LABELS = 64
+OTHER_MODEL = "other"
+
+UPSTREAM_TTFB = Histogram(
+    "anth2oai_upstream_ttfb_seconds",
+    "Time from request start to the first event from upstream",
+    LABELS,
+    buckets=LATENCY_BUCKETS,
+)
+CLIENT_TTFC = Histogram(
+    "anth2oai_client_first_chunk_seconds",
+    "Time from request start until the first chunk was handed to the client",
+    LABELS,
+    buckets=LATENCY_BUCKETS,
+)
+INTER_CHUNK_GAP = Histogram(
+    "anth2oai_inter_chunk_gap_seconds",
+    "Gap between consecutive chunks sent to the client",
+    LABELS,
+    buckets=GAP_BUCKETS,
+)
+STREAM_DURATION = Histogram(
+    "anth2oai_request_duration_seconds",
+    "Total request duration (whole stream for streaming requests)",
+    (*LABELS, "stream"),
+    buckets=DURATION_BUCKETS,
+)
+OUTPUT_TOKENS_PER_SECOND = Histogram(
+    "anth2oai_output_tokens_per_second",
+    "Output tokens per second over the generation (after the first event)",
+    LABELS,
+    buckets=TPS_BUCKETS,
+)
+STREAMS_IN_FLIGHT = Gauge(
+    "anth2oai_streams_in_flight",
+    "Streams currently being served",
+    LABELS,
+    multiprocess_mode="livesum",
+)
+UPSTREAM_ERRORS = Counter(
+    "anth2oai_upstream_errors_total",
+    "Upstream errors by HTTP status (or error class when there is none)",
+    (*LABELS, "status"),
+)
+UPSTREAM_EJECTIONS = Counter(
+    "anth2oai_upstream_ejections_total",
+    "Upstreams taken out of the pool after failures or failed health checks",
+    ("upstream",),
+)
+STREAMS_CANCELLED = Counter(
+    "anth2oai_streams_cancelled_total",
+    "Streams aborted because the client disconnected",
+    LABELS,
+)
+TOKENS_SAVED = Counter(
+    "anth2oai_cancelled_tokens_saved_total",
+    "Unused max_tokens budget of streams aborted on client disconnect (upper bound)",
+    LABELS,
+)
+
+EVENT_LOOP_LAG = Histogram(
+    "anth2oai_event_loop_lag_seconds",
+    "How late the worker's event loop woke a sampling timer",
+    buckets=LAG_BUCKETS,
+)
+EVENT_LOOP_LAG_LATEST = Gauge(
+    "anth2oai_event_loop_lag_latest_seconds",
+    "Most recent event loop lag sample, per worker",
+    multiprocess_mode="liveall",
+)
+UPSTREAM_OVERLOADED = Counter(
+    "anth2oai_upstream_overloaded_total",
+    "429/529 overload responses per upstream (each shrinks its concurrency limit)",
+    ("upstream", "status"),
+)
+UPSTREAM_QUEUE_WAIT = Histogram(
+    "anth2oai_upstream_queue_wait_seconds",
+    "Time requests waited for an upstream concurrency slot (queued requests only)",
+    ("upstream",),
+    buckets=LATENCY_BUCKETS,
+)
+UPSTREAM_QUEUE_REJECTED = Counter(
+    "anth2oai_upstream_queue_rejected_total",
+    "Requests refused a concurrency slot (queue full or deadline passed)",
+    ("upstream", "reason"),
+)
+UPSTREAM_RETRIES = Counter(
+    "anth2oai_upstream_retries_total",
+    "Stream attempts retried before the first byte, by the upstream retried on",
+    ("upstream",),
+)
+UPSTREAM_HEDGES = Counter(
+    "anth2oai_upstream_hedges_total",
+    "Hedged stream attempts by outcome (won: the hedge produced the first frame)",
+    ("upstream", "outcome"),
+)
+RESPONSE_CACHE_LOOKUPS = Counter(
+    "anth2oai_response_cache_lookups_total",
+    "Response cache lookups by result (memory_hit, disk_hit, miss)",
+    ("result",),
+)
+COALESCED_REQUESTS = Counter(
+    "anth2oai_coalesced_requests_total",
+    "Streaming requests served from an identical stream already in flight",
+)
+RESUMED_STREAMS = Counter(
+    "anth2oai_resumed_streams_total",
+    "Streams continued after a reconnect with Last-Event-ID",
+)
+ADMISSION_REJECTED = Counter(
+    "anth2oai_admission_rejected_total",
+    "Requests shed with 503 by the admission controller",
+    ("reason",),
+)
+
+FAIR_QUEUE_DEPTH = Gauge(
+    "anth2oai_fair_queue_depth",
+    "Requests waiting in the fair queue for a slot under the concurrency cap",
+    ("priority",),
+    multiprocess_mode="livesum",
+)
+FAIR_QUEUE_WAIT = Histogram(
+    "anth2oai_fair_queue_wait_seconds",
+    "Time requests waited in the fair queue (queued requests only)",
+    ("priority",),
+    buckets=LATENCY_BUCKETS,
+)
+FAIR_QUEUE_REJECTED = Counter(
+    "anth2oai_fair_queue_rejected_total",
+    "Requests refused by the fair queue (queue full or deadline passed)",
+    ("reason",),
+)
+USAGE_FLUSH_DURATION = Histogram(
+    "anth2oai_usage_flush_seconds",
+    "Time to write one batch of usage records",
+    buckets=LAG_BUCKETS,
+)
+USAGE_ROWS_DROPPED = Counter(
+    "anth2oai_usage_rows_dropped_total",
+    "Usage records dropped because the write queue was full",
+)
+RATE_LIMITED = Counter(
+    "anth2oai_rate_limited_total",
+    "Requests refused with 429 by the per-API-key rate limits",
+    ("limit",),
+)
+
+
+def error_status(error: BaseException) -> str:
+    """Label value for an upstream error: HTTP status if known, else class name."""
+    status = getattr(error, "status_code", None)
+    if status is None:
+        status = getattr(getattr(error, "response", None), "status_code", None)
+    return str(status) if status is not None else type(error).__name__
+
+
+def render_metrics() -> tuple[bytes, str]:
+    """Render all metrics (aggregated across workers) in text format."""
+    if MULTIPROC_DIR:
+        from prometheus_client import multiprocess
+
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
+
+
+class StreamObserver:
+    """
+    Records the timing of one request.
+
+    Call ``upstream_event()`` when a frame arrives from upstream,
+    ``chunk_sent()`` after it was handed to the client and ``finish()`` (always,
+    e.g. from ``finally``) at the end.
+    """
+
+    # Streams open in this worker, for admission control
+    active_streams: int = 0
+    # Model -> label, for the current METRICS_MODELS value
+    _model_labels: dict[str, str] = {}
+    _model_patterns_raw: Optional[str] = None
+
+    def __init__(self, route: str, model: str, stream: bool = True):
+        self.route = route
+        self.model = model
+        self.labels = (route, self.model_label(model))
+        self.stream = stream
+        self.start = time.perf_counter()
+        self.first_event_at: Optional[float] = None
+        self.last_chunk_at: Optional[float] = None
+        self.finished = False
+        self.failed = False
+        self.aborted = False
+        # Resolve the per-chunk child once instead of on every chunk
+        self._inter_chunk_gap = INTER_CHUNK_GAP.labels(*self.labels)
+        if stream:
+            StreamObserver.active_streams += 1
+            STREAMS_IN_FLIGHT.labels(*self.labels).inc()
+
+    @classmethod
+    def model_label(cls, model: str) -> str:
+        """
+        The ``model`` label for a model: itself if it matches ``METRICS_MODELS``,
+        else "other", so client-chosen names cannot grow the label set
+        without bound.
+        """
+        raw = ConfigManager.get_cached("METRICS_MODELS", DEFAULT_METRICS_MODELS)
+        if raw != cls._model_patterns_raw:
+            cls._model_patterns_raw = raw
+            cls._model_labels = {}
+        label = cls._model_labels.get(model)
+        if label is not None:
+            return label
+        if len(cls._model_labels) >= MAX_MODEL_LABELS:
+            return OTHER_MODEL
+        patterns = [p.strip().lower() for p in raw.split(",") if p.strip()]
+        label = (
+            model
+            if any(fnmatch(model.lower(), pattern) for pattern in patterns)
+            else OTHER_MODEL
+        )
+        cls._model_labels[model] = label
+        return label
+
+    def upstream_event(self) -> None:
+        if self.first_event_at is None:
+            self.first_event_at = time.perf_counter()
+            UPSTREAM_TTFB.labels(*self.labels).observe(self.first_event_at - self.start)
+
+    def chunk_sent(self) -> None:
+        now = time.perf_counter()
+        if self.last_chunk_at is None:
+            CLIENT_TTFC.labels(*self.labels).observe(now - self.start)
+        else:
+            self._inter_chunk_gap.observe(now - self.last_chunk_at)
+        self.last_chunk_at = now
+
+    def error(self, error: BaseException) -> None:
+        self.failed = True
+        UPSTREAM_ERRORS.labels(*self.labels, error_status(error)).inc()
+
+    def cancelled(self, tokens_saved: int = 0) -> None:
+        self.aborted = True
+        STREAMS_CANCELLED.labels(*self.labels).inc()
+        if tokens_saved > 0:
+            TOKENS_SAVED.labels(*self.labels).inc(tokens_saved)
+
+    def finish(self, output_tokens: int = 0) -> None:
+        if self.finished:
+            return
+        self.finished = True
+        now = time.perf_counter()
+        STREAM_DURATION.labels(*self.labels, str(self.stream).lower()).observe(
+            now - self.start
+        )
+        if self.stream:
+            StreamObserver.active_streams -= 1
+            STREAMS_IN_FLIGHT.labels(*self.labels).dec()
+        if output_tokens and self.first_event_at is not None:
+            generation_time = now - self.first_event_at
+            if generation_time > 0:
+                OUTPUT_TOKENS_PER_SECOND.labels(*self.labels).observe(
+                    output_tokens / generation_time
+                )
@@ -0,0 +1,219 @@
+"""Per-API-key rate limits shared by all workers.
+
+Every API key gets two token buckets: one for requests (refilled at
+``RATE_LIMIT_RPS`` per second, holding up to ``RATE_LIMIT_BURST``) and one
+for tokens (refilled at ``RATE_LIMIT_TPM`` per minute, holding a minute's
+worth). A request is admitted while its request bucket holds a whole request
+and its token bucket is not empty; the tokens it used (prompt and completion,
+as reported by upstream) are debited when it finishes, so one large request
+can leave the bucket in debt and hold back the next ones. 0 disables either
+limit.
+
+The buckets live in a small memory-mapped table, so every gunicorn worker
+enforces the same limits: ``gunicorn.conf.py`` points
+``RATE_LIMIT_STATE_FILE`` at a file that each worker maps, and a check is a
+hash probe and a few float operations under ``flock``, with no database or
+network round trip. Without the variable (e.g. plain ``uvicorn``) the table
+is private to the process.
+
+Keys are stored as 64-bit hashes in a fixed number of slots; when the probed
+slots are all taken, the least recently used one is recycled (its key starts
+over with full buckets).
+"""
+
+import fcntl
+import hashlib
+import math
+import mmap
+import os
+import struct
+import time
+from typing import Optional
+
+from anth2oai.configs import ConfigManager
+from anth2oai.server.metrics import RATE_LIMITED
+
+STATE_FILE = os.environ.get("RATE_LIMIT_STATE_FILE")
+
+# key hash, request bucket level, token bucket level, last refill (monotonic)
+_SLOT = struct.Struct("<Qddd")
+SLOTS = 4096
+# Slots probed for a key before the least recently used one is recycled
+PROBE_LENGTH = 16
+
+HEADER_PREFIX = "x-ratelimit-"
+
+
+class RateLimitExceeded(Exception):
+    """The API key is over its request or token rate."""
+
+    def __init__(self, limit: str, retry_after: int, headers: dict[str, str]):
+        super().__init__(f"Rate limit exceeded ({limit} per key), retry later")
+        self.limit = limit
+        self.retry_after = retry_after
+        self.headers = headers
+
+
+# API key -> hash, so the hot path skips hashing the few keys in use
+_key_hashes: dict[str, int] = {}
+
+
+def _key_hash(api_key: str) -> int:
+    key = _key_hashes.get(api_key)
+    if key is None:
+        if len(_key_hashes) >= SLOTS:
+            _key_hashes.clear()
+        digest = hashlib.blake2b(api_key.encode(), digest_size=8).digest()
+        # 0 marks an empty slot
+        key = _key_hashes[api_key] = int.from_bytes(digest, "little") or 1
+    return key
+
+
+def _duration(seconds: float) -> str:
+    """``x-ratelimit-reset-*`` value, e.g. ``"0.25s"``."""
+    return f"{round(max(seconds, 0.0), 3):g}s"
+
+
+class _Limits:
+    """The configured rates, read from the config cache on every check."""
+
+    __slots__ = ("rps", "burst", "tpm")
+
+    def __init__(self):
+        self.rps = max(ConfigManager.get_cached_float("RATE_LIMIT_RPS", 0.0), 0.0)
+        self.burst = max(
+            ConfigManager.get_cached_float("RATE_LIMIT_BURST", 0.0), self.rps, 1.0
+        )
+        self.tpm = max(ConfigManager.get_cached_float("RATE_LIMIT_TPM", 0.0), 0.0)
+
+    @property
+    def enabled(self) -> bool:
+        return self.rps > 0 or self.tpm > 0
+
+
+class RateLimiter:
+    """The shared bucket table; opened lazily by each worker."""
+
+    _table: Optional[mmap.mmap] = None
+    _fd: Optional[int] = None
+    _pid: Optional[int] = None
+
+    @classmethod
+    def _open(cls) -> mmap.mmap:
+        # A table (and its lock) inherited through fork is reopened, so the
+        # flock below excludes the other workers
+        if cls._table is not None and cls._pid == os.getpid():
+            return cls._table
+        size = _SLOT.size * SLOTS
+        if STATE_FILE:
+            fd = os.open(STATE_FILE, os.O_RDWR | os.O_CREAT, 0o600)
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            try:
+                if os.fstat(fd).st_size < size:
+                    os.ftruncate(fd, size)
+            finally:
+                fcntl.flock(fd, fcntl.LOCK_UN)
+            cls._table = mmap.mmap(fd, size)
+            cls._fd = fd
+        else:
+            cls._table = mmap.mmap(-1, size)
+            cls._fd = None
+        cls._pid = os.getpid()
+        return cls._table
+
+    @classmethod
+    def _update(cls, api_key: str, limits: _Limits, debit) -> tuple:
+        """
+        Refill the key's buckets and pass their levels through ``debit``,
+        which returns the levels to store; returns what ``debit`` returned.
+        """
+        table = cls._open()
+        key = _key_hash(api_key)
+        now = time.monotonic()
+        start = key % SLOTS
+        if cls._fd is not None:
+            fcntl.flock(cls._fd, fcntl.LOCK_EX)
+        try:
+            offset = None
+            stalest = None
+            for probe in range(PROBE_LENGTH):
+                slot = (start + probe) % SLOTS * _SLOT.size
+                slot_key, requests, tokens, updated = _SLOT.unpack_from(table, slot)
+                if slot_key == key:
+                    offset = slot
+                    break
+                if slot_key == 0:
+                    stalest = (slot, -math.inf)
+                    break
+                if stalest is None or updated < stalest[1]:
+                    stalest = (slot, updated)
+            if offset is None:
+                # New key (or a recycled slot): both buckets start full
+                offset = stalest[0]
+                requests, tokens, updated = limits.burst, limits.tpm, now
+            elapsed = max(now - updated, 0.0)
+            requests = min(limits.burst, requests + elapsed * limits.rps)
+            tokens = min(limits.tpm, tokens + elapsed * limits.tpm / 60)
+            result = debit(requests, tokens)
+            _SLOT.pack_into(table, offset, key, result[0], result[1], now)
+        finally:
+            if cls._fd is not None:
+                fcntl.flock(cls._fd, fcntl.LOCK_UN)
+        return result
+
+    @classmethod
+    def check(cls, api_key: str) -> dict[str, str]:
+        """
+        Take one request from the key's bucket.
+
+        Returns the ``x-ratelimit-*`` headers for the response (empty when
+        rate limiting is off); raises ``RateLimitExceeded`` if the key is over
+        a limit, in which case nothing is taken.
+        """
+        limits = _Limits()
+        if not limits.enabled:
+            return {}
+
+        def _take(requests: float, tokens: float) -> tuple:
+            if limits.rps > 0 and requests < 1:
+                return requests, tokens, "requests"
+            if limits.tpm > 0 and tokens <= 0:
+                return requests, tokens, "tokens"
+            return requests - 1 if limits.rps > 0 else requests, tokens, None
+
+        requests, tokens, exceeded = cls._update(api_key, limits, _take)
+        headers = {}
+        if limits.rps > 0:
+            headers[HEADER_PREFIX + "limit-requests"] = str(int(limits.burst))
+            headers[HEADER_PREFIX + "remaining-requests"] = str(max(int(requests), 0))
+            headers[HEADER_PREFIX + "reset-requests"] = _duration(
+                (limits.burst - requests) / limits.rps
+            )
+        if limits.tpm > 0:
+            headers[HEADER_PREFIX + "limit-tokens"] = str(int(limits.tpm))
+            headers[HEADER_PREFIX + "remaining-tokens"] = str(max(int(tokens), 0))
+            headers[HEADER_PREFIX + "reset-tokens"] = _duration(
+                (limits.tpm - tokens) * 60 / limits.tpm
+            )
+        if exceeded is None:
+            return headers
+
+        if exceeded == "requests":
+            wait = (1 - requests) / limits.rps
+        else:
+            wait = -tokens * 60 / limits.tpm
+        retry_after = max(math.ceil(wait), 1)
+        RATE_LIMITED.labels(exceeded).inc()
+        raise RateLimitExceeded(
+            exceeded, retry_after, {**headers, "Retry-After": str(retry_after)}
+        )
+
+    @classmethod
+    def charge(cls, api_key: str, tokens: int) -> None:
+        """Debit the tokens a finished request used from the key's bucket."""
+        if tokens <= 0:
+            return
+        limits = _Limits()
+        if limits.tpm <= 0:
+            return
+        cls._update(api_key, limits, lambda requests, level: (requests, level - tokens))
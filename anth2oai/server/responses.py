@@ -0,0 +1,86 @@
+"""JSON responses for non-streaming completions."""
+
+import gzip
+import json
+import sys
+from typing import Optional
+
+from fastapi import Request
+from fastapi.responses import Response
+
+from anth2oai.configs import ConfigManager
+
+try:
+    import orjson
+except ImportError:  # optional speedup, see the "fast" extra
+    orjson = None
+
+GZIP_COMPRESS_LEVEL = 6
+DEFAULT_GZIP_MIN_BYTES = 1024
+
+
+def dumps_json(data) -> bytes:
+    """Serialize to compact JSON bytes, using orjson when it is installed."""
+    if orjson is not None:
+        return orjson.dumps(data)
+    return json.dumps(data, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+
+
+def json_response(data, request: Request) -> Response:
+    """
+    Build a JSON response, gzip-compressed when the client accepts it and the
+    body is at least ``RESPONSE_GZIP_MIN_BYTES`` (0 disables compression).
+    """
+    content = dumps_json(data)
+    headers = {}
+    min_bytes = ConfigManager.get_cached_int(
+        "RESPONSE_GZIP_MIN_BYTES", DEFAULT_GZIP_MIN_BYTES
+    )
+    if (
+        min_bytes > 0
+        and len(content) >= min_bytes
+        and "gzip" in request.headers.get("accept-encoding", "")
+    ):
+        content = gzip.compress(content, compresslevel=GZIP_COMPRESS_LEVEL)
+        headers = {"Content-Encoding": "gzip", "Vary": "Accept-Encoding"}
+    return Response(content=content, media_type="application/json", headers=headers)
+
+
+def _is_api_status_error(error: BaseException) -> bool:
+    # The SDKs are imported on first use; until then none of their errors exist
+    for name in ("anthropic", "openai"):
+        sdk = sys.modules.get(name)
+        if sdk is not None and isinstance(error, sdk.APIStatusError):
+            return True
+    return False
+
+
+def upstream_error_response(error: BaseException) -> Optional[Response]:
+    """
+    The upstream's error status and message in the OpenAI error shape, for an
+    Anthropic or OpenAI SDK ``APIStatusError``; None for any other error.
+    """
+    if not _is_api_status_error(error):
+        return None
+    body = error.body
+    details = body.get("error") if isinstance(body, dict) else None
+    if not isinstance(details, dict):
+        details = {}
+    content = {
+        "error": {
+            "message": details.get("message") or error.message,
+            "type": details.get("type") or "api_error",
+            "param": details.get("param"),
+            "code": details.get("code"),
+        }
+    }
+    headers = {}
+    retry_after = error.response.headers.get("retry-after")
+    if retry_after:
+        headers["Retry-After"] = retry_after
+    return Response(
+        content=dumps_json(content),
+        status_code=error.status_code,
+        media_type="application/json",
+        headers=headers,
+    )
@@ -0,0 +1,259 @@
+"""Retries and hedged requests for Claude streams, before the first byte.
+
+Until a stream has produced its first frame nothing has reached the client,
+so a failed upstream attempt (connection error, 5xx, 429/529) can be replaced
+by a new one without the client noticing. Retries back off exponentially from
+``UPSTREAM_RETRY_BASE_MS`` with full jitter and honour the upstream's
+``retry-after``; a ``retry-after`` longer than ``UPSTREAM_RETRY_MAX_DELAY_MS``
+ends the retries, since the client is better off seeing the error.
+
+With ``UPSTREAM_HEDGE`` enabled, an attempt still waiting for its first frame
+after the recent p95 time to first byte gets a second attempt on another
+upstream; whichever produces the first frame wins and the other is aborted.
+Hedges only use free concurrency slots, never the queue.
+
+Once the first frame is out, the winning attempt is the stream: later errors
+are reported to the client as before.
+"""
+
+import asyncio
+import random
+import time
+from collections import deque
+from typing import AsyncIterator, Callable, Optional
+
+from anth2oai.configs import ConfigManager
+from anth2oai.format import AnthropicStreamState
+from anth2oai.server.limiter import (
+    ConcurrencyLimiters,
+    LimiterRejected,
+    Permit,
+    overload_status,
+)
+from anth2oai.server.metrics import UPSTREAM_HEDGES, UPSTREAM_RETRIES
+from anth2oai.server.upstreams import UpstreamPool, UpstreamState, is_upstream_failure
+
+DEFAULT_RETRY_MAX = 2
+DEFAULT_RETRY_BASE_MS = 250
+DEFAULT_RETRY_MAX_DELAY_MS = 4000
+DEFAULT_HEDGE_MIN_DELAY_MS = 200
+# Recent first-byte times the hedge delay is computed from
+TTFB_WINDOW = 256
+# No hedging until this many samples are in, a cold p95 is meaningless
+TTFB_MIN_SAMPLES = 20
+
+
+def is_retryable(error: BaseException) -> bool:
+    """Whether another attempt (possibly on another upstream) may succeed."""
+    return is_upstream_failure(error) or overload_status(error) is not None
+
+
+def retry_after(error: BaseException) -> Optional[float]:
+    """The upstream's ``retry-after`` in seconds, if it sent one."""
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None)
+    if not headers:
+        return None
+    try:
+        if "retry-after-ms" in headers:
+            return float(headers["retry-after-ms"]) / 1000
+        if "retry-after" in headers:
+            # The HTTP-date form is not worth supporting here
+            return float(headers["retry-after"])
+    except ValueError:
+        pass
+    return None
+
+
+def backoff_delay(retry: int, error: BaseException) -> Optional[float]:
+    """Seconds to wait before retry number ``retry`` (1-based), or None to give up."""
+    base = ConfigManager.get_cached_int("UPSTREAM_RETRY_BASE_MS", DEFAULT_RETRY_BASE_MS)
+    cap = ConfigManager.get_cached_int(
+        "UPSTREAM_RETRY_MAX_DELAY_MS", DEFAULT_RETRY_MAX_DELAY_MS
+    )
+    delay = random.uniform(0, min(cap, base * 2 ** (retry - 1))) / 1000
+    requested = retry_after(error)
+    if requested is not None:
+        if requested * 1000 > cap:
+            return None
+        delay = max(delay, requested)
+    return delay
+
+
+class FirstByteTracker:
+    """Recent upstream first-byte times in this worker, for the hedge delay."""
+
+    _samples: deque[float] = deque(maxlen=TTFB_WINDOW)
+
+    @classmethod
+    def record(cls, seconds: float) -> None:
+        cls._samples.append(seconds)
+
+    @classmethod
+    def hedge_delay(cls) -> Optional[float]:
+        """Seconds to wait before hedging, or None if hedging is off."""
+        if not ConfigManager.get_cached_bool("UPSTREAM_HEDGE", False):
+            return None
+        if len(cls._samples) < TTFB_MIN_SAMPLES:
+            return None
+        ordered = sorted(cls._samples)
+        p95 = ordered[min(int(len(ordered) * 0.95), len(ordered) - 1)]
+        min_delay = ConfigManager.get_cached_int(
+            "UPSTREAM_HEDGE_MIN_DELAY_MS", DEFAULT_HEDGE_MIN_DELAY_MS
+        )
+        return max(p95, min_delay / 1000)
+
+
+class StreamAttempt:
+    """
+    One upstream request of a stream, holding its upstream slot and permit
+    from creation on.
+
+    ``start()`` waits for the first frame; ``close()`` (idempotent) aborts the
+    request if still running and gives back the slot and permit. Every attempt
+    must be closed, including one whose ``start()`` never ran.
+    """
+
+    def __init__(
+        self,
+        upstream: UpstreamState,
+        permit: Permit,
+        frames: AsyncIterator[str],
+        state: AnthropicStreamState,
+    ):
+        self.upstream = upstream
+        self.permit = permit
+        self.frames = frames
+        self.state = state
+        self.first_frame: Optional[str] = None
+        self.closed = False
+        upstream.acquire()
+
+    async def start(self) -> "StreamAttempt":
+        started = time.perf_counter()
+        try:
+            self.first_frame = await self.frames.__anext__()
+        except StopAsyncIteration:
+            pass
+        except BaseException as e:
+            await self.close(error=e)
+            raise
+        first_byte = time.perf_counter() - started
+        self.upstream.record_latency(first_byte)
+        FirstByteTracker.record(first_byte)
+        return self
+
+    async def close(
+        self, error: Optional[BaseException] = None, success: bool = False
+    ) -> None:
+        if self.closed:
+            return
+        self.closed = True
+        try:
+            await self.frames.aclose()
+        finally:
+            if error is not None and not isinstance(error, asyncio.CancelledError):
+                self.upstream.record_error(error)
+            elif success:
+                self.upstream.record_success()
+            self.permit.release(error=error, success=success)
+            self.upstream.release()
+
+
+async def _hedge(
+    launch: Callable[[UpstreamState, Permit], StreamAttempt],
+    api_key: str,
+    tried: list[UpstreamState],
+) -> Optional[StreamAttempt]:
+    upstream = UpstreamPool.select(exclude=tried)
+    if upstream in tried:
+        # No other upstream to hedge on
+        return None
+    try:
+        permit = await ConcurrencyLimiters.acquire(upstream.name, api_key, queue=False)
+    except LimiterRejected:
+        return None
+    tried.append(upstream)
+    return launch(upstream, permit)
+
+
+async def _race(
+    launch: Callable[[UpstreamState, Permit], StreamAttempt],
+    api_key: str,
+    primary: StreamAttempt,
+    tried: list[UpstreamState],
+) -> StreamAttempt:
+    """Start ``primary``, hedging it if its first frame is late."""
+    attempts = [primary]
+    tasks = [asyncio.create_task(primary.start())]
+    hedge: Optional[StreamAttempt] = None
+    winner: Optional[asyncio.Task] = None
+    try:
+        delay = FirstByteTracker.hedge_delay()
+        if delay is not None:
+            done, _ = await asyncio.wait(tasks, timeout=delay)
+            if not done:
+                hedge = await _hedge(launch, api_key, tried)
+                if hedge is not None:
+                    attempts.append(hedge)
+                    tasks.append(asyncio.create_task(hedge.start()))
+
+        pending = set(tasks)
+        while pending and winner is None:
+            done, pending = await asyncio.wait(
+                pending, return_when=asyncio.FIRST_COMPLETED
+            )
+            # Failed attempts have already cleaned up after themselves
+            winner = next(
+                (t for t in tasks if t in done and t.exception() is None), None
+            )
+        if winner is None:
+            raise tasks[0].exception()
+        if hedge is not None:
+            outcome = "lost" if winner is tasks[0] else "won"
+            UPSTREAM_HEDGES.labels(hedge.upstream.name, outcome).inc()
+        return winner.result()
+    finally:
+        # Abort the losers (all attempts, if we were cancelled)
+        losers = [t for t in tasks if t is not winner]
+        for task in losers:
+            task.cancel()
+        await asyncio.gather(*losers, return_exceptions=True)
+        for task, attempt in zip(tasks, attempts):
+            if task is not winner:
+                # Open if it got its first frame too, or if it was cancelled
+                # before start() ever ran; failed ones are closed already
+                await attempt.close()
+
+
+async def start_stream(
+    launch: Callable[[UpstreamState, Permit], StreamAttempt],
+    api_key: str,
+    upstream: UpstreamState,
+    permit: Permit,
+) -> StreamAttempt:
+    """
+    Start a stream on ``upstream`` (holding ``permit``) and return the attempt
+    that produced the first frame.
+
+    ``launch`` builds an attempt for an upstream and permit. Raises the last
+    error when it is not retryable or the retries are used up.
+    """
+    max_retries = ConfigManager.get_cached_int("UPSTREAM_RETRY_MAX", DEFAULT_RETRY_MAX)
+    tried = [upstream]
+    retry = 0
+    while True:
+        try:
+            return await _race(launch, api_key, launch(upstream, permit), tried)
+        except Exception as e:
+            retry += 1
+            if retry > max_retries or not is_retryable(e):
+                raise
+            delay = backoff_delay(retry, e)
+            if delay is None:
+                raise
+        await asyncio.sleep(delay)
+        upstream = UpstreamPool.select(exclude=tried)
+        tried.append(upstream)
+        permit = await ConcurrencyLimiters.acquire(upstream.name, api_key)
+        UPSTREAM_RETRIES.labels(upstream.name).inc()
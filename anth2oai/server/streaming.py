@@ -0,0 +1,157 @@
+"""Streaming responses that stop upstream work when the client disconnects."""
+
+import asyncio
+from typing import AsyncIterator, Callable, Optional
+
+from fastapi.responses import StreamingResponse
+from loguru import logger
+from starlette.types import Receive, Scope, Send
+
+from anth2oai.format import AnthropicStreamState
+from anth2oai.server.metrics import StreamObserver
+from anth2oai.server.usage import finish_request
+
+
+class StreamStats:
+    """Per-process counters for streams aborted by client disconnects."""
+
+    cancelled_streams: int = 0
+    # Upper bound: the max_tokens budget the aborted streams had left
+    tokens_saved: int = 0
+
+    @classmethod
+    def record_cancel(cls, tokens_saved: int = 0) -> None:
+        cls.cancelled_streams += 1
+        cls.tokens_saved += max(tokens_saved, 0)
+
+    @classmethod
+    def stats(cls) -> dict:
+        return {
+            "cancelled_streams": cls.cancelled_streams,
+            "tokens_saved": cls.tokens_saved,
+        }
+
+
+class DisconnectAwareStreamingResponse(StreamingResponse):
+    """
+    ``StreamingResponse`` that closes its body iterator as soon as the client
+    goes away.
+
+    Starlette only cancels the send loop on disconnect (and not at all for
+    ASGI spec 2.4 servers), leaving the generator suspended until garbage
+    collection with its upstream request still running. Here the generator is
+    always ``aclose()``d, so ``finally`` blocks in the stream abort the upstream
+    request right away and its connection is dropped from the pool.
+    """
+
+    def __init__(
+        self,
+        *args,
+        on_disconnect: Optional[Callable[[], None]] = None,
+        **kwargs,
+    ):
+        super().__init__(*args, **kwargs)
+        self.on_disconnect = on_disconnect
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        stream_task = asyncio.create_task(self.stream_response(send))
+        listen_task = asyncio.create_task(self.listen_for_disconnect(receive))
+        try:
+            done, _ = await asyncio.wait(
+                (stream_task, listen_task), return_when=asyncio.FIRST_COMPLETED
+            )
+        finally:
+            stream_task.cancel()
+            listen_task.cancel()
+            await asyncio.gather(stream_task, listen_task, return_exceptions=True)
+            aclose = getattr(self.body_iterator, "aclose", None)
+            if aclose is not None:
+                await aclose()
+
+        if stream_task not in done:
+            logger.info("Client disconnected, upstream stream cancelled")
+            if self.on_disconnect is not None:
+                self.on_disconnect()
+            return
+
+        # Re-raise errors from the send loop
+        stream_task.result()
+        if self.background is not None:
+            await self.background()
+
+
+def guard_stream(
+    response: StreamingResponse,
+    on_end: Callable[[bool], None],
+    on_frame: Optional[Callable[[str], None]] = None,
+) -> None:
+    """
+    Call ``on_end(cancelled)`` exactly once when ``response``'s stream is over.
+
+    That is when its body is exhausted, fails or is closed, or when the client
+    leaves before the body started (then no ``finally`` in the body ever runs,
+    so the disconnect hook is the only place left). ``cancelled`` says the
+    client went away. Closing the stream closes the wrapped body too, which
+    aborts the upstream request. ``on_frame`` sees every frame sent.
+
+    Guards nest: each wraps the body and disconnect hook set by the previous.
+    """
+    ended = False
+
+    def _end(cancelled: bool) -> None:
+        nonlocal ended
+        if not ended:
+            ended = True
+            on_end(cancelled)
+
+    async def _guarded(frames: AsyncIterator[str]):
+        cancelled = False
+        try:
+            async for frame in frames:
+                if on_frame is not None:
+                    on_frame(frame)
+                yield frame
+        except (GeneratorExit, asyncio.CancelledError):
+            cancelled = True
+            raise
+        finally:
+            await frames.aclose()
+            _end(cancelled)
+
+    previous = getattr(response, "on_disconnect", None)
+
+    def _on_disconnect() -> None:
+        _end(True)
+        if previous is not None:
+            previous()
+
+    response.body_iterator = _guarded(response.body_iterator)
+    response.on_disconnect = _on_disconnect
+
+
+def finish_stream(
+    response: StreamingResponse,
+    api_key: str,
+    observer: StreamObserver,
+    usage: Callable[[], Optional[AnthropicStreamState]],
+    release: Optional[Callable[[], None]] = None,
+    tokens_left: Optional[Callable[[], int]] = None,
+) -> None:
+    """
+    Finish a route's streaming request once its stream is over (see
+    ``guard_stream``): count a client disconnect as a cancel, then ``release``
+    what the body may not have released and ``finish_request`` with
+    ``usage()``. ``tokens_left`` is the max_tokens budget an aborted stream
+    had left.
+    """
+
+    def _end(cancelled: bool) -> None:
+        if cancelled:
+            tokens_saved = tokens_left() if tokens_left is not None else 0
+            StreamStats.record_cancel(tokens_saved)
+            observer.cancelled(tokens_saved)
+        if release is not None:
+            release()
+        finish_request(api_key, observer, usage())
+
+    guard_stream(response, _end)
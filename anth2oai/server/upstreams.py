@@ -0,0 +1,280 @@
+"""Weighted pool of Anthropic-compatible upstreams for the Claude route.
+
+Upstreams are stored in the ``upstreams`` table and managed from the admin
+panel; with none configured every request goes to ``ANTHROPIC_BASE_URL`` as
+before. Each request picks an upstream by power-of-two-choices: two
+candidates are drawn at random in proportion to their weight and the one
+with the lower score wins, where the score is, per
+``UPSTREAM_BALANCE_STRATEGY``:
+
+- ``least_outstanding``: in-flight requests / weight
+- ``ewma``: latency EWMA (time to first byte) x (in-flight requests + 1) / weight
+
+Upstreams failing ``UPSTREAM_EJECT_FAILURES`` times in a row (5xx, timeouts,
+connection errors) are ejected for ``UPSTREAM_EJECT_SECONDS``, doubling on
+repeated ejections. A background task probes every upstream each
+``UPSTREAM_HEALTH_INTERVAL`` seconds: a failed probe ejects it, a successful
+one (a 2xx, 401 or 403 answer to ``UPSTREAM_HEALTH_PATH``) brings an ejected
+upstream back early.
+
+State is per worker: each gunicorn worker balances and probes on its own.
+"""
+
+import asyncio
+import random
+import sys
+import time
+from typing import Optional, Sequence
+
+import httpx
+from loguru import logger
+
+from anth2oai.configs import DEFAULT_ANTHROPIC_BASE_URL, ConfigManager
+from anth2oai.pool import HTTPClientPool
+from anth2oai.server.metrics import UPSTREAM_EJECTIONS
+
+STRATEGY_LEAST_OUTSTANDING = "least_outstanding"
+STRATEGY_EWMA = "ewma"
+
+DEFAULT_EJECT_FAILURES = 3
+DEFAULT_EJECT_SECONDS = 30
+DEFAULT_HEALTH_INTERVAL = 10
+# Appended to the upstream's base URL, like ANTHROPIC_MESSAGES_PATH
+DEFAULT_HEALTH_PATH = "/v1/models"
+# Answers meaning the upstream is serving (401/403: probed without a key)
+HEALTHY_STATUSES = frozenset({401, 403})
+HEALTH_TIMEOUT = 5.0
+# Longest ejection is DEFAULT_EJECT_SECONDS * 2 ** MAX_EJECT_DOUBLINGS
+MAX_EJECT_DOUBLINGS = 5
+EWMA_ALPHA = 0.3
+
+# Error types an upstream reports mid-stream when it is itself in trouble
+_UPSTREAM_ERROR_TYPES = {"api_error", "overloaded_error"}
+
+
+def _is_connection_error(error: BaseException) -> bool:
+    if isinstance(error, httpx.TransportError):
+        return True
+    # The SDK is imported on first use; until then none of its errors exist
+    anthropic = sys.modules.get("anthropic")
+    return anthropic is not None and isinstance(error, anthropic.APIConnectionError)
+
+
+def is_upstream_failure(error: BaseException) -> bool:
+    """Whether an error says the upstream is unhealthy (not the request)."""
+    if _is_connection_error(error):
+        return True
+    status = getattr(error, "status_code", None)
+    if status is not None and status >= 500:
+        return True
+    body = getattr(error, "body", None)
+    if isinstance(body, dict):
+        # An SDK status error, possibly reported mid-stream
+        error_type = (body.get("error") or {}).get("type")
+        return error_type in _UPSTREAM_ERROR_TYPES
+    return False
+
+
+def health_url(base_url: str, path: str) -> str:
+    """The probe URL: ``path`` appended to the upstream's base URL."""
+    return base_url.rstrip("/") + "/" + path.lstrip("/")
+
+
+class UpstreamState:
+    """Runtime state of one upstream in this worker."""
+
+    def __init__(self, name: str, base_url: str, weight: int = 1):
+        self.name = name
+        self.base_url = base_url
+        self.weight = max(weight, 1)
+        self.outstanding = 0
+        self.latency_ewma: Optional[float] = None
+        self.consecutive_failures = 0
+        self.ejections = 0
+        self.ejected_until = 0.0
+        self.requests = 0
+        self.failures = 0
+
+    def available(self, now: float) -> bool:
+        return now >= self.ejected_until
+
+    def score(self, strategy: str) -> float:
+        if strategy == STRATEGY_EWMA:
+            # Unmeasured upstreams score 0 so they get tried
+            return (self.latency_ewma or 0.0) * (self.outstanding + 1) / self.weight
+        return self.outstanding / self.weight
+
+    def acquire(self) -> None:
+        self.outstanding += 1
+        self.requests += 1
+
+    def release(self) -> None:
+        self.outstanding -= 1
+
+    def record_latency(self, seconds: float) -> None:
+        if self.latency_ewma is None:
+            self.latency_ewma = seconds
+        else:
+            self.latency_ewma += EWMA_ALPHA * (seconds - self.latency_ewma)
+
+    def record_success(self) -> None:
+        self.consecutive_failures = 0
+        if self.available(time.monotonic()):
+            self.ejections = 0
+
+    def record_error(self, error: BaseException) -> None:
+        if not is_upstream_failure(error):
+            return
+        self.failures += 1
+        self.consecutive_failures += 1
+        threshold = ConfigManager.get_cached_int(
+            "UPSTREAM_EJECT_FAILURES", DEFAULT_EJECT_FAILURES
+        )
+        if self.consecutive_failures >= max(threshold, 1):
+            self.eject(f"{self.consecutive_failures} consecutive failures: {error}")
+
+    def eject(self, reason: str) -> None:
+        if not self.available(time.monotonic()):
+            return
+        base = ConfigManager.get_cached_int(
+            "UPSTREAM_EJECT_SECONDS", DEFAULT_EJECT_SECONDS
+        )
+        duration = base * 2 ** min(self.ejections, MAX_EJECT_DOUBLINGS)
+        self.ejections += 1
+        self.consecutive_failures = 0
+        self.ejected_until = time.monotonic() + duration
+        UPSTREAM_EJECTIONS.labels(self.name).inc()
+        logger.warning(f"Upstream {self.name} ejected for {duration}s ({reason})")
+
+    def reinstate(self) -> None:
+        if not self.available(time.monotonic()):
+            logger.info(f"Upstream {self.name} passed its health check, reinstated")
+        self.ejected_until = 0.0
+        self.consecutive_failures = 0
+
+    def stats(self) -> dict:
+        return {
+            "name": self.name,
+            "base_url": self.base_url,
+            "weight": self.weight,
+            "outstanding": self.outstanding,
+            "latency_ewma": self.latency_ewma,
+            "requests": self.requests,
+            "failures": self.failures,
+            "ejected": not self.available(time.monotonic()),
+            "ejected_for": max(self.ejected_until - time.monotonic(), 0.0),
+        }
+
+
+class UpstreamPool:
+    """Upstream selection for the Claude route (per worker)."""
+
+    _upstreams: list[UpstreamState] = []
+    # ANTHROPIC_BASE_URL fallback, keyed by URL so a config change starts fresh
+    _fallback: Optional[UpstreamState] = None
+    _health_task: Optional[asyncio.Task] = None
+
+    @classmethod
+    async def reload(cls) -> None:
+        """Load enabled upstreams from the DB, keeping state of unchanged ones."""
+        from anth2oai.models import Upstream
+
+        rows = await Upstream.filter(enabled=True).order_by("id")
+        current = {(u.name, u.base_url): u for u in cls._upstreams}
+        upstreams = []
+        for row in rows:
+            state = current.get((row.name, row.base_url))
+            if state is None:
+                state = UpstreamState(row.name, row.base_url, row.weight)
+            state.weight = max(row.weight, 1)
+            upstreams.append(state)
+        cls._upstreams = upstreams
+        logger.info(f"Loaded {len(upstreams)} upstreams")
+
+    @classmethod
+    def upstreams(cls) -> list[UpstreamState]:
+        """Configured upstreams, or the ``ANTHROPIC_BASE_URL`` fallback."""
+        if cls._upstreams:
+            return cls._upstreams
+        base_url = ConfigManager.get_cached(
+            "ANTHROPIC_BASE_URL", DEFAULT_ANTHROPIC_BASE_URL
+        )
+        if cls._fallback is None or cls._fallback.base_url != base_url:
+            cls._fallback = UpstreamState("default", base_url)
+        return [cls._fallback]
+
+    @classmethod
+    def select(cls, exclude: Sequence[UpstreamState] = ()) -> UpstreamState:
+        """
+        Pick the upstream for a request, avoiding ``exclude`` (e.g. upstreams
+        already tried) unless nothing else is left.
+        """
+        upstreams = cls.upstreams()
+        if len(upstreams) == 1:
+            return upstreams[0]
+        now = time.monotonic()
+        # With every upstream ejected, fail open rather than refuse traffic
+        candidates = [u for u in upstreams if u.available(now)] or upstreams
+        if exclude:
+            candidates = [u for u in candidates if u not in exclude] or candidates
+        if len(candidates) == 1:
+            return candidates[0]
+        strategy = ConfigManager.get_cached(
+            "UPSTREAM_BALANCE_STRATEGY", STRATEGY_LEAST_OUTSTANDING
+        )
+        first, second = random.choices(
+            candidates, weights=[u.weight for u in candidates], k=2
+        )
+        return min(first, second, key=lambda u: u.score(strategy))
+
+    @classmethod
+    def stats(cls) -> list[dict]:
+        return [u.stats() for u in cls.upstreams()]
+
+    @classmethod
+    async def _probe(cls, upstream: UpstreamState) -> None:
+        path = ConfigManager.get_cached("UPSTREAM_HEALTH_PATH", DEFAULT_HEALTH_PATH)
+        client = HTTPClientPool.get(upstream.base_url)
+        try:
+            response = await client.get(
+                health_url(upstream.base_url, path), timeout=HEALTH_TIMEOUT
+            )
+        except httpx.HTTPError as e:
+            upstream.eject(f"health check failed: {type(e).__name__}")
+            return
+        status = response.status_code
+        if 200 <= status < 300 or status in HEALTHY_STATUSES:
+            upstream.reinstate()
+        else:
+            upstream.eject(f"health check returned {status}")
+
+    @classmethod
+    async def _health_loop(cls) -> None:
+        while True:
+            interval = ConfigManager.get_cached_int(
+                "UPSTREAM_HEALTH_INTERVAL", DEFAULT_HEALTH_INTERVAL
+            )
+            if interval <= 0:
+                # Disabled; check again later in case it is turned on
+                await asyncio.sleep(DEFAULT_HEALTH_INTERVAL)
+                continue
+            await asyncio.sleep(interval)
+            upstreams = cls.upstreams()
+            if len(upstreams) < 2:
+                # Nothing to fail over to, ejecting would change nothing
+                continue
+            await asyncio.gather(
+                *(cls._probe(u) for u in upstreams), return_exceptions=True
+            )
+
+    @classmethod
+    def start_health_checks(cls) -> None:
+        if cls._health_task is None:
+            cls._health_task = asyncio.create_task(cls._health_loop())
+
+    @classmethod
+    async def stop_health_checks(cls) -> None:
+        if cls._health_task is not None:
+            cls._health_task.cancel()
+            await asyncio.gather(cls._health_task, return_exceptions=True)
+            cls._health_task = None
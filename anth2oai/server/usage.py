@@ -0,0 +1,271 @@
+"""Usage ledger: token usage, latency and model of every proxied request.
+
+``finish_request`` ends a request that went upstream: it debits the tokens
+from the key's rate limit, queues a ``UsageRecord`` row in memory and
+finishes the request's ``StreamObserver``. Nothing is written on the request
+path. A background task per worker writes the queued rows in one transaction
+per batch, as soon as ``USAGE_FLUSH_ROWS`` rows are waiting or at least every
+``USAGE_FLUSH_INTERVAL_MS``, so the workers take SQLite's write lock a few
+times a second instead of once per request. Rows older than
+``USAGE_RETENTION_DAYS`` are deleted about once an hour.
+
+If the database falls behind, at most ``MAX_PENDING_ROWS`` rows wait per
+worker; the oldest beyond that are dropped (and counted), never the stream.
+Rows still queued when a worker stops are written on shutdown.
+"""
+
+import asyncio
+import hashlib
+import time
+from datetime import timedelta
+from typing import Optional
+
+from loguru import logger
+from tortoise import timezone
+from tortoise.functions import Avg, Count, Sum
+from tortoise.transactions import in_transaction
+
+from anth2oai.configs import ConfigManager
+from anth2oai.format import AnthropicStreamState
+from anth2oai.models import UsageRecord
+from anth2oai.server.metrics import (
+    USAGE_FLUSH_DURATION,
+    USAGE_ROWS_DROPPED,
+    StreamObserver,
+)
+from anth2oai.server.ratelimit import RateLimiter
+
+DEFAULT_FLUSH_ROWS = 200
+DEFAULT_FLUSH_INTERVAL_MS = 1000
+DEFAULT_RETENTION_DAYS = 90
+MAX_PENDING_ROWS = 10000
+PRUNE_INTERVAL = 3600
+
+STATUS_OK = "ok"
+STATUS_ERROR = "error"
+STATUS_CANCELLED = "cancelled"
+
+
+def key_id(api_key: str) -> str:
+    """Stable identifier of an API key that does not reveal it."""
+    return hashlib.sha256(api_key.encode()).hexdigest()[:16]
+
+
+def completion_usage_state(usage) -> AnthropicStreamState:
+    """
+    The Anthropic-style counts behind an OpenAI ``CompletionUsage`` (as built
+    by ``build_completion_usage``, which adds the cached tokens to
+    ``prompt_tokens``).
+    """
+    state = AnthropicStreamState()
+    if usage is None:
+        return state
+    details = usage.prompt_tokens_details
+    cache_read = getattr(details, "cached_tokens", None) or 0
+    cache_creation = getattr(details, "cache_creation_tokens", None) or 0
+    state.input_tokens = max(usage.prompt_tokens - cache_read - cache_creation, 0)
+    state.output_tokens = usage.completion_tokens
+    state.cache_read_input_tokens = cache_read
+    state.cache_creation_input_tokens = cache_creation
+    return state
+
+
+def finish_request(
+    api_key: str,
+    observer: StreamObserver,
+    usage: Optional[AnthropicStreamState] = None,
+) -> None:
+    """
+    End a request that went upstream: charge its tokens to the key's rate
+    limit, record it in the ledger and finish its observer. Only the first
+    call per request counts.
+    """
+    if observer.finished:
+        return
+    if usage is not None:
+        RateLimiter.charge(api_key, usage.total_tokens)
+    UsageLedger.record(api_key, observer, usage)
+    observer.finish(usage.output_tokens if usage is not None else 0)
+
+
+class UsageLedger:
+    """Rows waiting to be written, and the task writing them (per worker)."""
+
+    _pending: list[dict] = []
+    _wakeup: Optional[asyncio.Event] = None
+    _task: Optional[asyncio.Task] = None
+    _last_prune: float = 0.0
+
+    @classmethod
+    def record(
+        cls,
+        api_key: str,
+        observer: StreamObserver,
+        usage: Optional[AnthropicStreamState],
+    ) -> None:
+        if not ConfigManager.get_cached_bool("USAGE_LEDGER", True):
+            return
+        now = time.perf_counter()
+        created_at = timezone.now()
+        if observer.failed:
+            status = STATUS_ERROR
+        elif observer.aborted:
+            status = STATUS_CANCELLED
+        else:
+            status = STATUS_OK
+        route, model = observer.route, observer.model
+        row = {
+            "day": created_at.date(),
+            "created_at": created_at,
+            "key_id": key_id(api_key),
+            "key_hint": api_key[-4:],
+            "route": route,
+            "model": model[:100],
+            "stream": observer.stream,
+            "status": status,
+            "duration_ms": int((now - observer.start) * 1000),
+            "first_event_ms": (
+                int((observer.first_event_at - observer.start) * 1000)
+                if observer.first_event_at is not None
+                else None
+            ),
+        }
+        if usage is not None:
+            row["input_tokens"] = usage.input_tokens
+            row["output_tokens"] = usage.output_tokens
+            row["cache_read_tokens"] = usage.cache_read_input_tokens
+            row["cache_creation_tokens"] = usage.cache_creation_input_tokens
+        cls._pending.append(row)
+
+        if len(cls._pending) > MAX_PENDING_ROWS:
+            dropped = len(cls._pending) - MAX_PENDING_ROWS
+            del cls._pending[:dropped]
+            USAGE_ROWS_DROPPED.inc(dropped)
+        flush_rows = ConfigManager.get_cached_int(
+            "USAGE_FLUSH_ROWS", DEFAULT_FLUSH_ROWS
+        )
+        if cls._wakeup is not None and len(cls._pending) >= flush_rows:
+            cls._wakeup.set()
+
+    @classmethod
+    async def flush(cls) -> int:
+        """Write the queued rows in one transaction; returns how many."""
+        rows, cls._pending = cls._pending, []
+        if not rows:
+            return 0
+        start = time.perf_counter()
+        try:
+            async with in_transaction() as connection:
+                await UsageRecord.bulk_create(
+                    [UsageRecord(**row) for row in rows], using_db=connection
+                )
+        except Exception as e:
+            logger.warning(f"Writing {len(rows)} usage records failed: {e}")
+            # Retry with the next batch, keeping the newest rows if over
+            cls._pending[:0] = rows
+            if len(cls._pending) > MAX_PENDING_ROWS:
+                dropped = len(cls._pending) - MAX_PENDING_ROWS
+                del cls._pending[:dropped]
+                USAGE_ROWS_DROPPED.inc(dropped)
+            return 0
+        USAGE_FLUSH_DURATION.observe(time.perf_counter() - start)
+        return len(rows)
+
+    @classmethod
+    async def prune(cls) -> int:
+        """Delete the rows older than ``USAGE_RETENTION_DAYS``."""
+        days = ConfigManager.get_cached_int(
+            "USAGE_RETENTION_DAYS", DEFAULT_RETENTION_DAYS
+        )
+        if days <= 0:
+            return 0
+        cutoff = timezone.now().date() - timedelta(days=days)
+        return await UsageRecord.filter(day__lt=cutoff).delete()
+
+    @classmethod
+    async def _flush_loop(cls) -> None:
+        while True:
+            interval_ms = ConfigManager.get_cached_int(
+                "USAGE_FLUSH_INTERVAL_MS", DEFAULT_FLUSH_INTERVAL_MS
+            )
+            try:
+                await asyncio.wait_for(cls._wakeup.wait(), max(interval_ms, 10) / 1000)
+            except asyncio.TimeoutError:
+                pass
+            cls._wakeup.clear()
+            await cls.flush()
+            if time.monotonic() - cls._last_prune >= PRUNE_INTERVAL:
+                cls._last_prune = time.monotonic()
+                try:
+                    await cls.prune()
+                except Exception as e:
+                    logger.warning(f"Pruning usage records failed: {e}")
+
+    @classmethod
+    def start(cls) -> None:
+        if cls._task is None:
+            cls._wakeup = asyncio.Event()
+            cls._task = asyncio.create_task(cls._flush_loop())
+
+    @classmethod
+    async def stop(cls) -> None:
+        """Stop the writer and write whatever is still queued."""
+        if cls._task is not None:
+            cls._task.cancel()
+            await asyncio.gather(cls._task, return_exceptions=True)
+            cls._task = None
+            cls._wakeup = None
+        await cls.flush()
+
+
+async def usage_rollup(
+    group_by: tuple[str, ...], days: int, key: Optional[str] = None
+) -> list[dict]:
+    """
+    Requests, tokens and mean latency over the last ``days`` days (today
+    included, UTC), grouped by the given ``UsageRecord`` columns.
+    """
+    since = timezone.now().date() - timedelta(days=max(days, 1) - 1)
+    query = UsageRecord.filter(day__gte=since)
+    if key:
+        query = query.filter(key_id=key)
+    rows = (
+        await query.annotate(
+            requests=Count("id"),
+            input_tokens_sum=Sum("input_tokens"),
+            output_tokens_sum=Sum("output_tokens"),
+            cache_read_tokens_sum=Sum("cache_read_tokens"),
+            cache_creation_tokens_sum=Sum("cache_creation_tokens"),
+            avg_duration_ms=Avg("duration_ms"),
+            avg_first_event_ms=Avg("first_event_ms"),
+        )
+        .group_by(*group_by)
+        .order_by(*group_by)
+        .values(
+            *group_by,
+            "requests",
+            "input_tokens_sum",
+            "output_tokens_sum",
+            "cache_read_tokens_sum",
+            "cache_creation_tokens_sum",
+            "avg_duration_ms",
+            "avg_first_event_ms",
+        )
+    )
+    return [
+        {
+            **{column: row[column] for column in group_by},
+            "requests": row["requests"],
+            "input_tokens": row["input_tokens_sum"] or 0,
+            "output_tokens": row["output_tokens_sum"] or 0,
+            "cache_read_tokens": row["cache_read_tokens_sum"] or 0,
+            "cache_creation_tokens": row["cache_creation_tokens_sum"] or 0,
+            "avg_duration_ms": round(row["avg_duration_ms"] or 0),
+            "avg_first_event_ms": (
+                round(row["avg_first_event_ms"])
+                if row["avg_first_event_ms"] is not None
+                else None
+            ),
+        }
+        for row in rows
+    ]
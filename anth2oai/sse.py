@@ -0,0 +1,373 @@
+# sse.py
+"""
+Fast-path Server-Sent Events handling for streamed chat completions.
+
+``format_anthropic_stream_event_to_openai_chunk`` builds nested pydantic models
+for every token, which the server then ``model_dump()``s and ``json.dumps``
+again. ``ChunkEncoder`` produces the exact same ``data: {...}\\n\\n`` frames
+from string templates instead. The templates are rendered once from the real
+``ChatCompletionChunk`` model with marker values, so the field order and
+``null`` fields always match the installed ``openai`` package byte for byte.
+
+``SSEParser`` is the matching upstream side: a small incremental parser for the
+raw Anthropic event stream, so events can be handed to ``ChunkEncoder`` as
+plain dicts without constructing Anthropic SDK objects.
+"""
+
+import json
+import re
+import time
+from functools import lru_cache
+from typing import AsyncIterator, Optional
+
+from .format import (
+    AnthropicStreamState,
+    _anthropic_stop_to_openai_finish,
+    build_completion_usage,
+)
+from .patch import TOOL_PATCH_PREFIX
+
+SSE_DONE = "data: [DONE]\n\n"
+
+# Marker values substituted into the rendered templates. They only ever meet
+# each other (never user content), so plain ASCII tokens are unambiguous.
+_ID = "a2o-slot-id"
+_MODEL = "a2o-slot-model"
+_CREATED = 4102444801
+_CONTENT = "a2o-slot-content"
+_TOOL_INDEX = 4102444802
+_TOOL_ID = "a2o-slot-tool-id"
+_TOOL_NAME = "a2o-slot-tool-name"
+_ARGUMENTS = "a2o-slot-arguments"
+_FINISH_REASON = "a2o-slot-finish-reason"
+
+_SLOTS = {
+    json.dumps(_ID): "id",
+    json.dumps(_MODEL): "model",
+    str(_CREATED): "created",
+    json.dumps(_CONTENT): "content",
+    str(_TOOL_INDEX): "tool_index",
+    json.dumps(_TOOL_ID): "tool_id",
+    json.dumps(_TOOL_NAME): "tool_name",
+    json.dumps(_ARGUMENTS): "arguments",
+    json.dumps(_FINISH_REASON): "finish_reason",
+}
+_SLOT_PATTERN = re.compile("|".join(re.escape(marker) for marker in _SLOTS))
+
+# Slot order per chunk shape; ``ChunkEncoder`` fills the per-chunk slots
+# positionally, so a field reorder in ``openai`` must fail loudly.
+_EXPECTED_SLOTS = {
+    "role": ("id", "created", "model"),
+    "text": ("id", "content", "created", "model"),
+    "tool_start": ("id", "tool_index", "tool_id", "tool_name", "created", "model"),
+    "arguments": ("id", "tool_index", "arguments", "created", "model"),
+    "finish": ("id", "finish_reason", "created", "model"),
+}
+
+
+def _compile(rendered: str) -> list:
+    """Split a rendered frame into literal strings and slot names."""
+    parts: list = []
+    position = 0
+    for match in _SLOT_PATTERN.finditer(rendered):
+        parts.append(rendered[position : match.start()])
+        parts.append((_SLOTS[match.group(0)],))
+        position = match.end()
+    parts.append(rendered[position:])
+    return parts
+
+
+@lru_cache(maxsize=1)
+def _templates() -> dict[str, list]:
+    """Render one marker-filled frame per chunk shape (built on first use)."""
+    from openai.types.chat.chat_completion_chunk import (
+        ChatCompletionChunk,
+        ChoiceDelta,
+        ChoiceDeltaToolCall,
+        ChoiceDeltaToolCallFunction,
+    )
+    from openai.types.chat.chat_completion_chunk import (
+        Choice as ChunkChoice,
+    )
+
+    def render(delta: ChoiceDelta, finish_reason=None) -> list:
+        # model_construct: the finish_reason marker is not a valid literal
+        choice = ChunkChoice.model_construct(
+            index=0, delta=delta, finish_reason=finish_reason
+        )
+        chunk = ChatCompletionChunk(
+            id=_ID,
+            choices=[choice],
+            created=_CREATED,
+            model=_MODEL,
+            object="chat.completion.chunk",
+        )
+        return _compile(f"data: {json.dumps(chunk.model_dump())}\n\n")
+
+    templates = {
+        "role": render(ChoiceDelta(content="", role="assistant")),
+        "text": render(ChoiceDelta(content=_CONTENT)),
+        "tool_start": render(
+            ChoiceDelta(
+                content=None,
+                tool_calls=[
+                    ChoiceDeltaToolCall(
+                        index=_TOOL_INDEX,
+                        id=_TOOL_ID,
+                        type="function",
+                        function=ChoiceDeltaToolCallFunction(
+                            name=_TOOL_NAME,
+                            arguments="",
+                        ),
+                    )
+                ],
+            )
+        ),
+        "arguments": render(
+            ChoiceDelta(
+                content=None,
+                tool_calls=[
+                    ChoiceDeltaToolCall(
+                        index=_TOOL_INDEX,
+                        function=ChoiceDeltaToolCallFunction(arguments=_ARGUMENTS),
+                    )
+                ],
+            )
+        ),
+        "finish": render(ChoiceDelta(), finish_reason=_FINISH_REASON),
+    }
+    for kind, parts in templates.items():
+        slots = tuple(part[0] for part in parts if isinstance(part, tuple))
+        if slots != _EXPECTED_SLOTS[kind]:
+            raise RuntimeError(f"Unexpected {kind} chunk layout: {slots}")
+    return templates
+
+
+def preload_templates() -> None:
+    """Render the templates now rather than on the first stream."""
+    _templates()
+
+
+def _bake(parts: list, values: dict[str, str]) -> tuple:
+    """Fill in the given slots and merge adjacent literals."""
+    baked: list = [""]
+    for part in parts:
+        if isinstance(part, tuple) and part[0] in values:
+            part = values[part[0]]
+        if isinstance(part, str) and isinstance(baked[-1], str):
+            baked[-1] += part
+        else:
+            baked.append(part)
+    return tuple(baked)
+
+
+class ChunkEncoder:
+    """
+    Encode Anthropic stream events directly into OpenAI SSE frames.
+
+    Output is identical to ``json.dumps`` of the chunk returned by
+    ``format_anthropic_stream_event_to_openai_chunk`` for the same event.
+    One encoder is created per stream.
+    """
+
+    def __init__(
+        self,
+        model: str,
+        state: Optional[AnthropicStreamState] = None,
+        tool_names: Optional[dict[str, str]] = None,
+    ):
+        self.state = state or AnthropicStreamState()
+        self.model = model
+        # Prefixed upstream tool name -> client's tool name
+        self.tool_names = tool_names or {}
+        self._stream_values = {
+            "id": json.dumps(self.state.message_id),
+            "model": json.dumps(model),
+        }
+        self._created = -1
+        self._frames: dict[str, tuple] = {}
+
+    def _frame_parts(self, kind: str) -> tuple:
+        created = int(time.time())
+        if created != self._created:
+            # ``created`` is per chunk upstream; re-bake at most once a second.
+            self._created = created
+            values = {**self._stream_values, "created": str(created)}
+            self._frames = {
+                name: _bake(parts, values) for name, parts in _templates().items()
+            }
+        return self._frames[kind]
+
+    def _client_tool_name(self, name: str) -> str:
+        client_name = self.tool_names.get(name)
+        if client_name is None:
+            client_name = name.replace(TOOL_PATCH_PREFIX, "")
+        return client_name
+
+    def _role(self) -> str:
+        return self._frame_parts("role")[0]
+
+    def _text(self, text: str) -> str:
+        head, _, tail = self._frame_parts("text")
+        return head + json.dumps(text) + tail
+
+    def _tool_start(self, index: int, tool_id: str, name: str) -> str:
+        p0, _, p1, _, p2, _, p3 = self._frame_parts("tool_start")
+        return p0 + str(index) + p1 + json.dumps(tool_id) + p2 + json.dumps(name) + p3
+
+    def _arguments(self, index: int, partial_json: str) -> str:
+        p0, _, p1, _, p2 = self._frame_parts("arguments")
+        return p0 + str(index) + p1 + json.dumps(partial_json) + p2
+
+    def _finish(self, finish_reason: str) -> str:
+        head, _, tail = self._frame_parts("finish")
+        return head + json.dumps(finish_reason) + tail
+
+    def usage_frame(self) -> str:
+        """
+        Final ``choices: []`` frame carrying the accumulated token usage, as
+        sent by OpenAI for ``stream_options.include_usage``.
+        """
+        from openai.types.chat.chat_completion_chunk import ChatCompletionChunk
+
+        state = self.state
+        chunk = ChatCompletionChunk(
+            id=state.message_id,
+            choices=[],
+            created=int(time.time()),
+            model=self.model,
+            object="chat.completion.chunk",
+            usage=build_completion_usage(
+                state.input_tokens,
+                state.output_tokens,
+                state.cache_read_input_tokens,
+                state.cache_creation_input_tokens,
+            ),
+        )
+        return f"data: {json.dumps(chunk.model_dump())}\n\n"
+
+    def encode(self, event) -> Optional[str]:
+        """
+        Encode one Anthropic SDK stream event, or return None if it emits
+        nothing. Dumps the event and goes through ``encode_dict``.
+        """
+        return self.encode_dict(event.type, event.model_dump())
+
+    def encode_dict(self, event_type: str, data: dict) -> Optional[str]:
+        """Encode one raw Anthropic stream event given as a parsed JSON dict."""
+        state = self.state
+
+        if event_type == "content_block_delta":
+            delta = data["delta"]
+            delta_type = delta.get("type")
+            if delta_type == "text_delta":
+                return self._text(delta["text"])
+            if delta_type == "input_json_delta":
+                return self._arguments(state.current_tool_index, delta["partial_json"])
+            return None
+
+        if event_type == "message_start":
+            state.sent_initial_role = True
+            state.update_usage(data.get("message", {}).get("usage"))
+            return self._role()
+
+        if event_type == "content_block_start":
+            content_block = data["content_block"]
+            block_type = content_block.get("type")
+            state.current_content_block_index = data.get("index", -1)
+            state.current_content_block_type = block_type
+            if block_type == "tool_use":
+                state.current_tool_index += 1
+                return self._tool_start(
+                    state.current_tool_index,
+                    content_block["id"],
+                    self._client_tool_name(content_block["name"]),
+                )
+            if block_type == "text" and not state.sent_initial_role:
+                state.sent_initial_role = True
+                return self._role()
+            return None
+
+        if event_type == "content_block_stop":
+            state.current_content_block_type = None
+            return None
+
+        if event_type == "message_delta":
+            state.update_usage(data.get("usage"))
+            stop_reason = (data.get("delta") or {}).get("stop_reason")
+            if stop_reason:
+                return self._finish(_anthropic_stop_to_openai_finish(stop_reason))
+
+        return None
+
+
+# Events whose payload the converter never reads; their JSON is not parsed.
+_SKIP_PARSE_EVENTS = frozenset({"ping", "content_block_stop", "message_stop"})
+_LINE_END = re.compile(rb"\r\n|\r|\n")
+
+
+class SSEParser:
+    """
+    Incremental parser for a ``text/event-stream`` body.
+
+    Feed it raw bytes as they arrive; it returns the completed
+    ``(event, data)`` frames. Lines may end in ``\\n``, ``\\r\\n`` or ``\\r``
+    (also when a ``\\r\\n`` is split across chunks); comments and unknown
+    fields are ignored.
+    """
+
+    def __init__(self):
+        self._buffer = b""
+        # The last chunk ended in \r, which may be the first half of a \r\n
+        self._after_cr = False
+        self._event: Optional[str] = None
+        self._data: list[bytes] = []
+
+    def feed(self, chunk: bytes) -> list[tuple[str, bytes]]:
+        if not chunk:
+            return []
+        if self._after_cr and chunk.startswith(b"\n"):
+            chunk = chunk[1:]
+        data = self._buffer + chunk
+        self._after_cr = data.endswith(b"\r")
+        if b"\r" in data:
+            lines = _LINE_END.split(data)
+        else:
+            lines = data.split(b"\n")
+        self._buffer = lines.pop()
+        frames = []
+        for line in lines:
+            if not line:
+                if self._data:
+                    frames.append((self._event or "message", b"\n".join(self._data)))
+                self._event = None
+                self._data = []
+                continue
+            if line.startswith(b":"):
+                continue
+            field, _, value = line.partition(b":")
+            if value.startswith(b" "):
+                value = value[1:]
+            if field == b"data":
+                self._data.append(value)
+            elif field == b"event":
+                self._event = value.decode()
+        return frames
+
+
+async def iter_sse_events(
+    chunks: AsyncIterator[bytes],
+) -> AsyncIterator[tuple[str, Optional[dict]]]:
+    """
+    Yield ``(event, data)`` pairs from a raw Anthropic SSE byte stream.
+
+    ``data`` is the decoded JSON payload, or None for events the converter
+    ignores (``ping``, ``content_block_stop``, ``message_stop``).
+    """
+    parser = SSEParser()
+    async for chunk in chunks:
+        for event, data in parser.feed(chunk):
+            if event in _SKIP_PARSE_EVENTS:
+                yield event, None
+            else:
+                yield event, json.loads(data)
@@ -0,0 +1,91 @@
+"""Memoized OpenAI -> Anthropic tool schema conversion.
+
+Clients send the same tool definitions on every turn, so the converted and
+prefixed Anthropic tool list is cached by a hash of the incoming ``tools``
+array and shared between requests.
+"""
+
+import copy
+import hashlib
+import json
+from collections import OrderedDict
+from typing import Optional
+
+from .configs import ConfigManager
+from .format import format_openai_tools_to_anthropic_tools
+from .patch import patch_payload_tools
+
+DEFAULT_TOOL_CACHE_SIZE = 256
+
+
+def _tools_hash(openai_tools: list) -> str:
+    payload = json.dumps(openai_tools, separators=(",", ":")).encode("utf-8")
+    return hashlib.blake2b(payload, digest_size=16).hexdigest()
+
+
+class ToolSchemaCache:
+    """
+    Bounded LRU of converted tool lists, keyed by the incoming tools' hash.
+
+    Cached tool lists are tuples shared by every request that hits them and
+    must be treated as read-only; copy an entry before changing it.
+    """
+
+    _entries: "OrderedDict[str, tuple[tuple, dict[str, str]]]" = OrderedDict()
+    hits: int = 0
+    misses: int = 0
+
+    @classmethod
+    def convert(
+        cls, openai_tools: Optional[list]
+    ) -> tuple[Optional[tuple], dict[str, str]]:
+        """
+        Convert OpenAI tools to prefixed Anthropic tools.
+
+        Returns ``(anthropic_tools, tool_names)`` where ``tool_names`` maps each
+        prefixed upstream name back to the client's original tool name.
+        """
+        if not openai_tools:
+            return None, {}
+
+        key = _tools_hash(openai_tools)
+        entry = cls._entries.get(key)
+        if entry is not None:
+            cls._entries.move_to_end(key)
+            cls.hits += 1
+            return entry
+
+        cls.misses += 1
+        # Deep copy so cached schemas never alias a request body
+        converted = format_openai_tools_to_anthropic_tools(copy.deepcopy(openai_tools))
+        original_names = [tool.get("name") for tool in converted]
+        patched = patch_payload_tools(converted)
+        tool_names = {
+            tool["name"]: name for tool, name in zip(patched, original_names) if name
+        }
+        entry = (tuple(patched), tool_names)
+        cls._entries[key] = entry
+
+        max_size = ConfigManager.get_cached_int(
+            "TOOL_CACHE_SIZE", DEFAULT_TOOL_CACHE_SIZE
+        )
+        while len(cls._entries) > max(max_size, 1):
+            cls._entries.popitem(last=False)
+        return entry
+
+    @classmethod
+    def stats(cls) -> dict:
+        """Hit/miss counters and current size."""
+        total = cls.hits + cls.misses
+        return {
+            "hits": cls.hits,
+            "misses": cls.misses,
+            "hit_rate": cls.hits / total if total else 0.0,
+            "size": len(cls._entries),
+        }
+
+    @classmethod
+    def clear(cls) -> None:
+        cls._entries.clear()
+        cls.hits = 0
+        cls.misses = 0
@@ -8,7 +8,10 @@ import type {
   ChangeUsernameRequest,
   ChangeUsernameResponse,
   ConfigUpdateRequest,
-  MessageResponse 
+  MessageResponse,
+  Upstream,
+  UpstreamRequest,
+  UpstreamStats
 } from '@/types'
 
 const api = axios.create({
@@ -67,5 +70,22 @@ export const configApi = {
     api.post<MessageResponse>('/configs/refresh'),
 }
 
+export const upstreamApi = {
+  getAll: () => 
+    api.get<Upstream[]>('/upstreams'),
+  
+  create: (data: UpstreamRequest) => 
+    api.post<Upstream>('/upstreams', data),
+  
+  update: (id: number, data: UpstreamRequest) => 
+    api.put<Upstream>(`/upstreams/${id}`, data),
+  
+  remove: (id: number) => 
+    api.delete<MessageResponse>(`/upstreams/${id}`),
+  
+  getStats: () => 
+    api.get<UpstreamStats[]>('/stats/upstreams'),
+}
+
 export default api
 
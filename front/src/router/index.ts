@@ -18,6 +18,12 @@ const routes: RouteRecordRaw[] = [
     component: () => import('@/views/DashboardView.vue'),
     meta: { requiresAuth: true },
   },
+  {
+    path: '/admin/upstreams',
+    name: 'Upstreams',
+    component: () => import('@/views/UpstreamsView.vue'),
+    meta: { requiresAuth: true },
+  },
   {
     path: '/admin/settings',
     name: 'Settings',
@@ -0,0 +1,77 @@
+import { defineStore } from 'pinia'
+import { ref } from 'vue'
+import type { Upstream, UpstreamRequest, UpstreamStats } from '@/types'
+import { upstreamApi } from '@/api'
+
+export const useUpstreamStore = defineStore('upstreams', () => {
+  const upstreams = ref<Upstream[]>([])
+  const stats = ref<UpstreamStats[]>([])
+  const loading = ref(false)
+  const error = ref<string | null>(null)
+
+  async function fetchUpstreams(): Promise<void> {
+    loading.value = true
+    error.value = null
+    try {
+      const [listResponse, statsResponse] = await Promise.all([
+        upstreamApi.getAll(),
+        upstreamApi.getStats(),
+      ])
+      upstreams.value = listResponse.data
+      stats.value = statsResponse.data
+    } catch (err: any) {
+      error.value = err.response?.data?.detail || '获取上游列表失败'
+    } finally {
+      loading.value = false
+    }
+  }
+
+  async function saveUpstream(id: number | null, data: UpstreamRequest): Promise<boolean> {
+    loading.value = true
+    error.value = null
+    try {
+      if (id === null) {
+        await upstreamApi.create(data)
+      } else {
+        await upstreamApi.update(id, data)
+      }
+      await fetchUpstreams()
+      return true
+    } catch (err: any) {
+      error.value = err.response?.data?.detail || '保存上游失败'
+      return false
+    } finally {
+      loading.value = false
+    }
+  }
+
+  async function removeUpstream(id: number): Promise<boolean> {
+    loading.value = true
+    error.value = null
+    try {
+      await upstreamApi.remove(id)
+      await fetchUpstreams()
+      return true
+    } catch (err: any) {
+      error.value = err.response?.data?.detail || '删除上游失败'
+      return false
+    } finally {
+      loading.value = false
+    }
+  }
+
+  function statsFor(name: string): UpstreamStats | undefined {
+    return stats.value.find(s => s.name === name)
+  }
+
+  return {
+    upstreams,
+    stats,
+    loading,
+    error,
+    fetchUpstreams,
+    saveUpstream,
+    removeUpstream,
+    statsFor,
+  }
+})
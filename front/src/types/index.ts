@@ -45,6 +45,34 @@ export interface ConfigUpdateRequest {
   value: string
 }
 
+export interface Upstream {
+  id: number
+  name: string
+  base_url: string
+  weight: number
+  enabled: boolean
+  updated_at: string
+}
+
+export interface UpstreamRequest {
+  name: string
+  base_url: string
+  weight: number
+  enabled: boolean
+}
+
+export interface UpstreamStats {
+  name: string
+  base_url: string
+  weight: number
+  outstanding: number
+  latency_ewma: number | null
+  requests: number
+  failures: number
+  ejected: boolean
+  ejected_for: number
+}
+
 export interface MessageResponse {
   message: string
 }
@@ -1,12 +1,24 @@
 # gunicorn.conf.py
 
+import gc
 import multiprocessing
 import os
+import shutil
 
 from dotenv import load_dotenv
 
 load_dotenv()
 
+# Shared directory for prometheus_client multiprocess metrics; set before the
+# workers fork so every worker writes to it and /metrics aggregates them all.
+METRICS_DIR = os.environ.setdefault("PROMETHEUS_MULTIPROC_DIR", "/tmp/anth2oai_metrics")
+# A preloaded app creates its metrics before on_starting runs
+os.makedirs(METRICS_DIR, exist_ok=True)
+# Per-API-key rate limit buckets, memory-mapped by every worker
+RATE_LIMIT_STATE_FILE = os.environ.setdefault(
+    "RATE_LIMIT_STATE_FILE", "/tmp/anth2oai_ratelimit"
+)
+
 bind = f"0.0.0.0:{os.getenv('PORT', '8363')}"
 
 workers = int(os.getenv("WORKERS", multiprocessing.cpu_count()))
@@ -15,7 +27,12 @@ worker_class = "uvicorn.workers.UvicornWorker"
 graceful_timeout = 30
 timeout = 120
 
-preload_app = False
+# Load the app once in the master and fork the workers from it, so imports,
+# templates and the database setup are shared copy-on-write instead of being
+# repeated (and held in memory) by every worker. Note that a HUP then only
+# restarts the workers with the already loaded code: deploying new code
+# needs a full restart.
+preload_app = os.getenv("GUNICORN_PRELOAD", "false").lower() in ("1", "true", "yes")
 
 accesslog = "-"
 errorlog = "-"
@@ -27,6 +44,21 @@ daemon = False
 
 def on_starting(server):
     print("🚀 Gunicorn master starting...")
+    # Drop metric files left over from a previous run
+    shutil.rmtree(METRICS_DIR, ignore_errors=True)
+    os.makedirs(METRICS_DIR, exist_ok=True)
+    # Start every key with full buckets
+    if os.path.exists(RATE_LIMIT_STATE_FILE):
+        os.remove(RATE_LIMIT_STATE_FILE)
+
+    if server.cfg.preload_app:
+        from anth2oai.server.app import preload
+
+        preload()
+        # Keep the workers' garbage collector from touching (and so copying)
+        # every page holding a preloaded object
+        gc.collect()
+        gc.freeze()
 
 
 def on_reload(server):
@@ -41,5 +73,12 @@ def worker_exit(server, worker):
     print(f"  Worker {worker.pid} exited")
 
 
+def child_exit(server, worker):
+    # Runs in the master: drop the dead worker's live gauges
+    from prometheus_client import multiprocess
+
+    multiprocess.mark_process_dead(worker.pid)
+
+
 def post_fork(server, worker):
     print(f"  Worker {worker.pid} spawned")
@@ -0,0 +1,12 @@
+"""Environment the server modules need at import time."""
+
+from __future__ import annotations
+
+import os
+import tempfile
+
+# anth2oai.server.app serves the admin SPA from STATIC_DIR outside the repo's
+# dev layout; the tests only need the directory to exist
+_STATIC_DIR = tempfile.mkdtemp(prefix="anth2oai-static-")
+os.makedirs(os.path.join(_STATIC_DIR, "assets"), exist_ok=True)
+os.environ.setdefault("STATIC_DIR", _STATIC_DIR)
@@ -0,0 +1,112 @@
+"""Errors of non-streaming chat completions keep the upstream's status."""
+
+from __future__ import annotations
+
+import anthropic
+import httpx
+import openai
+import pytest
+from fastapi import HTTPException
+from fastapi.testclient import TestClient
+
+from anth2oai.authen import validate_api_key
+from anth2oai.server import app as app_module
+
+API_KEY = "sk-test-errors"
+
+
+@pytest.fixture
+def client(monkeypatch):
+    app_module.app.dependency_overrides[validate_api_key] = lambda: API_KEY
+    yield TestClient(app_module.app, raise_server_exceptions=False)
+    app_module.app.dependency_overrides.clear()
+
+
+def _raising(error: BaseException):
+    async def dispatch_request(api_key, body):
+        raise error
+
+    return dispatch_request
+
+
+def _response(status: int, headers: dict | None = None) -> httpx.Response:
+    return httpx.Response(
+        status, headers=headers, request=httpx.Request("POST", "http://upstream")
+    )
+
+
+def _post(client, model="claude-sonnet-4-5"):
+    return client.post(
+        "/v1/chat/completions",
+        json={"model": model, "messages": [{"role": "user", "content": "hi"}]},
+    )
+
+
+@pytest.mark.parametrize("status", [400, 401, 429, 529])
+def test_anthropic_status_error(client, monkeypatch, status):
+    error = anthropic.APIStatusError(
+        "upstream said no",
+        response=_response(status, {"retry-after": "3"}),
+        body={
+            "type": "error",
+            "error": {"type": "overloaded_error", "message": "Overloaded"},
+        },
+    )
+    monkeypatch.setattr(app_module, "dispatch_request", _raising(error))
+
+    response = _post(client)
+
+    assert response.status_code == status
+    assert response.headers["retry-after"] == "3"
+    assert response.json() == {
+        "error": {
+            "message": "Overloaded",
+            "type": "overloaded_error",
+            "param": None,
+            "code": None,
+        }
+    }
+
+
+def test_openai_status_error(client, monkeypatch):
+    error = openai.APIStatusError(
+        "Error code: 400",
+        response=_response(400),
+        body={
+            "error": {
+                "message": "Unsupported parameter",
+                "type": "invalid_request_error",
+                "param": "temperature",
+                "code": "unsupported_parameter",
+            }
+        },
+    )
+    monkeypatch.setattr(app_module, "dispatch_request", _raising(error))
+
+    response = _post(client, model="gpt-5-codex")
+
+    assert response.status_code == 400
+    assert response.json()["error"] == error.body["error"]
+
+
+def test_http_exception_is_kept(client, monkeypatch):
+    error = HTTPException(status_code=500, detail="OPENAI_BASE_URL is not set")
+    monkeypatch.setattr(app_module, "dispatch_request", _raising(error))
+    assert _post(client).json() == {"detail": "OPENAI_BASE_URL is not set"}
+
+    error = HTTPException(status_code=400, detail="bad model")
+    monkeypatch.setattr(app_module, "dispatch_request", _raising(error))
+    assert _post(client).status_code == 400
+
+
+def test_unsupported_model(client):
+    response = _post(client, model="llama-3")
+    assert response.status_code == 400
+    assert "not supported" in response.json()["detail"]
+
+
+def test_other_errors_are_500(client, monkeypatch):
+    monkeypatch.setattr(app_module, "dispatch_request", _raising(ValueError("boom")))
+    response = _post(client)
+    assert response.status_code == 500
+    assert response.json() == {"detail": "boom"}
@@ -0,0 +1,210 @@
+"""The exact-match response cache: policy, memory LRU, disk tier, recording."""
+
+from __future__ import annotations
+
+import asyncio
+import json
+import os
+import time
+from collections import OrderedDict
+
+import pytest
+from starlette.datastructures import Headers
+
+from anth2oai.configs import ConfigManager
+from anth2oai.server.cache import (
+    POLICY_LOOKUP,
+    POLICY_OFF,
+    POLICY_REFRESH,
+    ResponseCache,
+    request_key,
+)
+from anth2oai.server.streaming import DisconnectAwareStreamingResponse
+from anth2oai.sse import SSE_DONE
+
+MB = 1 << 20
+
+
+@pytest.fixture(autouse=True)
+def _cache(monkeypatch):
+    monkeypatch.setitem(ConfigManager()._cache, "RESPONSE_CACHE", "true")
+    monkeypatch.setitem(ConfigManager()._cache, "RESPONSE_CACHE_DIR", "")
+    monkeypatch.setattr(ResponseCache, "_entries", OrderedDict())
+    monkeypatch.setattr(ResponseCache, "_memory_bytes", 0)
+    monkeypatch.setattr(ResponseCache, "_disk_writes", 0)
+    monkeypatch.setattr(ResponseCache, "_tasks", set())
+
+
+@pytest.mark.parametrize(
+    "body, cache_control, policy",
+    [
+        ({"temperature": 0}, "", POLICY_LOOKUP),
+        ({"temperature": 0.0}, "", POLICY_LOOKUP),
+        ({}, "", POLICY_OFF),
+        ({"temperature": 0.7}, "", POLICY_OFF),
+        ({"temperature": 0}, "no-cache", POLICY_REFRESH),
+        ({"temperature": 0}, "No-Store", POLICY_OFF),
+        ({"temperature": 0}, "no-cache, no-store", POLICY_OFF),
+    ],
+)
+def test_policy(body, cache_control, policy):
+    headers = Headers({"cache-control": cache_control} if cache_control else {})
+    assert ResponseCache.policy(body, headers) == policy
+
+
+def test_policy_off_unless_enabled(monkeypatch):
+    monkeypatch.setitem(ConfigManager()._cache, "RESPONSE_CACHE", "false")
+    assert ResponseCache.policy({"temperature": 0}, Headers({})) == POLICY_OFF
+
+
+def test_request_key():
+    body = {"model": "m", "temperature": 0, "messages": [{"content": "hi"}]}
+    key = request_key("sk-a", body)
+    # Key order does not matter, everything else does
+    assert request_key("sk-a", dict(reversed(body.items()))) == key
+    assert request_key("sk-b", body) != key
+    assert request_key("sk-a", {**body, "stream": True}) != key
+
+
+def _get(key: str):
+    return asyncio.run(ResponseCache.get(key))
+
+
+def _put(key: str, size: int) -> None:
+    ResponseCache.put(key, True, "x" * size)
+
+
+def test_lru_and_byte_bound(monkeypatch):
+    monkeypatch.setitem(ConfigManager()._cache, "RESPONSE_CACHE_MEMORY_MB", "1")
+    _put("a", 400_000)
+    _put("b", 400_000)
+    # A hit makes "a" the most recently used
+    assert _get("a").data == "x" * 400_000
+    _put("c", 400_000)
+
+    assert list(ResponseCache._entries) == ["a", "c"]
+    assert ResponseCache._memory_bytes == 800_000
+    assert _get("b") is None
+
+    # Replacing an entry does not count it twice; too big is not stored
+    _put("a", 100)
+    _put("huge", MB + 1)
+    assert list(ResponseCache._entries) == ["c", "a"]
+    assert ResponseCache._memory_bytes == 400_100
+
+
+def test_memory_ttl(monkeypatch):
+    monkeypatch.setitem(ConfigManager()._cache, "RESPONSE_CACHE_TTL", "60")
+    ResponseCache.put("k", False, {"id": "chatcmpl-1"})
+    assert _get("k").data == {"id": "chatcmpl-1"}
+
+    now = time.time()
+    monkeypatch.setattr(time, "time", lambda: now + 61)
+    assert _get("k") is None
+    assert ResponseCache._memory_bytes == 0
+
+
+async def _put_to_disk(key: str, stream: bool, data) -> None:
+    ResponseCache.put(key, stream, data)
+    await asyncio.gather(*ResponseCache._tasks)
+
+
+def test_disk_tier(monkeypatch, tmp_path):
+    monkeypatch.setitem(ConfigManager()._cache, "RESPONSE_CACHE_DIR", str(tmp_path))
+    completion = {"id": "chatcmpl-1", "choices": []}
+    asyncio.run(_put_to_disk("k", False, completion))
+    assert [path.name for path in tmp_path.iterdir()] == ["k.json"]
+
+    # Another worker (or a restart) only has the disk tier
+    ResponseCache._entries.clear()
+    ResponseCache._memory_bytes = 0
+    entry = _get("k")
+    assert (entry.stream, entry.data) == (False, completion)
+    assert list(ResponseCache._entries) == ["k"]
+
+
+def test_disk_expired_and_corrupt(monkeypatch, tmp_path):
+    monkeypatch.setitem(ConfigManager()._cache, "RESPONSE_CACHE_DIR", str(tmp_path))
+    monkeypatch.setitem(ConfigManager()._cache, "RESPONSE_CACHE_TTL", "60")
+    stored = {"stream": True, "data": "data: 1\n\n", "created": time.time() - 61}
+    (tmp_path / "old.json").write_text(json.dumps(stored))
+    (tmp_path / "bad.json").write_text("{not json")
+
+    assert _get("old") is None
+    assert _get("bad") is None
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_disk_prune(monkeypatch, tmp_path):
+    monkeypatch.setitem(ConfigManager()._cache, "RESPONSE_CACHE_DISK_MB", "1")
+    monkeypatch.setitem(ConfigManager()._cache, "RESPONSE_CACHE_TTL", "3600")
+    now = time.time()
+    for age, name in [(7200, "expired"), (300, "oldest"), (200, "older"), (100, "new")]:
+        path = tmp_path / f"{name}.json"
+        path.write_bytes(b"x" * 400_000)
+        os.utime(path, (now - age, now - age))
+
+    ResponseCache._prune_disk(tmp_path)
+
+    assert sorted(path.name for path in tmp_path.iterdir()) == [
+        "new.json",
+        "older.json",
+    ]
+
+
+class Upstream:
+    def __init__(self, frames: list[str]):
+        self.frames = frames
+        self.closed = False
+
+    async def stream(self):
+        try:
+            for frame in self.frames:
+                yield frame
+        finally:
+            self.closed = True
+
+
+async def _relay(upstream: Upstream, leave_after: int | None = None) -> list[str]:
+    response = DisconnectAwareStreamingResponse(upstream.stream())
+    ResponseCache.record_stream("k", response)
+    sent = []
+    async for frame in response.body_iterator:
+        sent.append(frame)
+        if leave_after is not None and len(sent) >= leave_after:
+            break
+    await response.body_iterator.aclose()
+    return sent
+
+
+FRAMES = ["data: 1\n\n", "data: 2\n\n", SSE_DONE]
+
+
+def test_records_completed_stream():
+    upstream = Upstream(FRAMES)
+    assert asyncio.run(_relay(upstream)) == FRAMES
+    entry = _get("k")
+    assert (entry.stream, entry.data) == (True, "".join(FRAMES))
+
+
+@pytest.mark.parametrize(
+    "frames",
+    [
+        # Failed mid-stream: the error frame is followed by [DONE]
+        ["data: 1\n\n", 'data: {"error": {"type": "stream_error"}}\n\n', SSE_DONE],
+        # Cut off before [DONE]
+        ["data: 1\n\n", "data: 2\n\n"],
+        [],
+    ],
+)
+def test_skips_failed_streams(frames):
+    asyncio.run(_relay(Upstream(frames)))
+    assert _get("k") is None
+
+
+def test_skips_abandoned_stream():
+    upstream = Upstream(FRAMES)
+    # The client leaves right after [DONE], before the stream ended
+    assert asyncio.run(_relay(upstream, leave_after=3)) == FRAMES
+    assert upstream.closed
+    assert _get("k") is None
@@ -0,0 +1,186 @@
+"""Single-flight coalescing and Last-Event-ID resume of streams."""
+
+from __future__ import annotations
+
+import asyncio
+
+import pytest
+from starlette.datastructures import Headers
+
+from anth2oai.configs import ConfigManager
+from anth2oai.server import coalesce
+from anth2oai.server.coalesce import StreamCoalescer
+from anth2oai.server.streaming import DisconnectAwareStreamingResponse
+
+API_KEY = "sk-test-coalesce"
+
+
+@pytest.fixture(autouse=True)
+def _coalescer(monkeypatch):
+    monkeypatch.setitem(ConfigManager()._cache, "STREAM_COALESCE", "true")
+    monkeypatch.setattr(StreamCoalescer, "_flights", {})
+    monkeypatch.setattr(StreamCoalescer, "_resumable", {})
+
+
+class Upstream:
+    """Counts the streams opened; each sends ``frames`` frames."""
+
+    def __init__(self, frames: int = 5, delay: float = 0.01):
+        self.frames = frames
+        self.delay = delay
+        self.started = 0
+
+    async def start(self) -> DisconnectAwareStreamingResponse:
+        self.started += 1
+
+        async def body():
+            for n in range(self.frames):
+                await asyncio.sleep(self.delay)
+                yield f"data: {n}\n\n"
+
+        return DisconnectAwareStreamingResponse(body())
+
+
+async def _read(response, leave_after: int | None = None) -> list[str]:
+    """Run the ASGI response; the client leaves after that many frames."""
+    frames: list[str] = []
+    gone = asyncio.Event()
+
+    async def receive():
+        await gone.wait()
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        if message["type"] == "http.response.body" and message.get("body"):
+            frames.append(message["body"].decode())
+            if leave_after is not None and len(frames) >= leave_after:
+                gone.set()
+                await asyncio.sleep(1)
+
+    await response({"type": "http"}, receive, send)
+    return frames
+
+
+@pytest.mark.parametrize(
+    ("body", "headers", "config", "expected"),
+    [
+        ({"temperature": 0}, {}, "true", True),
+        ({"temperature": 0.0}, {}, "true", True),
+        # Unset is the upstream default of 1.0: sampled
+        ({}, {}, "true", False),
+        ({"temperature": 0.7}, {}, "true", False),
+        ({"temperature": 0}, {"cache-control": "no-cache"}, "true", False),
+        ({"temperature": 0}, {}, "", False),
+    ],
+)
+def test_enabled(monkeypatch, body, headers, config, expected):
+    monkeypatch.setitem(ConfigManager()._cache, "STREAM_COALESCE", config)
+    assert StreamCoalescer.enabled(body, Headers(headers)) is expected
+
+
+def test_identical_requests_share_one_stream():
+    upstream = Upstream()
+
+    async def run():
+        first = await StreamCoalescer.stream("k", API_KEY, upstream.start)
+        reader = asyncio.create_task(_read(first))
+        await asyncio.sleep(0.025)
+        # Joins midway: replays the frames sent so far, then the rest
+        second = await StreamCoalescer.stream("k", API_KEY, upstream.start)
+        return await reader, await _read(second)
+
+    first, second = asyncio.run(run())
+    assert upstream.started == 1
+    assert first == second == [f"data: {n}\n\n" for n in range(5)]
+
+
+def test_no_join_after_window(monkeypatch):
+    monkeypatch.setitem(ConfigManager()._cache, "STREAM_COALESCE_WINDOW", "0.02")
+    upstream = Upstream(frames=10)
+
+    async def run():
+        first = await StreamCoalescer.stream("k", API_KEY, upstream.start)
+        reader = asyncio.create_task(_read(first))
+        await asyncio.sleep(0.05)
+        second = await StreamCoalescer.stream("k", API_KEY, upstream.start)
+        frames = await _read(second)
+        await reader
+        return frames
+
+    frames = asyncio.run(run())
+    assert upstream.started == 2
+    assert len(frames) == 10
+
+
+def test_failed_start_raises_for_every_waiter():
+    async def start():
+        await asyncio.sleep(0.01)
+        raise RuntimeError("upstream down")
+
+    async def run():
+        return await asyncio.gather(
+            StreamCoalescer.stream("k", API_KEY, start),
+            StreamCoalescer.stream("k", API_KEY, start),
+            return_exceptions=True,
+        )
+
+    results = asyncio.run(run())
+    assert [str(r) for r in results] == ["upstream down", "upstream down"]
+
+
+def test_resume_after_last_event_id(monkeypatch):
+    monkeypatch.setitem(ConfigManager()._cache, "STREAM_RESUME", "true")
+    upstream = Upstream(frames=6)
+
+    async def run():
+        response = await StreamCoalescer.stream(None, API_KEY, upstream.start)
+        head = await _read(response, leave_after=2)
+        last_id = head[-1].split("\n", 1)[0].removeprefix("id: ")
+        # The stream keeps running upstream while the client is away
+        tail = await _read(StreamCoalescer.resume(API_KEY, last_id))
+        return head, tail
+
+    head, tail = asyncio.run(run())
+    assert upstream.started == 1
+    flight_id = head[0].split("\n", 1)[0].removeprefix("id: ").rsplit("-", 1)[0]
+    assert head == [f"id: {flight_id}-{n}\ndata: {n}\n\n" for n in range(2)]
+    assert tail == [f"id: {flight_id}-{n}\ndata: {n}\n\n" for n in range(2, 6)]
+
+
+def test_resume_rejects_other_key_and_unknown_stream(monkeypatch):
+    monkeypatch.setitem(ConfigManager()._cache, "STREAM_RESUME", "true")
+    upstream = Upstream(frames=2)
+
+    async def run():
+        response = await StreamCoalescer.stream(None, API_KEY, upstream.start)
+        frames = await _read(response)
+        last_id = frames[-1].split("\n", 1)[0].removeprefix("id: ")
+        statuses = []
+        for api_key, event_id in (("sk-other", last_id), (API_KEY, "nope-1")):
+            try:
+                StreamCoalescer.resume(api_key, event_id)
+            except coalesce.HTTPException as e:
+                statuses.append(e.status_code)
+        return statuses
+
+    assert asyncio.run(run()) == [410, 410]
+
+
+def test_subscriber_behind_the_buffer_gets_an_error(monkeypatch):
+    monkeypatch.setitem(ConfigManager()._cache, "STREAM_BUFFER_FRAMES", "2")
+    upstream = Upstream(frames=6, delay=0)
+
+    async def run():
+        response = await StreamCoalescer.stream("k", API_KEY, upstream.start)
+        body = response.body_iterator
+        first = await body.__anext__()
+        # The upstream runs ahead while this client is stalled
+        for _ in range(20):
+            await asyncio.sleep(0)
+        rest = [frame async for frame in body]
+        return [first, *rest]
+
+    frames = asyncio.run(run())
+    assert frames[0] == "data: 0\n\n"
+    assert frames[1].startswith('data: {"error": {"type": "stream_error", "code": 410')
+    assert frames[2:] == ["data: [DONE]\n\n"]
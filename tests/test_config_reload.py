@@ -0,0 +1,111 @@
+"""Workers pick up config changes committed by other processes."""
+
+from __future__ import annotations
+
+import asyncio
+import sqlite3
+
+import pytest
+from tortoise import Tortoise
+
+from anth2oai.configs import ConfigManager
+from anth2oai.models import Config
+
+
+@pytest.fixture
+def manager(monkeypatch):
+    manager = ConfigManager()
+    monkeypatch.setattr(manager, "_cache", {})
+    monkeypatch.setattr(ConfigManager, "_data_version", None)
+    monkeypatch.setattr(ConfigManager, "_fingerprint", None)
+    monkeypatch.setattr(ConfigManager, "_reload_callbacks", [])
+    return manager
+
+
+def _other_process(db_path, statement: str) -> None:
+    """Commit a change from a connection of its own, like another worker."""
+    connection = sqlite3.connect(db_path)
+    with connection:
+        connection.execute(statement)
+    connection.close()
+
+
+def _run(db_path, scenario) -> None:
+    async def run():
+        await Tortoise.init(
+            db_url=f"sqlite://{db_path}", modules={"models": ["anth2oai.models"]}
+        )
+        try:
+            await Tortoise.generate_schemas()
+            await Config.create(key="LOG_LEVEL", value="INFO")
+            await ConfigManager.refresh()
+            await scenario()
+        finally:
+            await Tortoise.close_connections()
+
+    asyncio.run(run())
+
+
+def test_change_from_another_connection_reloads(manager, tmp_path):
+    db_path = tmp_path / "admin.db"
+    reloads = []
+
+    async def on_reload():
+        reloads.append(ConfigManager.get_cached("LOG_LEVEL"))
+
+    async def scenario():
+        ConfigManager.on_reload(on_reload)
+        # The first check only takes the baseline
+        assert await ConfigManager.check_for_changes() is False
+
+        _other_process(
+            db_path,
+            "UPDATE configs SET value = 'DEBUG', updated_at = '2030-01-01 00:00:00'"
+            " WHERE key = 'LOG_LEVEL'",
+        )
+        assert await ConfigManager.check_for_changes() is True
+        assert ConfigManager.get_cached("LOG_LEVEL") == "DEBUG"
+        assert reloads == ["DEBUG"]
+
+        # Nothing new since
+        assert await ConfigManager.check_for_changes() is False
+        assert reloads == ["DEBUG"]
+
+    _run(db_path, scenario)
+
+
+def test_unchanged_database_skips_the_reload(manager, tmp_path, monkeypatch):
+    db_path = tmp_path / "admin.db"
+    fingerprints = []
+    table_fingerprint = ConfigManager._table_fingerprint.__func__
+
+    async def counting(cls, connection):
+        fingerprints.append(True)
+        return await table_fingerprint(cls, connection)
+
+    monkeypatch.setattr(ConfigManager, "_table_fingerprint", classmethod(counting))
+
+    async def scenario():
+        assert await ConfigManager.check_for_changes() is False
+        assert len(fingerprints) == 1
+
+        # Same data_version: one PRAGMA query, no table scans
+        for _ in range(3):
+            assert await ConfigManager.check_for_changes() is False
+        assert len(fingerprints) == 1
+
+        # A commit to an unwatched table moves data_version only
+        _other_process(
+            db_path,
+            "INSERT INTO users (username, password_hash, created_at, updated_at)"
+            " VALUES ('bob', 'x', '2030-01-01', '2030-01-01')",
+        )
+        assert await ConfigManager.check_for_changes() is False
+        assert len(fingerprints) == 2
+
+        # Our own writes do not move it either
+        await ConfigManager.set("LOG_LEVEL", "WARNING")
+        assert await ConfigManager.check_for_changes() is False
+        assert len(fingerprints) == 2
+
+    _run(db_path, scenario)
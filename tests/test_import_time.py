@@ -0,0 +1,60 @@
+from __future__ import annotations
+
+import json
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+# Seconds `import anth2oai.server.app` may take in a fresh interpreter.
+# Override with ANTH2OAI_IMPORT_BUDGET on slow CI machines.
+IMPORT_BUDGET = float(os.environ.get("ANTH2OAI_IMPORT_BUDGET", "2.0"))
+
+REPO_ROOT = Path(__file__).resolve().parents[1]
+
+# Loaded on first use, never at import time
+LAZY_MODULES = ("anthropic", "openai", "litellm", "anth2oai.server.codex")
+
+_PROBE = f"""
+import json, sys, time
+start = time.perf_counter()
+import anth2oai.server.app
+elapsed = time.perf_counter() - start
+print(json.dumps({{
+    "elapsed": elapsed,
+    "loaded": [m for m in {LAZY_MODULES!r} if m in sys.modules],
+}}))
+"""
+
+
+def _import_app(tmp_path) -> dict:
+    (tmp_path / "dist" / "assets").mkdir(parents=True)
+    env = {
+        **os.environ,
+        "STATIC_DIR": str(tmp_path / "dist"),
+        "DATABASE_PATH": str(tmp_path / "admin.db"),
+        "PYTHONPATH": os.pathsep.join(
+            filter(None, [str(REPO_ROOT), os.environ.get("PYTHONPATH")])
+        ),
+    }
+    result = subprocess.run(
+        [sys.executable, "-c", _PROBE],
+        env=env,
+        cwd=tmp_path,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def test_app_import_skips_sdks(tmp_path):
+    assert _import_app(tmp_path)["loaded"] == []
+
+
+def test_app_import_time_budget(tmp_path):
+    # Best of three, so one slow run on a busy machine does not fail the test
+    elapsed = min(_import_app(tmp_path / str(run))["elapsed"] for run in range(3))
+    assert elapsed < IMPORT_BUDGET, (
+        f"import anth2oai.server.app took {elapsed:.2f}s (budget {IMPORT_BUDGET}s)"
+    )
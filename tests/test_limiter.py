@@ -0,0 +1,173 @@
+"""Adaptive (AIMD) upstream concurrency limits."""
+
+from __future__ import annotations
+
+import asyncio
+
+import pytest
+
+from anth2oai.configs import ConfigManager
+from anth2oai.server import limiter as limiter_module
+from anth2oai.server.limiter import (
+    BACKOFF_FACTOR,
+    AIMDLimiter,
+    ConcurrencyLimiters,
+    LimiterRejected,
+    overload_status,
+)
+
+
+class StatusError(Exception):
+    def __init__(self, status_code: int):
+        self.status_code = status_code
+
+
+@pytest.fixture(autouse=True)
+def _limiters(monkeypatch):
+    monkeypatch.setattr(
+        ConcurrencyLimiters, "_limiters", type(ConcurrencyLimiters._limiters)()
+    )
+
+
+def test_overload_status():
+    assert overload_status(StatusError(429)) == 429
+    assert overload_status(StatusError(529)) == 529
+    assert overload_status(StatusError(500)) is None
+    error = Exception()
+    error.body = {"type": "error", "error": {"type": "overloaded_error"}}
+    assert overload_status(error) == 529
+
+
+def test_multiplicative_decrease_once_per_cooldown(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(limiter_module.time, "monotonic", lambda: now[0])
+
+    async def run():
+        limiter = AIMDLimiter("a", 10)
+        permits = [await limiter.acquire(8, 1) for _ in range(3)]
+        permits[0].release(error=StatusError(429))
+        assert limiter.limit == pytest.approx(10 * BACKOFF_FACTOR)
+        # The same burst of rejections counts once
+        permits[1].release(error=StatusError(529))
+        assert limiter.limit == pytest.approx(10 * BACKOFF_FACTOR)
+        now[0] += limiter_module.DECREASE_COOLDOWN
+        permits[2].release(error=StatusError(429))
+        assert limiter.limit == pytest.approx(10 * BACKOFF_FACTOR**2)
+        assert limiter.in_flight == 0
+
+    asyncio.run(run())
+
+
+def test_decrease_stops_at_min(monkeypatch):
+    monkeypatch.setitem(ConfigManager()._cache, "UPSTREAM_CONCURRENCY_MIN", "2")
+    now = [0.0]
+    monkeypatch.setattr(limiter_module.time, "monotonic", lambda: now[0])
+
+    async def run():
+        limiter = AIMDLimiter("a", 4)
+        for _ in range(10):
+            now[0] += 10
+            (await limiter.acquire(8, 1)).release(error=StatusError(429))
+        assert limiter.limit == 2
+
+    asyncio.run(run())
+
+
+def test_additive_increase(monkeypatch):
+    monkeypatch.setitem(ConfigManager()._cache, "UPSTREAM_CONCURRENCY_MAX", "6")
+
+    async def run():
+        limiter = AIMDLimiter("a", 4)
+        # About one more slot per limit's worth of successes
+        for _ in range(4):
+            (await limiter.acquire(8, 1)).release(success=True)
+        assert 4.9 < limiter.limit < 5
+        for _ in range(5):
+            (await limiter.acquire(8, 1)).release(success=True)
+        assert 5.8 < limiter.limit < 6
+        for _ in range(20):
+            (await limiter.acquire(8, 1)).release(success=True)
+        assert limiter.limit == 6
+        # A disconnect (neither success nor error) leaves the limit alone
+        (await limiter.acquire(8, 1)).release()
+        assert limiter.limit == 6
+
+    asyncio.run(run())
+
+
+def test_queue_fifo_hand_over():
+    async def run():
+        limiter = AIMDLimiter("a", 1)
+        held = await limiter.acquire(8, 1)
+        order = []
+
+        async def wait(name):
+            permit = await limiter.acquire(8, 1)
+            order.append(name)
+            permit.release(success=True)
+
+        waiters = [asyncio.create_task(wait(n)) for n in range(3)]
+        await asyncio.sleep(0)
+        assert limiter.stats()["queued"] == 3
+        held.release(success=True)
+        await asyncio.gather(*waiters)
+        assert order == [0, 1, 2]
+        assert limiter.idle
+
+    asyncio.run(run())
+
+
+def test_queue_full_and_deadline():
+    async def run():
+        limiter = AIMDLimiter("a", 1)
+        held = await limiter.acquire(1, 1)
+        queued = asyncio.create_task(limiter.acquire(1, 0.05))
+        await asyncio.sleep(0)
+        with pytest.raises(LimiterRejected) as full:
+            await limiter.acquire(1, 1)
+        assert full.value.reason == "queue_full"
+
+        with pytest.raises(LimiterRejected) as late:
+            await queued
+        assert late.value.reason == "deadline"
+        # The expired waiter left the queue and holds no slot
+        assert limiter.stats()["queued"] == 0
+        assert limiter.in_flight == 1
+        held.release()
+        assert limiter.idle
+
+    asyncio.run(run())
+
+
+def test_slot_handed_over_at_deadline_is_passed_on():
+    async def run():
+        limiter = AIMDLimiter("a", 1)
+        held = await limiter.acquire(8, 1)
+        first = asyncio.create_task(limiter.acquire(8, 1))
+        second = asyncio.create_task(limiter.acquire(8, 1))
+        await asyncio.sleep(0)
+        # The slot goes to the first waiter just as it is cancelled
+        held.release()
+        first.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await first
+        (await second).release()
+        assert limiter.idle
+
+    asyncio.run(run())
+
+
+def test_registry_without_queue(monkeypatch):
+    monkeypatch.setitem(ConfigManager()._cache, "UPSTREAM_CONCURRENCY_INITIAL", "1")
+
+    async def run():
+        held = await ConcurrencyLimiters.acquire("a", "sk-1")
+        # Hedges and other optional requests never wait
+        with pytest.raises(LimiterRejected):
+            await ConcurrencyLimiters.acquire("a", "sk-1", queue=False)
+        # Other keys and upstreams have limits of their own
+        (await ConcurrencyLimiters.acquire("a", "sk-2")).release()
+        (await ConcurrencyLimiters.acquire("b", "sk-1")).release()
+        held.release()
+
+    asyncio.run(run())
@@ -0,0 +1,32 @@
+"""Admin login attempts are limited per username and client address."""
+
+from __future__ import annotations
+
+import pytest
+
+from anth2oai.configs import ConfigManager
+from anth2oai.jwt_auth import LoginRateLimiter
+
+
+@pytest.fixture(autouse=True)
+def _limits(monkeypatch):
+    monkeypatch.setitem(ConfigManager()._cache, "LOGIN_MAX_ATTEMPTS", "3")
+    monkeypatch.setitem(ConfigManager()._cache, "LOGIN_WINDOW_SECONDS", "60")
+    monkeypatch.setattr(LoginRateLimiter, "_attempts", {})
+
+
+def test_limit_per_username_and_client():
+    for _ in range(3):
+        assert LoginRateLimiter.hit("admin", "10.0.0.1") is None
+    retry_after = LoginRateLimiter.hit("admin", "10.0.0.1")
+    assert retry_after is not None and 1 <= retry_after <= 61
+
+    # Another user behind the same address, or the same user elsewhere
+    assert LoginRateLimiter.hit("alice", "10.0.0.1") is None
+    assert LoginRateLimiter.hit("admin", "10.0.0.2") is None
+
+
+def test_disabled(monkeypatch):
+    monkeypatch.setitem(ConfigManager()._cache, "LOGIN_MAX_ATTEMPTS", "0")
+    for _ in range(10):
+        assert LoginRateLimiter.hit("admin", "10.0.0.1") is None
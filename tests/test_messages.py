@@ -0,0 +1,192 @@
+"""The Anthropic Messages passthrough relays upstream bytes and records failures."""
+
+from __future__ import annotations
+
+import json
+from collections import OrderedDict
+
+import httpx
+import pytest
+from fastapi.testclient import TestClient
+
+from anth2oai.authen import validate_anthropic_api_key
+from anth2oai.configs import ConfigManager
+from anth2oai.pool import HTTPClientPool
+from anth2oai.server import app as app_module
+from anth2oai.server.limiter import ConcurrencyLimiters
+from anth2oai.server.upstreams import UpstreamPool, UpstreamState
+from anth2oai.server.usage import STATUS_ERROR, STATUS_OK, UsageLedger
+
+API_KEY = "sk-test-messages"
+REQUEST = {
+    "model": "claude-sonnet-4-5",
+    "max_tokens": 100,
+    "messages": [{"role": "user", "content": "hi"}],
+}
+
+
+def _event(event_type: str, data: dict) -> bytes:
+    return f"event: {event_type}\ndata: {json.dumps(data)}\n\n".encode()
+
+
+MESSAGE_START = _event(
+    "message_start",
+    {
+        "type": "message_start",
+        "message": {"id": "msg_1", "usage": {"input_tokens": 12, "output_tokens": 1}},
+    },
+)
+TEXT_DELTA = _event(
+    "content_block_delta",
+    {
+        "type": "content_block_delta",
+        "index": 0,
+        "delta": {"type": "text_delta", "text": "Hello"},
+    },
+)
+MESSAGE_DELTA = _event(
+    "message_delta",
+    {
+        "type": "message_delta",
+        "delta": {"stop_reason": "end_turn"},
+        "usage": {"output_tokens": 5},
+    },
+)
+MESSAGE_STOP = _event("message_stop", {"type": "message_stop"})
+OVERLOADED = _event(
+    "error",
+    {"type": "error", "error": {"type": "overloaded_error", "message": "Overloaded"}},
+)
+
+
+@pytest.fixture
+def upstream(monkeypatch):
+    state = UpstreamState("primary", "http://upstream")
+    monkeypatch.setattr(UpstreamPool, "_upstreams", [state])
+    monkeypatch.setattr(ConcurrencyLimiters, "_limiters", OrderedDict())
+    monkeypatch.setattr(UsageLedger, "_pending", [])
+    monkeypatch.setitem(ConfigManager()._cache, "UPSTREAM_CONCURRENCY_INITIAL", "10")
+    return state
+
+
+def _serve(monkeypatch, status: int, content: bytes, content_type: str):
+    def handler(request: httpx.Request) -> httpx.Response:
+        assert request.url == "http://upstream/v1/messages"
+        assert request.headers["x-api-key"] == API_KEY
+        assert json.loads(request.content)["messages"] == REQUEST["messages"]
+        return httpx.Response(
+            status,
+            content=content,
+            headers={"content-type": content_type, "request-id": "req_1"},
+        )
+
+    client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    monkeypatch.setattr(HTTPClientPool, "get", lambda base_url: client)
+
+
+def _body(stream: bool = False) -> str:
+    return json.dumps({**REQUEST, "stream": stream})
+
+
+@pytest.fixture
+def client():
+    app_module.app.dependency_overrides[validate_anthropic_api_key] = lambda: API_KEY
+    yield TestClient(app_module.app, raise_server_exceptions=False)
+    app_module.app.dependency_overrides.clear()
+
+
+def _post(client, stream: bool = False):
+    return client.post(
+        "/v1/messages",
+        content=_body(stream),
+        headers={"content-type": "application/json"},
+    )
+
+
+def _limit() -> float:
+    (limiter,) = ConcurrencyLimiters._limiters.values()
+    assert limiter.in_flight == 0
+    return limiter.limit
+
+
+def test_json_relayed(client, monkeypatch, upstream):
+    message = {
+        "id": "msg_1",
+        "type": "message",
+        "content": [{"type": "text", "text": "Hello"}],
+        "usage": {"input_tokens": 12, "output_tokens": 5},
+    }
+    _serve(monkeypatch, 200, json.dumps(message).encode(), "application/json")
+
+    response = _post(client)
+
+    assert response.status_code == 200
+    assert response.json() == message
+    assert response.headers["request-id"] == "req_1"
+    (row,) = UsageLedger._pending
+    assert (row["status"], row["input_tokens"], row["output_tokens"]) == (
+        STATUS_OK,
+        12,
+        5,
+    )
+    assert _limit() > 10
+
+
+def test_error_status_relayed(client, monkeypatch, upstream):
+    body = {"type": "error", "error": {"type": "overloaded_error", "message": "x"}}
+    _serve(monkeypatch, 529, json.dumps(body).encode(), "application/json")
+
+    response = _post(client)
+
+    assert response.status_code == 529
+    assert response.json() == body
+    assert [row["status"] for row in UsageLedger._pending] == [STATUS_ERROR]
+    assert _limit() < 10
+    assert upstream.consecutive_failures == 1
+
+
+def test_stream_relayed(client, monkeypatch, upstream):
+    content = MESSAGE_START + TEXT_DELTA + MESSAGE_DELTA + MESSAGE_STOP
+    _serve(monkeypatch, 200, content, "text/event-stream")
+
+    response = _post(client, stream=True)
+
+    assert response.status_code == 200
+    assert response.content == content
+    (row,) = UsageLedger._pending
+    assert (row["status"], row["input_tokens"], row["output_tokens"]) == (
+        STATUS_OK,
+        12,
+        5,
+    )
+    assert _limit() > 10
+    assert upstream.consecutive_failures == 0
+
+
+def test_stream_error_event_is_a_failure(client, monkeypatch, upstream):
+    content = MESSAGE_START + TEXT_DELTA + OVERLOADED
+    _serve(monkeypatch, 200, content, "text/event-stream")
+
+    response = _post(client, stream=True)
+
+    # Relayed unchanged, but counted like a 529
+    assert response.status_code == 200
+    assert response.content == content
+    assert [row["status"] for row in UsageLedger._pending] == [STATUS_ERROR]
+    assert _limit() < 10
+    assert upstream.consecutive_failures == 1
+
+
+def test_connection_error(client, monkeypatch, upstream):
+    def handler(request: httpx.Request) -> httpx.Response:
+        raise httpx.ConnectError("refused", request=request)
+
+    client_ = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    monkeypatch.setattr(HTTPClientPool, "get", lambda base_url: client_)
+
+    response = _post(client)
+
+    assert response.status_code == 502
+    assert response.json()["error"]["type"] == "api_error"
+    assert [row["status"] for row in UsageLedger._pending] == [STATUS_ERROR]
+    assert upstream.consecutive_failures == 1
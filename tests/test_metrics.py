@@ -0,0 +1,49 @@
+"""The metrics ``model`` label is bounded to the configured models."""
+
+from __future__ import annotations
+
+import pytest
+
+from anth2oai.configs import ConfigManager
+from anth2oai.server import metrics
+from anth2oai.server.metrics import OTHER_MODEL, StreamObserver
+from anth2oai.server.usage import UsageLedger
+
+
+@pytest.fixture(autouse=True)
+def _labels(monkeypatch):
+    monkeypatch.setitem(ConfigManager()._cache, "METRICS_MODELS", "claude-*, GPT-5*")
+    monkeypatch.setattr(StreamObserver, "_model_labels", {})
+    monkeypatch.setattr(StreamObserver, "_model_patterns_raw", None)
+
+
+def test_configured_models_keep_their_label():
+    assert StreamObserver.model_label("claude-sonnet-4") == "claude-sonnet-4"
+    assert StreamObserver.model_label("gpt-5-codex") == "gpt-5-codex"
+
+
+def test_other_models_share_one_label():
+    assert StreamObserver.model_label("my-model-123") == OTHER_MODEL
+    assert StreamObserver.model_label("gpt-4o") == OTHER_MODEL
+
+
+def test_label_set_is_capped(monkeypatch):
+    monkeypatch.setattr(metrics, "MAX_MODEL_LABELS", 2)
+    assert StreamObserver.model_label("claude-a") == "claude-a"
+    assert StreamObserver.model_label("claude-b") == "claude-b"
+    assert StreamObserver.model_label("claude-c") == OTHER_MODEL
+    assert StreamObserver.model_label("claude-a") == "claude-a"
+
+
+def test_config_change_resets_labels(monkeypatch):
+    assert StreamObserver.model_label("gpt-4o") == OTHER_MODEL
+    monkeypatch.setitem(ConfigManager()._cache, "METRICS_MODELS", "gpt-4*")
+    assert StreamObserver.model_label("gpt-4o") == "gpt-4o"
+
+
+def test_ledger_keeps_the_real_model(monkeypatch):
+    monkeypatch.setattr(UsageLedger, "_pending", [])
+    observer = StreamObserver("messages", "my-model-123", stream=False)
+    assert observer.labels == ("messages", OTHER_MODEL)
+    UsageLedger.record("sk-test-metrics", observer, None)
+    assert UsageLedger._pending[0]["model"] == "my-model-123"
@@ -0,0 +1,47 @@
+from __future__ import annotations
+
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+REPO_ROOT = Path(__file__).resolve().parents[1]
+
+# gunicorn --preload: the master prepares a fresh database (hashing the default
+# admin password), then forks a worker whose first bcrypt call must not hang
+_PROBE = """
+import asyncio, os, sys
+import bcrypt
+from anth2oai.database import prepare_db
+from anth2oai.models import run_bcrypt
+
+asyncio.run(prepare_db())
+pid = os.fork()
+if pid == 0:
+    hashed = bcrypt.hashpw(b"secret", bcrypt.gensalt(rounds=4))
+    ok = asyncio.run(
+        asyncio.wait_for(run_bcrypt(bcrypt.checkpw, b"secret", hashed), 10)
+    )
+    os._exit(0 if ok else 1)
+_, status = os.waitpid(pid, 0)
+sys.exit(os.waitstatus_to_exitcode(status))
+"""
+
+
+def test_bcrypt_in_worker_forked_after_prepare_db(tmp_path):
+    env = {
+        **os.environ,
+        "DATABASE_PATH": str(tmp_path / "admin.db"),
+        "PYTHONPATH": os.pathsep.join(
+            filter(None, [str(REPO_ROOT), os.environ.get("PYTHONPATH")])
+        ),
+    }
+    result = subprocess.run(
+        [sys.executable, "-c", _PROBE],
+        env=env,
+        cwd=tmp_path,
+        capture_output=True,
+        text=True,
+        timeout=60,
+    )
+    assert result.returncode == 0, result.stderr
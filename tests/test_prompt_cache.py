@@ -0,0 +1,134 @@
+"""Anthropic prompt caching breakpoints."""
+
+from __future__ import annotations
+
+import copy
+
+import pytest
+
+from anth2oai.prompt_cache import (
+    EPHEMERAL_CACHE_CONTROL,
+    MAX_BREAKPOINTS,
+    apply_prompt_cache_breakpoints,
+    prompt_cache_enabled,
+)
+
+MARK = {"cache_control": EPHEMERAL_CACHE_CONTROL}
+TOOLS = (
+    {"name": "read_file", "input_schema": {"type": "object"}},
+    {"name": "write_file", "input_schema": {"type": "object"}},
+)
+MESSAGES = [
+    {"role": "user", "content": "Open main.py"},
+    {
+        "role": "assistant",
+        "content": [{"type": "tool_use", "id": "t1", "name": "read_file", "input": {}}],
+    },
+    {
+        "role": "user",
+        "content": [{"type": "tool_result", "tool_use_id": "t1", "content": "print()"}],
+    },
+    {"role": "assistant", "content": "It prints an empty line."},
+]
+
+
+def _markers(system_prompt, tools, messages) -> int:
+    blocks = [
+        *(tools or ()),
+        *(system_prompt if isinstance(system_prompt, list) else ()),
+    ]
+    for message in messages:
+        if isinstance(message["content"], list):
+            blocks += message["content"]
+    return sum(1 for block in blocks if "cache_control" in block)
+
+
+@pytest.mark.parametrize(
+    "model, patterns, enabled",
+    [
+        ("claude-sonnet-4-5", "claude-sonnet-4*", True),
+        ("Claude-Opus-4", "claude-sonnet-4*, claude-opus*", True),
+        ("claude-haiku-4", "claude-sonnet-4*,claude-opus*", False),
+        ("anything", "*", True),
+        ("claude-sonnet-4-5", "", False),
+    ],
+)
+def test_enabled(model, patterns, enabled):
+    assert prompt_cache_enabled(model, patterns) is enabled
+
+
+def test_breakpoints():
+    messages = copy.deepcopy(MESSAGES)
+    system, tools, marked = apply_prompt_cache_breakpoints("Be brief.", TOOLS, messages)
+
+    assert system == [{"type": "text", "text": "Be brief.", **MARK}]
+    assert tools == [TOOLS[0], {**TOOLS[1], **MARK}]
+    # The last user turn, not the trailing assistant message
+    assert marked[2]["content"] == [{**MESSAGES[2]["content"][0], **MARK}]
+    assert marked[3] == MESSAGES[3]
+    assert marked[:2] == MESSAGES[:2]
+    assert _markers(system, tools, marked) == 3
+    # Nothing was mutated
+    assert messages == MESSAGES
+    assert "cache_control" not in TOOLS[1]
+
+
+def test_string_user_turn_and_block_system():
+    system = [{"type": "text", "text": "a"}, {"type": "text", "text": "b"}]
+    messages = [{"role": "user", "content": "hi"}]
+    system_out, tools, marked = apply_prompt_cache_breakpoints(system, None, messages)
+
+    assert system_out == [system[0], {**system[1], **MARK}]
+    assert tools is None
+    assert marked == [
+        {"role": "user", "content": [{"type": "text", "text": "hi", **MARK}]}
+    ]
+
+
+def test_nothing_to_mark():
+    omit = object()
+    messages = [{"role": "user", "content": [{"type": "image_url", "url": "x"}]}]
+    assert apply_prompt_cache_breakpoints(omit, omit, messages) == (
+        omit,
+        omit,
+        messages,
+    )
+    assert apply_prompt_cache_breakpoints("", [], []) == ("", [], [])
+
+
+def test_client_markers_count_towards_the_limit():
+    # The client already marked three blocks: room for the last user turn only
+    messages = [
+        {"role": "user", "content": [{"type": "text", "text": "a", **MARK}]},
+        {"role": "assistant", "content": [{"type": "text", "text": "b", **MARK}]},
+        {"role": "user", "content": [{"type": "text", "text": "c", **MARK}]},
+        {"role": "assistant", "content": "d"},
+        {"role": "user", "content": "e"},
+    ]
+    system, tools, marked = apply_prompt_cache_breakpoints("Be brief.", TOOLS, messages)
+
+    assert marked[4]["content"] == [{"type": "text", "text": "e", **MARK}]
+    assert system == "Be brief."
+    assert tools == TOOLS
+    assert _markers(system, tools, marked) == MAX_BREAKPOINTS
+
+
+def test_full_request_unchanged():
+    tools = [{**tool, **MARK} for tool in TOOLS]
+    system = [{"type": "text", "text": "s", **MARK}]
+    messages = [
+        {"role": "user", "content": [{"type": "text", "text": "a", **MARK}]},
+        {"role": "user", "content": "b"},
+    ]
+    assert apply_prompt_cache_breakpoints(system, tools, messages) == (
+        system,
+        tools,
+        messages,
+    )
+
+
+def test_already_marked_blocks_are_not_counted_twice():
+    messages = [{"role": "user", "content": [{"type": "text", "text": "a", **MARK}]}]
+    system, tools, marked = apply_prompt_cache_breakpoints("s", TOOLS, messages)
+    assert marked == messages
+    assert _markers(system, tools, marked) == 3
@@ -0,0 +1,104 @@
+"""Per-key token buckets shared by worker processes."""
+
+from __future__ import annotations
+
+import multiprocessing
+import time
+
+import pytest
+
+from anth2oai.configs import ConfigManager
+from anth2oai.server import ratelimit
+from anth2oai.server.ratelimit import RateLimiter, RateLimitExceeded
+
+API_KEY = "sk-test-ratelimit"
+WORKERS = 4
+
+
+@pytest.fixture(autouse=True)
+def _shared_table(monkeypatch, tmp_path):
+    monkeypatch.setattr(ratelimit, "STATE_FILE", str(tmp_path / "ratelimit"))
+    monkeypatch.setattr(RateLimiter, "_table", None)
+    monkeypatch.setattr(RateLimiter, "_fd", None)
+    monkeypatch.setattr(RateLimiter, "_pid", None)
+
+
+def _limits(monkeypatch, rps="0", burst="0", tpm="0"):
+    cache = ConfigManager()._cache
+    monkeypatch.setitem(cache, "RATE_LIMIT_RPS", rps)
+    monkeypatch.setitem(cache, "RATE_LIMIT_BURST", burst)
+    monkeypatch.setitem(cache, "RATE_LIMIT_TPM", tpm)
+
+
+def _admitted(attempts: int) -> int:
+    admitted = 0
+    for _ in range(attempts):
+        try:
+            RateLimiter.check(API_KEY)
+        except RateLimitExceeded:
+            continue
+        admitted += 1
+    return admitted
+
+
+def _in_workers(target, *args) -> list:
+    """Run ``target`` in forked worker processes at the same time."""
+    context = multiprocessing.get_context("fork")
+    with context.Pool(WORKERS) as pool:
+        return pool.starmap(target, [args] * WORKERS)
+
+
+def test_disabled_by_default(monkeypatch):
+    _limits(monkeypatch)
+    assert RateLimiter.check(API_KEY) == {}
+
+
+def test_burst_is_shared_by_workers(monkeypatch):
+    # Slow enough that nothing refills during the test
+    _limits(monkeypatch, rps="0.001", burst="20")
+    assert sum(_in_workers(_admitted, 50)) == 20
+    with pytest.raises(RateLimitExceeded) as exceeded:
+        RateLimiter.check(API_KEY)
+    assert exceeded.value.limit == "requests"
+    assert int(exceeded.value.headers["Retry-After"]) >= 1
+
+
+def _drain_then_refill(wait: float) -> tuple[int, int]:
+    drained = _admitted(10)
+    time.sleep(wait)
+    return drained, _admitted(10)
+
+
+def test_refill_is_shared_by_workers(monkeypatch):
+    _limits(monkeypatch, rps="4", burst="4")
+    assert _admitted(10) == 4
+    # Another worker sees the empty bucket, then what refilled meanwhile
+    with multiprocessing.get_context("fork").Pool(1) as pool:
+        drained, refilled = pool.apply(_drain_then_refill, (0.5,))
+    assert drained <= 1
+    assert 2 <= refilled <= 3
+
+
+def _charge(tokens: int) -> None:
+    RateLimiter.charge(API_KEY, tokens)
+
+
+def test_tokens_charged_by_one_worker_limit_the_others(monkeypatch):
+    _limits(monkeypatch, tpm="1000")
+    headers = RateLimiter.check(API_KEY)
+    assert headers["x-ratelimit-remaining-tokens"] == "1000"
+    # Four workers' requests use 300 tokens each: the bucket is in debt
+    _in_workers(_charge, 300)
+    with pytest.raises(RateLimitExceeded) as exceeded:
+        RateLimiter.check(API_KEY)
+    assert exceeded.value.limit == "tokens"
+    # 200 tokens in debt at 1000 per minute
+    assert 11 <= exceeded.value.retry_after <= 12
+
+
+def test_keys_have_their_own_buckets(monkeypatch):
+    _limits(monkeypatch, rps="0.001", burst="1")
+    RateLimiter.check(API_KEY)
+    with pytest.raises(RateLimitExceeded):
+        RateLimiter.check(API_KEY)
+    RateLimiter.check("sk-other")
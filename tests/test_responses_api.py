@@ -0,0 +1,476 @@
+"""Chat Completions over the Responses API (codex route)."""
+
+from __future__ import annotations
+
+import asyncio
+import json
+import time
+
+import httpx
+import pytest
+from openai import APIStatusError
+
+from anth2oai.format import AnthropicStreamState
+from anth2oai.responses_api import (
+    ResponsesChunkEncoder,
+    build_responses_request,
+    format_chat_messages_to_responses_input,
+    format_chat_tools_to_responses_tools,
+    format_responses_response_to_openai_response,
+    responses_create,
+    responses_sse,
+)
+from anth2oai.sse import SSEParser
+
+MODEL = "gpt-5-codex"
+BASE_URL = "http://upstream/v1"
+
+
+@pytest.fixture(autouse=True)
+def _frozen_clock(monkeypatch):
+    monkeypatch.setattr(time, "time", lambda: 1700000000.5)
+
+
+def _event(event_type: str, data: dict) -> bytes:
+    return f"event: {event_type}\ndata: {json.dumps(data)}\n\n".encode()
+
+
+def test_messages_to_input():
+    messages = [
+        {"role": "system", "content": "Be brief."},
+        {"role": "developer", "content": "Use tools."},
+        {"role": "user", "content": "Weather in Paris?"},
+        {
+            "role": "user",
+            "content": [
+                {"type": "text", "text": "And this?"},
+                {"type": "image_url", "image_url": {"url": "https://x/a.png"}},
+                {"type": "image_url", "image_url": "https://x/b.png"},
+                {"type": "input_file", "file_id": "file-1"},
+            ],
+        },
+        {
+            "role": "assistant",
+            "content": "Checking.",
+            "tool_calls": [
+                {
+                    "id": "call_1",
+                    "type": "function",
+                    "function": {
+                        "name": "get_weather",
+                        "arguments": '{"city":"Paris"}',
+                    },
+                }
+            ],
+        },
+        {"role": "tool", "tool_call_id": "call_1", "content": "18C"},
+        {
+            "role": "tool",
+            "tool_call_id": "call_2",
+            "content": [{"type": "text", "text": "a"}, {"type": "text", "text": "b"}],
+        },
+        {"role": "assistant", "content": "Sunny, 18C."},
+    ]
+
+    items, instructions = format_chat_messages_to_responses_input(messages)
+
+    assert instructions == "Be brief.\n\nUse tools."
+    assert items == [
+        {
+            "type": "message",
+            "role": "user",
+            "content": [{"type": "input_text", "text": "Weather in Paris?"}],
+        },
+        {
+            "type": "message",
+            "role": "user",
+            "content": [
+                {"type": "input_text", "text": "And this?"},
+                {
+                    "type": "input_image",
+                    "image_url": "https://x/a.png",
+                    "detail": "auto",
+                },
+                {
+                    "type": "input_image",
+                    "image_url": "https://x/b.png",
+                    "detail": "auto",
+                },
+                {"type": "input_file", "file_id": "file-1"},
+            ],
+        },
+        {
+            "type": "message",
+            "role": "assistant",
+            "content": [{"type": "output_text", "text": "Checking."}],
+        },
+        {
+            "type": "function_call",
+            "call_id": "call_1",
+            "name": "get_weather",
+            "arguments": '{"city":"Paris"}',
+        },
+        {"type": "function_call_output", "call_id": "call_1", "output": "18C"},
+        {"type": "function_call_output", "call_id": "call_2", "output": "ab"},
+        {
+            "type": "message",
+            "role": "assistant",
+            "content": [{"type": "output_text", "text": "Sunny, 18C."}],
+        },
+    ]
+
+
+def test_no_instructions_without_system_prompt():
+    items, instructions = format_chat_messages_to_responses_input(
+        [{"role": "user", "content": "hi"}]
+    )
+    assert instructions is None
+    assert len(items) == 1
+
+
+def test_tools_flattened():
+    tools = [
+        {
+            "type": "function",
+            "function": {
+                "name": "get_weather",
+                "description": "Current weather",
+                "parameters": {"type": "object", "properties": {"city": {}}},
+                "strict": True,
+            },
+        },
+        {"type": "function", "function": {"name": "now"}},
+        {"type": "custom", "name": "apply_patch", "description": "Edit files"},
+        {"type": "web_search"},
+    ]
+    assert format_chat_tools_to_responses_tools(tools) == [
+        {
+            "type": "function",
+            "name": "get_weather",
+            "parameters": {"type": "object", "properties": {"city": {}}},
+            "description": "Current weather",
+            "strict": True,
+        },
+        {
+            "type": "function",
+            "name": "now",
+            "parameters": {"type": "object", "properties": {}},
+        },
+        {
+            "type": "function",
+            "name": "apply_patch",
+            "parameters": {"type": "object", "properties": {}},
+            "description": "Edit files",
+        },
+        {"type": "web_search"},
+    ]
+    assert format_chat_tools_to_responses_tools(None) == []
+
+
+def test_build_request():
+    body = {
+        "model": "openai/responses/" + MODEL,
+        "messages": [
+            {"role": "system", "content": "Be brief."},
+            {"role": "user", "content": "hi"},
+        ],
+        "tools": [{"type": "function", "function": {"name": "now"}}],
+        "tool_choice": {"type": "function", "function": {"name": "now"}},
+        "max_tokens": 100,
+        "max_completion_tokens": 200,
+        "reasoning_effort": "high",
+        "response_format": {
+            "type": "json_schema",
+            "json_schema": {
+                "name": "out",
+                "schema": {"type": "object"},
+                "strict": True,
+            },
+        },
+        "temperature": 0,
+        "user": "u-1",
+        "n": 2,
+    }
+    assert build_responses_request(body, stream=True) == {
+        "model": MODEL,
+        "input": [
+            {
+                "type": "message",
+                "role": "user",
+                "content": [{"type": "input_text", "text": "hi"}],
+            }
+        ],
+        "stream": True,
+        "instructions": "Be brief.",
+        "tools": [
+            {
+                "type": "function",
+                "name": "now",
+                "parameters": {"type": "object", "properties": {}},
+            }
+        ],
+        "tool_choice": {"type": "function", "name": "now"},
+        "max_output_tokens": 200,
+        "reasoning": {"effort": "high"},
+        "text": {
+            "format": {
+                "type": "json_schema",
+                "name": "out",
+                "schema": {"type": "object"},
+                "strict": True,
+            }
+        },
+        "temperature": 0,
+        "user": "u-1",
+    }
+
+
+def test_build_request_minimal():
+    request = build_responses_request(
+        {"model": MODEL, "messages": [], "response_format": {"type": "json_object"}},
+        stream=False,
+    )
+    assert request == {
+        "model": MODEL,
+        "input": [],
+        "stream": False,
+        "text": {"format": {"type": "json_object"}},
+    }
+
+
+def test_codex_gets_no_default_max_tokens():
+    from anth2oai.server.app import process_payload
+
+    codex = process_payload({"model": "custom-GPT-5-Codex", "messages": []})
+    assert codex == {"model": MODEL, "messages": []}
+    assert "max_output_tokens" not in build_responses_request(codex, stream=True)
+    # The Anthropic API requires max_tokens, so Claude requests still get one
+    assert "max_tokens" in process_payload({"model": "claude-sonnet-4-5"})
+
+
+# A recorded stream: text, then a function call, then completion with usage
+RECORDED = b"".join(
+    [
+        _event(
+            "response.created",
+            {"type": "response.created", "response": {"id": "resp_abc"}},
+        ),
+        _event(
+            "response.output_item.added",
+            {"type": "response.output_item.added", "item": {"type": "message"}},
+        ),
+        _event(
+            "response.output_text.delta",
+            {"type": "response.output_text.delta", "delta": 'Let me "check".'},
+        ),
+        _event(
+            "response.output_item.added",
+            {
+                "type": "response.output_item.added",
+                "item": {
+                    "type": "function_call",
+                    "call_id": "call_1",
+                    "name": "get_weather",
+                },
+            },
+        ),
+        _event(
+            "response.function_call_arguments.delta",
+            {"type": "response.function_call_arguments.delta", "delta": '{"city":'},
+        ),
+        _event(
+            "response.function_call_arguments.delta",
+            {"type": "response.function_call_arguments.delta", "delta": '"Paris"}'},
+        ),
+        _event(
+            "response.completed",
+            {
+                "type": "response.completed",
+                "response": {
+                    "id": "resp_abc",
+                    "status": "completed",
+                    "usage": {
+                        "input_tokens": 120,
+                        "input_tokens_details": {"cached_tokens": 100},
+                        "output_tokens": 30,
+                    },
+                },
+            },
+        ),
+    ]
+)
+
+
+def _chunks(frames: list[str]) -> list[dict]:
+    return [json.loads(frame.removeprefix("data: ")) for frame in frames]
+
+
+def test_chunk_encoder():
+    state = AnthropicStreamState()
+    encoder = ResponsesChunkEncoder(MODEL, state=state)
+    frames = [
+        encoder.encode_event(event, json.loads(data))
+        for event, data in SSEParser().feed(RECORDED)
+    ]
+    chunks = _chunks([frame for frame in frames if frame])
+
+    assert {chunk["id"] for chunk in chunks} == {"chatcmpl-abc"}
+    assert {chunk["created"] for chunk in chunks} == {1700000000}
+    deltas = [chunk["choices"][0]["delta"] for chunk in chunks]
+    assert deltas[0]["role"] == "assistant"
+    assert deltas[1]["content"] == 'Let me "check".'
+    assert deltas[2]["tool_calls"][0] == {
+        "index": 0,
+        "id": "call_1",
+        "type": "function",
+        "function": {"name": "get_weather", "arguments": ""},
+    }
+    assert [d["tool_calls"][0]["function"]["arguments"] for d in deltas[3:5]] == [
+        '{"city":',
+        '"Paris"}',
+    ]
+    assert chunks[-1]["choices"][0]["finish_reason"] == "tool_calls"
+    assert len(chunks) == 6
+
+    usage = json.loads(encoder.usage_frame().removeprefix("data: "))["usage"]
+    assert usage["prompt_tokens"] == 120
+    assert usage["completion_tokens"] == 30
+    assert usage["prompt_tokens_details"]["cached_tokens"] == 100
+
+
+def test_incomplete_response_finishes_with_length():
+    encoder = ResponsesChunkEncoder(MODEL)
+    frame = encoder.encode_event(
+        "response.incomplete",
+        {"response": {"status": "incomplete", "usage": None}},
+    )
+    assert _chunks([frame])[0]["choices"][0]["finish_reason"] == "length"
+
+
+def _client(status: int, content: bytes, content_type: str) -> httpx.AsyncClient:
+    def handler(request: httpx.Request) -> httpx.Response:
+        assert request.url == BASE_URL + "/responses"
+        assert request.headers["authorization"] == "Bearer sk-test"
+        return httpx.Response(
+            status, content=content, headers={"content-type": content_type}
+        )
+
+    return httpx.AsyncClient(transport=httpx.MockTransport(handler))
+
+
+async def _stream(client: httpx.AsyncClient, body: dict) -> list[str]:
+    return [frame async for frame in responses_sse(client, BASE_URL, "sk-test", body)]
+
+
+def test_stream_with_usage():
+    client = _client(200, RECORDED, "text/event-stream")
+    body = {"model": MODEL, "messages": [], "stream_options": {"include_usage": True}}
+    chunks = _chunks(asyncio.run(_stream(client, body)))
+    assert len(chunks) == 7
+    assert chunks[-1]["choices"] == []
+    assert chunks[-1]["usage"]["total_tokens"] == 150
+
+
+@pytest.mark.parametrize(
+    "failure",
+    [
+        _event(
+            "error",
+            {"type": "error", "error": {"type": "server_error", "message": "boom"}},
+        ),
+        _event(
+            "response.failed",
+            {
+                "type": "response.failed",
+                "response": {"error": {"code": "server_error", "message": "boom"}},
+            },
+        ),
+    ],
+)
+def test_stream_error_event(failure):
+    head = RECORDED.split(b"event: response.output_item.added")[0]
+    client = _client(200, head + failure, "text/event-stream")
+    frames: list[str] = []
+
+    async def run():
+        async for frame in responses_sse(client, BASE_URL, "sk-test", {"model": MODEL}):
+            frames.append(frame)
+
+    with pytest.raises(APIStatusError) as error:
+        asyncio.run(run())
+    assert "boom" in str(error.value)
+    # What came before the error was still sent
+    assert len(frames) == 1
+
+
+def test_stream_error_status():
+    body = {"error": {"message": "Invalid model", "type": "invalid_request_error"}}
+    client = _client(400, json.dumps(body).encode(), "application/json")
+
+    with pytest.raises(APIStatusError) as error:
+        asyncio.run(_stream(client, {"model": MODEL}))
+    assert error.value.status_code == 400
+    assert error.value.body == body
+    assert "Invalid model" in str(error.value)
+
+
+def test_create():
+    data = {
+        "id": "resp_xyz",
+        "created_at": 1700000123,
+        "status": "completed",
+        "output": [
+            {"type": "reasoning", "summary": []},
+            {
+                "type": "message",
+                "content": [
+                    {"type": "output_text", "text": "Hello"},
+                    {"type": "output_text", "text": " there"},
+                ],
+            },
+        ],
+        "usage": {"input_tokens": 10, "output_tokens": 2},
+    }
+    client = _client(200, json.dumps(data).encode(), "application/json")
+
+    completion = asyncio.run(
+        responses_create(client, BASE_URL, "sk-test", {"model": MODEL, "messages": []})
+    )
+
+    assert completion.id == "chatcmpl-xyz"
+    assert completion.created == 1700000123
+    assert completion.choices[0].message.content == "Hello there"
+    assert completion.choices[0].finish_reason == "stop"
+    assert completion.usage.total_tokens == 12
+
+
+def test_create_error_body():
+    data = {"id": "resp_1", "error": {"message": "rate limited"}}
+    client = _client(200, json.dumps(data).encode(), "application/json")
+
+    with pytest.raises(APIStatusError, match="rate limited"):
+        asyncio.run(responses_create(client, BASE_URL, "sk-test", {"model": MODEL}))
+
+
+def test_response_with_tool_calls():
+    completion = format_responses_response_to_openai_response(
+        {
+            "id": "resp_1",
+            "status": "incomplete",
+            "output": [
+                {
+                    "type": "function_call",
+                    "call_id": "call_1",
+                    "name": "now",
+                    "arguments": "{}",
+                }
+            ],
+        },
+        MODEL,
+    )
+    choice = completion.choices[0]
+    assert choice.message.content is None
+    assert choice.message.tool_calls[0].id == "call_1"
+    assert choice.message.tool_calls[0].function.name == "now"
+    # Tool calls take precedence over the incomplete status
+    assert choice.finish_reason == "tool_calls"
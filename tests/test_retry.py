@@ -0,0 +1,204 @@
+"""Retries and hedging of Claude streams before their first frame."""
+
+from __future__ import annotations
+
+import asyncio
+from collections import deque
+from types import SimpleNamespace
+
+import pytest
+
+from anth2oai.configs import ConfigManager
+from anth2oai.format import AnthropicStreamState
+from anth2oai.server.limiter import ConcurrencyLimiters
+from anth2oai.server.retry import (
+    FirstByteTracker,
+    StreamAttempt,
+    backoff_delay,
+    start_stream,
+)
+from anth2oai.server.upstreams import UpstreamPool, UpstreamState
+
+API_KEY = "sk-test-retry"
+
+
+class StatusError(Exception):
+    def __init__(self, status_code: int, headers: dict | None = None):
+        super().__init__(f"status {status_code}")
+        self.status_code = status_code
+        self.response = SimpleNamespace(headers=headers or {})
+
+
+class Upstreams:
+    """Two upstreams whose streams follow a script, one entry per attempt."""
+
+    def __init__(self, monkeypatch, **scripts):
+        self.states = {name: UpstreamState(name, f"http://{name}") for name in scripts}
+        self.scripts = {name: deque(script) for name, script in scripts.items()}
+        self.launched: list[str] = []
+        self.open: set[int] = set()
+        monkeypatch.setattr(UpstreamPool, "_upstreams", list(self.states.values()))
+
+    def launch(self, upstream: UpstreamState, permit) -> StreamAttempt:
+        delay, error = self.scripts[upstream.name].popleft()
+        attempt_id = len(self.launched)
+        self.launched.append(upstream.name)
+
+        async def frames():
+            self.open.add(attempt_id)
+            try:
+                await asyncio.sleep(delay)
+                if error is not None:
+                    raise error
+                yield f"data: {upstream.name}\n\n"
+                yield "data: more\n\n"
+            finally:
+                self.open.discard(attempt_id)
+
+        return StreamAttempt(upstream, permit, frames(), AnthropicStreamState())
+
+    async def start(self, name: str) -> StreamAttempt:
+        upstream = self.states[name]
+        permit = await ConcurrencyLimiters.acquire(name, API_KEY)
+        return await start_stream(self.launch, API_KEY, upstream, permit)
+
+    def assert_released(self):
+        assert not self.open
+        assert all(u.outstanding == 0 for u in self.states.values())
+        assert all(
+            limiter.in_flight == 0 for limiter in ConcurrencyLimiters._limiters.values()
+        )
+
+
+@pytest.fixture(autouse=True)
+def _config(monkeypatch):
+    cache = ConfigManager()._cache
+    monkeypatch.setitem(cache, "UPSTREAM_RETRY_BASE_MS", "1")
+    monkeypatch.setitem(cache, "UPSTREAM_HEDGE_MIN_DELAY_MS", "20")
+    monkeypatch.setattr(
+        ConcurrencyLimiters, "_limiters", type(ConcurrencyLimiters._limiters)()
+    )
+    monkeypatch.setattr(FirstByteTracker, "_samples", deque([0.001] * 20, maxlen=256))
+
+
+@pytest.fixture
+def hedging(monkeypatch):
+    monkeypatch.setitem(ConfigManager()._cache, "UPSTREAM_HEDGE", "true")
+
+
+async def _finish(attempt: StreamAttempt) -> list[str]:
+    frames = [attempt.first_frame] + [frame async for frame in attempt.frames]
+    await attempt.close(success=True)
+    return frames
+
+
+def test_retry_on_another_upstream(monkeypatch):
+    upstreams = Upstreams(monkeypatch, a=[(0, StatusError(529))], b=[(0, None)])
+
+    async def run():
+        return await _finish(await upstreams.start("a"))
+
+    assert asyncio.run(run()) == ["data: b\n\n", "data: more\n\n"]
+    assert upstreams.launched == ["a", "b"]
+    upstreams.assert_released()
+
+
+def test_no_retry_on_client_error(monkeypatch):
+    upstreams = Upstreams(monkeypatch, a=[(0, StatusError(400))], b=[(0, None)])
+
+    with pytest.raises(StatusError):
+        asyncio.run(upstreams.start("a"))
+    assert upstreams.launched == ["a"]
+    upstreams.assert_released()
+
+
+def test_retries_used_up(monkeypatch):
+    monkeypatch.setitem(ConfigManager()._cache, "UPSTREAM_RETRY_MAX", "1")
+    upstreams = Upstreams(
+        monkeypatch, a=[(0, StatusError(503))], b=[(0, StatusError(502))]
+    )
+
+    with pytest.raises(StatusError) as error:
+        asyncio.run(upstreams.start("a"))
+    assert error.value.status_code == 502
+    assert upstreams.launched == ["a", "b"]
+    upstreams.assert_released()
+
+
+def test_backoff_delay_honours_retry_after(monkeypatch):
+    monkeypatch.setitem(ConfigManager()._cache, "UPSTREAM_RETRY_MAX_DELAY_MS", "4000")
+    assert 0 <= backoff_delay(1, StatusError(503)) <= 0.001
+    assert backoff_delay(1, StatusError(429, {"retry-after": "2"})) == 2
+    assert backoff_delay(1, StatusError(429, {"retry-after-ms": "1500"})) == 1.5
+    # Longer than the client should wait: give up
+    assert backoff_delay(1, StatusError(429, {"retry-after": "10"})) is None
+
+
+def test_hedge_wins_and_primary_is_aborted(monkeypatch, hedging):
+    upstreams = Upstreams(monkeypatch, a=[(5, None)], b=[(0, None)])
+
+    async def run():
+        attempt = await upstreams.start("a")
+        # The primary's request is closed as soon as the hedge won
+        assert upstreams.open == {1}
+        return await _finish(attempt)
+
+    assert asyncio.run(run()) == ["data: b\n\n", "data: more\n\n"]
+    assert upstreams.launched == ["a", "b"]
+    upstreams.assert_released()
+
+
+def test_hedge_loses_and_is_aborted(monkeypatch, hedging):
+    upstreams = Upstreams(monkeypatch, a=[(0.05, None)], b=[(5, None)])
+
+    async def run():
+        attempt = await upstreams.start("a")
+        assert upstreams.open == {0}
+        return await _finish(attempt)
+
+    assert asyncio.run(run())[0] == "data: a\n\n"
+    assert upstreams.launched == ["a", "b"]
+    upstreams.assert_released()
+
+
+def test_cancel_aborts_every_attempt(monkeypatch, hedging):
+    upstreams = Upstreams(monkeypatch, a=[(5, None)], b=[(5, None)])
+
+    async def run():
+        task = asyncio.create_task(upstreams.start("a"))
+        await asyncio.sleep(0.1)
+        assert upstreams.open == {0, 1}
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    asyncio.run(run())
+    upstreams.assert_released()
+
+
+def test_no_hedge_without_samples(monkeypatch, hedging):
+    monkeypatch.setattr(FirstByteTracker, "_samples", deque(maxlen=256))
+    upstreams = Upstreams(monkeypatch, a=[(0.05, None)], b=[(0, None)])
+
+    async def run():
+        return await _finish(await upstreams.start("a"))
+
+    assert asyncio.run(run())[0] == "data: a\n\n"
+    assert upstreams.launched == ["a"]
+    upstreams.assert_released()
+
+
+def test_cancel_before_attempt_started(monkeypatch):
+    upstreams = Upstreams(monkeypatch, a=[(5, None)])
+
+    def cancelled(cls):
+        # Cancelled in the loop turn that created the attempt's task, so that
+        # task is cancelled before start() ever runs
+        raise asyncio.CancelledError
+
+    monkeypatch.setattr(FirstByteTracker, "hedge_delay", classmethod(cancelled))
+
+    with pytest.raises(asyncio.CancelledError):
+        asyncio.run(upstreams.start("a"))
+    assert upstreams.launched == ["a"]
+    upstreams.assert_released()
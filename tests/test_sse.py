@@ -0,0 +1,269 @@
+"""SSE fast path: ``ChunkEncoder`` frames and the ``SSEParser``."""
+
+from __future__ import annotations
+
+import json
+import time
+
+import pytest
+from anthropic.types import RawMessageStreamEvent
+from pydantic import TypeAdapter
+
+from anth2oai.format import (
+    AnthropicStreamState,
+    build_completion_usage,
+    format_anthropic_stream_event_to_openai_chunk,
+)
+from anth2oai.patch import TOOL_PATCH_PREFIX
+from anth2oai.sse import ChunkEncoder, SSEParser
+
+MODEL = "claude-sonnet-4-5"
+MESSAGE_ID = "chatcmpl-1700000000"
+
+
+def _event(event_type: str, data: dict) -> bytes:
+    return f"event: {event_type}\ndata: {json.dumps(data)}\n\n".encode()
+
+
+# A recorded upstream stream: text, a tool call, usage and the stop reason
+RECORDED = b"".join(
+    [
+        _event(
+            "message_start",
+            {
+                "type": "message_start",
+                "message": {
+                    "id": "msg_01",
+                    "type": "message",
+                    "role": "assistant",
+                    "model": MODEL,
+                    "content": [],
+                    "stop_reason": None,
+                    "stop_sequence": None,
+                    "usage": {
+                        "input_tokens": 25,
+                        "output_tokens": 1,
+                        "cache_read_input_tokens": 100,
+                        "cache_creation_input_tokens": 7,
+                    },
+                },
+            },
+        ),
+        _event(
+            "content_block_start",
+            {
+                "type": "content_block_start",
+                "index": 0,
+                "content_block": {"type": "text", "text": ""},
+            },
+        ),
+        b'event: ping\ndata: {"type": "ping"}\n\n',
+        _event(
+            "content_block_delta",
+            {
+                "type": "content_block_delta",
+                "index": 0,
+                "delta": {"type": "text_delta", "text": 'Hello, "世界"\n'},
+            },
+        ),
+        _event(
+            "content_block_delta",
+            {
+                "type": "content_block_delta",
+                "index": 0,
+                "delta": {"type": "text_delta", "text": "let me check. 🌤"},
+            },
+        ),
+        _event("content_block_stop", {"type": "content_block_stop", "index": 0}),
+        _event(
+            "content_block_start",
+            {
+                "type": "content_block_start",
+                "index": 1,
+                "content_block": {
+                    "type": "tool_use",
+                    "id": "toolu_01",
+                    "name": TOOL_PATCH_PREFIX + "get_weather",
+                    "input": {},
+                },
+            },
+        ),
+        _event(
+            "content_block_delta",
+            {
+                "type": "content_block_delta",
+                "index": 1,
+                "delta": {"type": "input_json_delta", "partial_json": '{"city": "'},
+            },
+        ),
+        _event(
+            "content_block_delta",
+            {
+                "type": "content_block_delta",
+                "index": 1,
+                "delta": {"type": "input_json_delta", "partial_json": 'Paris"}'},
+            },
+        ),
+        _event("content_block_stop", {"type": "content_block_stop", "index": 1}),
+        _event(
+            "message_delta",
+            {
+                "type": "message_delta",
+                "delta": {"stop_reason": "tool_use", "stop_sequence": None},
+                "usage": {"output_tokens": 42},
+            },
+        ),
+        _event("message_stop", {"type": "message_stop"}),
+    ]
+)
+
+_sdk_event = TypeAdapter(RawMessageStreamEvent).validate_python
+
+
+def _frames(data: bytes) -> list[tuple[str, bytes]]:
+    return SSEParser().feed(data)
+
+
+def _sdk_events() -> list:
+    """The recorded stream as the SDK yields it (pings are dropped)."""
+    return [
+        _sdk_event(json.loads(data))
+        for event, data in _frames(RECORDED)
+        if event != "ping"
+    ]
+
+
+@pytest.fixture(autouse=True)
+def _frozen_clock(monkeypatch):
+    monkeypatch.setattr(time, "time", lambda: 1700000000.5)
+
+
+def _state() -> AnthropicStreamState:
+    state = AnthropicStreamState()
+    state.message_id = MESSAGE_ID
+    return state
+
+
+def _reference() -> list[str]:
+    """What the pydantic path sends for the recorded stream."""
+    state = _state()
+    frames = []
+    for event in _sdk_events():
+        chunk = format_anthropic_stream_event_to_openai_chunk(event, MODEL, state)
+        if chunk:
+            frames.append(f"data: {json.dumps(chunk.model_dump())}\n\n")
+    return frames
+
+
+def test_reference_covers_every_chunk_shape():
+    frames = [json.loads(frame[len("data: ") :]) for frame in _reference()]
+    deltas = [frame["choices"][0]["delta"] for frame in frames]
+    assert deltas[0]["role"] == "assistant"
+    assert deltas[1]["content"] == 'Hello, "世界"\n'
+    assert deltas[3]["tool_calls"][0]["function"]["name"] == "get_weather"
+    assert deltas[5]["tool_calls"][0]["function"]["arguments"] == 'Paris"}'
+    assert frames[-1]["choices"][0]["finish_reason"] == "tool_calls"
+
+
+def test_encode_sdk_events_matches_reference():
+    encoder = ChunkEncoder(MODEL, state=_state())
+    frames = [encoder.encode(event) for event in _sdk_events()]
+    assert [frame for frame in frames if frame] == _reference()
+
+
+def test_encode_dicts_matches_reference():
+    encoder = ChunkEncoder(MODEL, state=_state())
+    frames = [
+        encoder.encode_dict(event, json.loads(data))
+        for event, data in _frames(RECORDED)
+    ]
+    assert [frame for frame in frames if frame] == _reference()
+
+
+def test_usage_frame():
+    from openai.types.chat.chat_completion_chunk import ChatCompletionChunk
+
+    encoder = ChunkEncoder(MODEL, state=_state())
+    for event, data in _frames(RECORDED):
+        encoder.encode_dict(event, json.loads(data))
+    expected = ChatCompletionChunk(
+        id=MESSAGE_ID,
+        choices=[],
+        created=1700000000,
+        model=MODEL,
+        object="chat.completion.chunk",
+        usage=build_completion_usage(25, 42, 100, 7),
+    )
+    assert encoder.usage_frame() == f"data: {json.dumps(expected.model_dump())}\n\n"
+
+
+def test_parser_frames():
+    frames = _frames(RECORDED)
+    assert [event for event, _ in frames] == [
+        "message_start",
+        "content_block_start",
+        "ping",
+        "content_block_delta",
+        "content_block_delta",
+        "content_block_stop",
+        "content_block_start",
+        "content_block_delta",
+        "content_block_delta",
+        "content_block_stop",
+        "message_delta",
+        "message_stop",
+    ]
+    assert json.loads(frames[3][1])["delta"]["text"] == 'Hello, "世界"\n'
+
+
+@pytest.mark.parametrize("line_end", [b"\n", b"\r\n"])
+def test_parser_split_at_every_offset(line_end):
+    data = RECORDED.replace(b"\n", line_end)
+    expected = _frames(RECORDED)
+    for offset in range(len(data) + 1):
+        parser = SSEParser()
+        frames = parser.feed(data[:offset]) + parser.feed(data[offset:])
+        assert frames == expected, f"split at byte {offset}"
+
+
+def test_parser_byte_by_byte_crlf():
+    parser = SSEParser()
+    frames = []
+    for byte in RECORDED.replace(b"\n", b"\r\n"):
+        frames += parser.feed(bytes([byte]))
+    assert frames == _frames(RECORDED)
+
+
+def test_parser_fields():
+    parser = SSEParser()
+    frames = parser.feed(
+        b": keep-alive\r\n\r\n"
+        b"data: first\r\ndata:second\r\nid: 7\r\nretry: 10\r\n\r\n"
+        b"event: done\ndata: [DONE]\n\n"
+        b"data: unterminated\n"
+    )
+    assert frames == [("message", b"first\nsecond"), ("done", b"[DONE]")]
+    assert parser.feed(b"\n") == [("message", b"unterminated")]
+
+
+def test_parser_split_at_every_offset_cr():
+    # Bare \r line ends, including a \r\n split across two chunks
+    data = RECORDED.replace(b"\n", b"\r")
+    expected = _frames(RECORDED)
+    for offset in range(len(data) + 1):
+        parser = SSEParser()
+        frames = parser.feed(data[:offset]) + parser.feed(data[offset:])
+        assert frames == expected, f"split at byte {offset}"
+
+
+def test_parser_mixed_line_ends():
+    parser = SSEParser()
+    frames = parser.feed(b"event: a\rdata: 1\r")
+    frames += parser.feed(b"\n\r\n")
+    frames += parser.feed(b"data: 2\r")
+    frames += parser.feed(b"")
+    # Completes the \r\n, not a blank line
+    frames += parser.feed(b"\n")
+    assert frames == [("a", b"1")]
+    frames += parser.feed(b"\n")
+    assert frames == [("a", b"1"), ("message", b"2")]
@@ -0,0 +1,163 @@
+"""Guarded streams end exactly once, however the client leaves."""
+
+from __future__ import annotations
+
+import asyncio
+
+import pytest
+
+from anth2oai.format import AnthropicStreamState
+from anth2oai.server.metrics import StreamObserver
+from anth2oai.server.streaming import (
+    DisconnectAwareStreamingResponse,
+    StreamStats,
+    finish_stream,
+    guard_stream,
+)
+from anth2oai.server.usage import STATUS_CANCELLED, STATUS_OK, UsageLedger
+
+API_KEY = "sk-test-streaming"
+
+
+class Body:
+    """An upstream stream of ``count`` frames that records being closed."""
+
+    def __init__(self, count: int):
+        self.count = count
+        self.started = False
+        self.closed = False
+
+    async def frames(self):
+        self.started = True
+        try:
+            for n in range(self.count):
+                yield f"data: {n}\n\n"
+                await asyncio.sleep(0.01)
+        finally:
+            self.closed = True
+
+
+async def _serve(response, disconnect_after: int | None) -> list[bytes]:
+    """Run the ASGI response; the client leaves after that many body chunks."""
+    chunks: list[bytes] = []
+    gone = asyncio.Event()
+    if disconnect_after == 0:
+        gone.set()
+
+    async def receive():
+        await gone.wait()
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        if message["type"] == "http.response.start" and disconnect_after == 0:
+            # Leave before the body is ever iterated
+            await asyncio.sleep(1)
+        if message["type"] == "http.response.body" and message.get("body"):
+            chunks.append(message["body"])
+            if disconnect_after is not None and len(chunks) >= disconnect_after:
+                gone.set()
+                await asyncio.sleep(1)
+
+    await response({"type": "http"}, receive, send)
+    return chunks
+
+
+def _guarded(body: Body, ends: list, name: str = "end"):
+    response = DisconnectAwareStreamingResponse(body.frames())
+    guard_stream(response, lambda cancelled: ends.append((name, cancelled)))
+    return response
+
+
+def test_completed_stream():
+    body, ends, frames = Body(3), [], []
+    response = _guarded(body, ends)
+    guard_stream(response, lambda cancelled: None, on_frame=frames.append)
+
+    chunks = asyncio.run(_serve(response, disconnect_after=None))
+
+    assert len(chunks) == 3
+    assert frames == [f"data: {n}\n\n" for n in range(3)]
+    assert ends == [("end", False)]
+    assert body.closed
+
+
+def test_disconnect_mid_stream():
+    body, ends = Body(50), []
+
+    chunks = asyncio.run(_serve(_guarded(body, ends), disconnect_after=2))
+
+    assert len(chunks) < 50
+    assert ends == [("end", True)]
+    assert body.closed
+
+
+def test_disconnect_before_body_started():
+    body, ends = Body(3), []
+
+    chunks = asyncio.run(_serve(_guarded(body, ends), disconnect_after=0))
+
+    assert chunks == []
+    assert not body.started
+    # Only the disconnect hook could end it
+    assert ends == [("end", True)]
+
+
+def test_nested_guards_each_end_once():
+    body, ends = Body(50), []
+    response = _guarded(body, ends, "inner")
+    guard_stream(response, lambda cancelled: ends.append(("outer", cancelled)))
+
+    asyncio.run(_serve(response, disconnect_after=2))
+
+    assert ends == [("inner", True), ("outer", True)]
+    assert body.closed
+
+
+def test_failed_stream():
+    async def failing():
+        yield "data: 0\n\n"
+        raise RuntimeError("upstream broke")
+
+    ends = []
+    response = DisconnectAwareStreamingResponse(failing())
+    guard_stream(response, lambda cancelled: ends.append(cancelled))
+
+    async def run():
+        try:
+            await _serve(response, disconnect_after=None)
+        except RuntimeError:
+            pass
+
+    asyncio.run(run())
+    assert ends == [False]
+
+
+@pytest.mark.parametrize(
+    "disconnect_after, status",
+    [(None, STATUS_OK), (2, STATUS_CANCELLED), (0, STATUS_CANCELLED)],
+)
+def test_finish_stream(monkeypatch, disconnect_after, status):
+    monkeypatch.setattr(UsageLedger, "_pending", [])
+    monkeypatch.setattr(StreamStats, "tokens_saved", 0)
+    body = Body(3 if disconnect_after is None else 50)
+    observer = StreamObserver("test", "m")
+    state = AnthropicStreamState()
+    state.output_tokens = 10
+    released = []
+    response = DisconnectAwareStreamingResponse(body.frames())
+    finish_stream(
+        response,
+        API_KEY,
+        observer,
+        lambda: state,
+        release=lambda: released.append(True),
+        tokens_left=lambda: 100 - state.output_tokens,
+    )
+
+    asyncio.run(_serve(response, disconnect_after))
+
+    assert [row["status"] for row in UsageLedger._pending] == [status]
+    assert UsageLedger._pending[0]["output_tokens"] == 10
+    assert released == [True]
+    assert observer.finished
+    assert StreamStats.tokens_saved == (0 if status == STATUS_OK else 90)
@@ -0,0 +1,109 @@
+"""Memoized OpenAI -> Anthropic tool schema conversion."""
+
+from __future__ import annotations
+
+import copy
+from collections import OrderedDict
+
+import pytest
+
+from anth2oai.configs import ConfigManager
+from anth2oai.prompt_cache import apply_prompt_cache_breakpoints
+from anth2oai.tool_cache import ToolSchemaCache
+
+TOOLS = [
+    {
+        "type": "function",
+        "function": {
+            "name": "read_file",
+            "description": "Read a file",
+            "parameters": {
+                "type": "object",
+                "properties": {"path": {"type": "string"}},
+                "required": ["path"],
+            },
+        },
+    },
+    {"type": "function", "function": {"name": "list_dir", "parameters": {}}},
+]
+
+
+@pytest.fixture(autouse=True)
+def _cache(monkeypatch):
+    monkeypatch.setattr(ToolSchemaCache, "_entries", OrderedDict())
+    monkeypatch.setattr(ToolSchemaCache, "hits", 0)
+    monkeypatch.setattr(ToolSchemaCache, "misses", 0)
+
+
+def test_convert():
+    tools, names = ToolSchemaCache.convert(copy.deepcopy(TOOLS))
+
+    assert [tool["name"] for tool in tools] == ["op_read_file", "op_list_dir"]
+    assert tools[0]["description"] == "Read a file"
+    assert tools[0]["input_schema"]["required"] == ["path"]
+    assert names == {"op_read_file": "read_file", "op_list_dir": "list_dir"}
+
+
+def test_no_tools():
+    assert ToolSchemaCache.convert(None) == (None, {})
+    assert ToolSchemaCache.convert([]) == (None, {})
+    assert ToolSchemaCache.stats()["misses"] == 0
+
+
+def test_hits_and_misses():
+    first = ToolSchemaCache.convert(copy.deepcopy(TOOLS))
+    # Equal tools from another request are a hit, sharing the entry
+    second = ToolSchemaCache.convert(copy.deepcopy(TOOLS))
+    other = ToolSchemaCache.convert(TOOLS[:1])
+
+    assert second is first
+    assert other is not first
+    assert ToolSchemaCache.stats() == {
+        "hits": 1,
+        "misses": 2,
+        "hit_rate": 1 / 3,
+        "size": 2,
+    }
+
+
+def test_lru_bound(monkeypatch):
+    monkeypatch.setitem(ConfigManager()._cache, "TOOL_CACHE_SIZE", "2")
+    a, b, c = ([copy.deepcopy(tool)] for tool in TOOLS + TOOLS[:1])
+    c[0]["function"]["name"] = "grep"
+    ToolSchemaCache.convert(a)
+    ToolSchemaCache.convert(b)
+    # A hit on "a" keeps it; "b" is the least recently used
+    ToolSchemaCache.convert(a)
+    ToolSchemaCache.convert(c)
+
+    assert ToolSchemaCache.stats()["size"] == 2
+    ToolSchemaCache.convert(a)
+    assert ToolSchemaCache.hits == 2
+    ToolSchemaCache.convert(b)
+    assert ToolSchemaCache.misses == 4
+
+
+def test_request_mutation_does_not_reach_the_cache():
+    request_tools = copy.deepcopy(TOOLS)
+    tools, _ = ToolSchemaCache.convert(request_tools)
+    # The caller keeps editing its request body afterwards
+    request_tools[0]["function"]["name"] = "delete_file"
+    request_tools[0]["function"]["parameters"]["properties"]["path"]["type"] = "int"
+
+    assert tools[0]["name"] == "op_read_file"
+    assert tools[0]["input_schema"]["properties"]["path"] == {"type": "string"}
+    assert ToolSchemaCache.convert(copy.deepcopy(TOOLS))[0] is tools
+
+
+def test_cached_entry_is_read_only_for_callers():
+    tools, names = ToolSchemaCache.convert(copy.deepcopy(TOOLS))
+    snapshot = copy.deepcopy(tools)
+
+    assert isinstance(tools, tuple)
+    with pytest.raises(AttributeError):
+        tools.append({})
+    # Prompt caching marks a copy of the last tool, never the shared one
+    _, marked, _ = apply_prompt_cache_breakpoints("s", tools, [])
+    assert "cache_control" in marked[-1]
+    assert tools == snapshot
+    assert ToolSchemaCache.convert(copy.deepcopy(TOOLS)) == (snapshot, names)
@@ -0,0 +1,78 @@
+"""Active health checks of the upstream pool."""
+
+from __future__ import annotations
+
+import asyncio
+import time
+
+import httpx
+import pytest
+
+from anth2oai.server import upstreams
+from anth2oai.bench.mock_upstream import MockSettings, create_mock_app
+from anth2oai.constants import ANTHROPIC_MESSAGES_PATH
+from anth2oai.server.upstreams import (
+    DEFAULT_HEALTH_PATH,
+    UpstreamPool,
+    UpstreamState,
+    health_url,
+)
+
+
+@pytest.mark.parametrize(
+    ("base_url", "expected"),
+    [
+        # Base URLs as the SDK takes them: it appends /v1/messages itself
+        ("https://api.anthropic.com", "https://api.anthropic.com/v1/models"),
+        ("https://api.anthropic.com/", "https://api.anthropic.com/v1/models"),
+        ("http://gw:8080/claude", "http://gw:8080/claude/v1/models"),
+    ],
+)
+def test_health_url(base_url, expected):
+    assert health_url(base_url, DEFAULT_HEALTH_PATH) == expected
+    # Same layout as the messages endpoint the route posts to
+    assert expected.removesuffix("models") + "messages" == (
+        base_url.rstrip("/") + ANTHROPIC_MESSAGES_PATH
+    )
+
+
+@pytest.mark.parametrize(
+    ("status", "healthy"),
+    [
+        (200, True),
+        (204, True),
+        (401, True),
+        (403, True),
+        (404, False),
+        (429, False),
+        (503, False),
+    ],
+)
+def test_probe_status(monkeypatch, status, healthy):
+    seen = []
+
+    def handler(request):
+        seen.append(str(request.url))
+        return httpx.Response(status)
+
+    client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    monkeypatch.setattr(upstreams.HTTPClientPool, "get", lambda base_url: client)
+    upstream = UpstreamState("a", "https://api.anthropic.com")
+    upstream.ejected_until = time.monotonic() + 60
+
+    asyncio.run(UpstreamPool._probe(upstream))
+
+    assert seen == ["https://api.anthropic.com/v1/models"]
+    assert upstream.available(time.monotonic()) is healthy
+
+
+def test_mock_upstream_passes_probe(monkeypatch):
+    transport = httpx.ASGITransport(app=create_mock_app(MockSettings()))
+    client = httpx.AsyncClient(transport=transport)
+    monkeypatch.setattr(upstreams.HTTPClientPool, "get", lambda base_url: client)
+    upstream = UpstreamState("mock", "http://127.0.0.1:9100")
+    upstream.ejected_until = time.monotonic() + 60
+
+    asyncio.run(UpstreamPool._probe(upstream))
+
+    assert upstream.available(time.monotonic())
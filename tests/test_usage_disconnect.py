@@ -0,0 +1,92 @@
+"""A client leaving mid-stream is recorded as a cancelled request."""
+
+from __future__ import annotations
+
+import asyncio
+
+import pytest
+
+from anth2oai.configs import ConfigManager
+from anth2oai.server import codex
+from anth2oai.server.coalesce import StreamCoalescer
+from anth2oai.server.usage import STATUS_CANCELLED, STATUS_OK, UsageLedger
+
+API_KEY = "sk-test-disconnect"
+
+
+@pytest.fixture(autouse=True)
+def _upstream(monkeypatch):
+    monkeypatch.setitem(ConfigManager()._cache, "OPENAI_BASE_URL", "http://upstream")
+    monkeypatch.setattr(codex.HTTPClientPool, "get", lambda base_url: None)
+    monkeypatch.setattr(UsageLedger, "_pending", [])
+
+    async def responses_sse(client, base_url, api_key, body, state):
+        for n in range(body["frames"]):
+            state.output_tokens = n + 1
+            yield f"data: {n}\n\n"
+            await asyncio.sleep(0.01)
+
+    monkeypatch.setattr(codex, "responses_sse", responses_sse)
+
+
+async def _serve(response, disconnect_after: int | None) -> list[bytes]:
+    """Run the ASGI response; the client leaves after that many body chunks."""
+    chunks: list[bytes] = []
+    gone = asyncio.Event()
+
+    async def receive():
+        await gone.wait()
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        if message["type"] == "http.response.body" and message.get("body"):
+            chunks.append(message["body"])
+            if disconnect_after is not None and len(chunks) >= disconnect_after:
+                gone.set()
+                # The server notices the disconnect before the next send
+                await asyncio.sleep(1)
+
+    await response({"type": "http"}, receive, send)
+    return chunks
+
+
+def _statuses() -> list[str]:
+    return [row["status"] for row in UsageLedger._pending]
+
+
+def test_completed_stream_is_ok():
+    async def run():
+        response = await codex.codex_streaming(API_KEY, {"model": "m", "frames": 3})
+        await _serve(response, disconnect_after=None)
+
+    asyncio.run(run())
+    assert _statuses() == [STATUS_OK]
+
+
+def test_disconnect_mid_stream_is_cancelled():
+    async def run():
+        response = await codex.codex_streaming(API_KEY, {"model": "m", "frames": 50})
+        chunks = await _serve(response, disconnect_after=2)
+        assert len(chunks) < 50
+
+    asyncio.run(run())
+    assert _statuses() == [STATUS_CANCELLED]
+    assert UsageLedger._pending[0]["output_tokens"] < 50
+
+
+def test_disconnect_from_coalesced_stream_is_cancelled():
+    async def run():
+        response = await StreamCoalescer.stream(
+            None,
+            API_KEY,
+            lambda: codex.codex_streaming(API_KEY, {"model": "m", "frames": 50}),
+        )
+        await _serve(response, disconnect_after=2)
+        # The flight's task aborts the upstream stream once its last client left
+        for _ in range(100):
+            if UsageLedger._pending:
+                break
+            await asyncio.sleep(0.01)
+
+    asyncio.run(run())
+    assert _statuses() == [STATUS_CANCELLED]